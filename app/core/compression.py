@@ -0,0 +1,253 @@
+import zlib
+from abc import ABC, abstractmethod
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import config
+from app.core.metrics import register_metrics
+
+try:
+    import brotli
+except ImportError:  # Optional dependency: 'br' is not offered without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency: 'zstd' is not offered without it
+    zstandard = None
+
+# Response compression (Content-Encoding), negotiated through Accept-Encoding.
+# - gzip is always available; br and zstd are offered when the brotli and zstandard
+#   packages are installed. Among the encodings the client accepts with the highest q-value,
+#   zstd is preferred, then br, then gzip.
+# - Complete bodies smaller than COMPRESSION_MIN_SIZE bytes are sent as they are.
+# - Streamed bodies are compressed chunk by chunk, and every chunk is flushed so the client
+#   gets it as soon as the app sends it. Event streams (text/event-stream) and bodies that
+#   are already encoded are never compressed.
+
+EXCLUDED_CONTENT_TYPES = ("text/event-stream",)
+
+
+# ENCODERS
+# Compresses with one Content-Encoding at the configured level
+class Encoder(ABC):
+    name: str  # Content-Encoding token
+
+    def __init__(self, level: int):
+        self.level = level
+
+    # Function to compress a complete body
+    def compress(self, data: bytes) -> bytes:
+        stream = self.stream()
+        return stream.compress(data) + stream.finish()
+
+    # Function to start compressing a streamed body
+    @abstractmethod
+    def stream(self) -> "EncoderStream": ...
+
+
+# Compresses the chunks of one streamed body
+class EncoderStream(ABC):
+    # Function to compress a chunk, flushed so it can be decoded on arrival
+    @abstractmethod
+    def compress(self, chunk: bytes) -> bytes: ...
+
+    # Function to end the compressed stream
+    @abstractmethod
+    def finish(self) -> bytes: ...
+
+
+class GzipEncoder(Encoder):
+    name = "gzip"
+
+    def compress(self, data: bytes) -> bytes:
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def stream(self) -> EncoderStream:
+        return GzipStream(self.level)
+
+
+class GzipStream(EncoderStream):
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip header
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.compress(chunk) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder(Encoder):
+    name = "br"
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.level)
+
+    def stream(self) -> EncoderStream:
+        return BrotliStream(self.level)
+
+
+class BrotliStream(EncoderStream):
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+# A ZstdCompressor is not safe to share between concurrent streams, so every response
+# gets its own
+class ZstdEncoder(Encoder):
+    name = "zstd"
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def stream(self) -> EncoderStream:
+        return ZstdStream(self.level)
+
+
+class ZstdStream(EncoderStream):
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.compress(chunk) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+# Create the encoders that are available, in order of preference
+encoders: dict[str, Encoder] = {}
+if zstandard is not None:
+    encoders["zstd"] = ZstdEncoder(config.COMPRESSION_ZSTD_LEVEL)
+if brotli is not None:
+    encoders["br"] = BrotliEncoder(config.COMPRESSION_BROTLI_LEVEL)
+encoders["gzip"] = GzipEncoder(config.COMPRESSION_GZIP_LEVEL)
+
+# Counters of the compressed responses of this worker, exposed on the metrics endpoint
+stats = {"responses": 0, "streams": 0, "bytes_in": 0, "bytes_out": 0}
+register_metrics("compression", lambda: {**stats, "encodings": list(encoders)})
+
+
+# Function to pick the encoder for an Accept-Encoding header (None: send the body as is)
+def negotiate_encoding(accept_encoding: str | None) -> Encoder | None:
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        token, _, params = item.strip().partition(";")
+        weight = 1.0
+        if params.strip().startswith("q="):
+            try:
+                weight = float(params.strip()[2:])
+            except ValueError:
+                continue
+        weights[token.strip().lower()] = weight
+    wildcard = weights.get("*", 0.0)
+    best, best_weight = None, 0.0
+    for name, encoder in encoders.items():
+        weight = weights.get(name, wildcard)
+        if weight > best_weight:
+            best, best_weight = encoder, weight
+    return best
+
+
+# ASGI middleware compressing the responses
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoder = None
+        if scope["type"] == "http" and config.COMPRESSION_ENABLED:
+            encoder = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoder is None:
+            await self.app(scope, receive, send)
+            return
+        await CompressionResponder(self.app, encoder, self.minimum_size)(
+            scope, receive, send
+        )
+
+
+# Compresses the body of one response
+# The start message is held back until the first body chunk shows how to send it
+class CompressionResponder:
+    def __init__(self, app: ASGIApp, encoder: Encoder, minimum_size: int):
+        self.app = app
+        self.encoder = encoder
+        self.minimum_size = minimum_size
+        self.send: Send | None = None
+        self.start_message: Message | None = None
+        self.stream: EncoderStream | None = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            # Bodies sent as they are start at once (event streams may stay idle a while)
+            if "content-encoding" in headers or headers.get(
+                "content-type", ""
+            ).startswith(EXCLUDED_CONTENT_TYPES):
+                await self.send(message)
+            else:
+                self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        # Rest of a streamed body, or a body sent as it is
+        if self.start_message is None:
+            if self.stream is not None:
+                stats["bytes_in"] += len(body)
+                body = self.stream.compress(body)
+                if not more_body:
+                    body += self.stream.finish()
+                stats["bytes_out"] += len(body)
+                message["body"] = body
+            await self.send(message)
+            return
+
+        # First body chunk: decide how the response is sent
+        start_message, self.start_message = self.start_message, None
+        headers = MutableHeaders(raw=start_message["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        if not more_body and len(body) < self.minimum_size:
+            await self.send(start_message)
+            await self.send(message)
+            return
+
+        stats["bytes_in"] += len(body)
+        if more_body:
+            # Streamed body: compress chunk by chunk, the length is unknown
+            stats["streams"] += 1
+            self.stream = self.encoder.stream()
+            message["body"] = self.stream.compress(body)
+            del headers["Content-Length"]
+        else:
+            message["body"] = self.encoder.compress(body)
+            headers["Content-Length"] = str(len(message["body"]))
+        headers["Content-Encoding"] = self.encoder.name
+        stats["responses"] += 1
+        stats["bytes_out"] += len(message["body"])
+        await self.send(start_message)
+        await self.send(message)
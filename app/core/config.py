@@ -8,7 +8,61 @@ class BasicConfig(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30  # Token expiration time in minutes
     DATABASE_URL: str | None = None  # URL for the database connection
     DATABASE_ECHO: bool = False  # Whether to log database queries for debugging
+    DATABASE_WARM_CONNECTIONS: int = 5  # Pooled connections opened on startup
+    DATABASE_SHARD_URLS: list[str] = []  # URLs of the task shards (empty: no sharding)
+    DATABASE_SHARD_ID_BLOCK: int = 1000  # Task ids reserved per allocation when sharded
+    LOG_LEVEL: str = "INFO"  # Log level of the application loggers
     TASKS_EXPIRE_INTERVAL_HOURS: int = 1 # Interval (in hours) for task expiration due date
+    TASK_EVENTS_BACKEND: str | None = None  # Pub/sub backend as 'module:Class' (default in-process)
+    TASK_EVENTS_QUEUE_SIZE: int = 100  # Max buffered events per subscriber before dropping
+    TASK_EVENTS_KEEPALIVE_SECONDS: int = 15  # Interval (in seconds) between keep-alive comments
+    SCHEDULER_LEASE_SECONDS: int = 30  # Lifetime (in seconds) of the scheduler leader lease
+    SCHEDULER_LEASE_RENEW_SECONDS: int = 10  # Interval (in seconds) between lease renewals
+    REMINDER_LEAD_MINUTES: int = 30  # How many minutes before the due date a reminder is sent
+    REMINDER_SCHEDULE_AHEAD_MINUTES: int = 60  # How far ahead reminders are enqueued
+    REMINDER_ENQUEUE_INTERVAL_SECONDS: int = 60  # Interval (in seconds) between outbox fills
+    REMINDER_DISPATCH_INTERVAL_SECONDS: int = 10  # Interval (in seconds) between dispatches
+    REMINDER_BATCH_SIZE: int = 1000  # Rows read per enqueue/dispatch batch
+    REMINDER_SEND_BATCH_SIZE: int = 100  # Reminders handed to the sender per call
+    REMINDER_CONCURRENCY: int = 4  # Max concurrent sender calls
+    REMINDER_RATE_PER_SECOND: float = 1000  # Max reminders delivered per second
+    REMINDER_MAX_ATTEMPTS: int = 3  # Failed deliveries before a reminder is given up on
+    REMINDER_CLAIM_TIMEOUT_SECONDS: int = 300  # Age after which unconfirmed sends are failed
+    REMINDER_SENDER: str = "log"  # Sender: 'log', 'file' or 'module:Class'
+    REMINDER_FILE_PATH: str = "reminders.jsonl"  # Output file of the 'file' sender
+    TASK_WRITE_BEHIND_ENABLED: bool = False  # Batch task updates in a queue
+    TASK_WRITE_BEHIND_FLUSH_MS: int = 5  # Max queueing time (milliseconds)
+    TASK_WRITE_BEHIND_MAX_BATCH: int = 500  # Queued tasks that trigger a flush
+    TASK_WRITE_BEHIND_AWAIT_FLUSH: bool = True  # Respond after the batch commits
+    TASKS_ARCHIVE_AFTER_DAYS: int = 30  # Days past due before finished tasks are archived
+    TASKS_ARCHIVE_INTERVAL_MINUTES: int = 60  # Interval (in minutes) between archival runs
+    TASKS_ARCHIVE_BATCH_SIZE: int = 500  # Tasks moved per archival transaction
+    TASKS_ARCHIVE_BATCH_PAUSE_MS: int = 100  # Pause (in milliseconds) between batches
+    ADMISSION_ENABLED: bool = True  # Rate limit and cap the task and auth requests
+    ADMISSION_BACKEND: str | None = None  # Shared rate limit backend 'module:Class'
+    ADMISSION_USER_RATE_PER_SECOND: float = 20  # Task requests per second per user
+    ADMISSION_USER_BURST: int = 40  # Task requests a user can burst above the rate
+    ADMISSION_CLIENT_RATE_PER_SECOND: float = 2  # Auth requests per second per client
+    ADMISSION_CLIENT_BURST: int = 10  # Auth requests a client can burst above the rate
+    ADMISSION_MAX_IN_FLIGHT: int = 15  # Concurrent requests per worker (pool 5 + 10)
+    ADMISSION_MAX_QUEUE: int = 100  # Requests waiting for a slot before shedding
+    ADMISSION_QUEUE_TIMEOUT_MS: int = 1000  # Max wait (milliseconds) for a slot
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1  # Retry-After of shed (503) responses
+    IDEMPOTENCY_TTL_SECONDS: int = 86400  # How long task write results are replayed
+    IDEMPOTENCY_CACHE_SIZE: int = 10000  # Results kept in memory per worker
+    IDEMPOTENCY_WAIT_SECONDS: int = 10  # Max wait for a duplicate running in another worker
+    IDEMPOTENCY_CLAIM_LEASE_SECONDS: int = 30  # Claim of a running write, renewed while it runs
+    IDEMPOTENCY_PURGE_INTERVAL_MINUTES: int = 10  # Interval between purges of expired keys
+    TASKS_LOOKUP_MAX_IDS: int = 100  # Max task ids per POST /tasks/lookup request
+    STORAGE_BACKEND: str = "sql"  # Storage of users and tasks: 'sql' or 'memory'
+    STORAGE_MEMORY_PATH: str = "data"  # Directory of the memory store's log and snapshots
+    STORAGE_MEMORY_SNAPSHOT_EVERY: int = 10000  # Logged changes between snapshots
+    STORAGE_MEMORY_FSYNC: bool = False  # fsync the log after every change
+    COMPRESSION_ENABLED: bool = True  # Compress responses the client accepts encoded
+    COMPRESSION_MIN_SIZE: int = 1024  # Smallest body (in bytes) that is compressed
+    COMPRESSION_GZIP_LEVEL: int = 6  # gzip level (1-9)
+    COMPRESSION_BROTLI_LEVEL: int = 4  # Brotli quality (0-11), if brotli is installed
+    COMPRESSION_ZSTD_LEVEL: int = 3  # Zstandard level (1-22), if zstandard is installed
     model_config = SettingsConfigDict(
         env_file=".env", extra="ignore"
     )  # Read settings from .env file
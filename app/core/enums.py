@@ -27,3 +27,20 @@ class TaskStatus(str, Enum):
     pending = "pending"  # Task is still pending
     completed = "completed"  # Task has been completed
     expired = "expired"  # Task has expired
+
+
+# Enum representing the kinds of task change events pushed to subscribed clients
+class TaskEventType(str, Enum):
+    created = "created"  # Task was created
+    updated = "updated"  # Task was updated
+    deleted = "deleted"  # Task was deleted
+    expired = "expired"  # Task was expired by the scheduler
+    resync = "resync"  # Events were dropped, the client should refetch its tasks
+
+
+# Enum representing the delivery states of a due date reminder in the outbox
+class ReminderStatus(str, Enum):
+    pending = "pending"  # Reminder is waiting to be sent
+    sending = "sending"  # Reminder was claimed by the dispatcher
+    sent = "sent"  # Reminder was delivered
+    failed = "failed"  # Reminder was given up on
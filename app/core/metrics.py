@@ -0,0 +1,15 @@
+from typing import Any, Callable
+
+# Registry of metric providers, keyed by section name
+# Each provider returns a snapshot (dict) of its current counters when metrics are collected
+_providers: dict[str, Callable[[], dict[str, Any]]] = {}
+
+
+# Function to register a metric provider under the given section name
+def register_metrics(name: str, provider: Callable[[], dict[str, Any]]) -> None:
+    _providers[name] = provider
+
+
+# Function to collect a snapshot from every registered provider
+def collect_metrics() -> dict[str, dict[str, Any]]:
+    return {name: provider() for name, provider in _providers.items()}
@@ -0,0 +1,91 @@
+from contextvars import ContextVar
+from typing import Any, Mapping
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from starlette.background import BackgroundTask
+
+from app.core.metrics import register_metrics
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency: responses are always JSON without it
+    msgpack = None
+
+# Content negotiation of the task responses (Accept).
+# Clients that list a MessagePack media type in Accept with a q-value at least as high as
+# JSON's (e.g. 'Accept: application/msgpack') get the body encoded as MessagePack instead
+# of JSON, with the same structure (dates stay ISO 8601 strings). Anything else, including
+# 'Accept: */*' and a missing header, gets JSON. Error responses are always JSON.
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_MEDIA_TYPES = (
+    "application/msgpack",
+    "application/x-msgpack",
+    "application/vnd.msgpack",
+)
+# Ranges matching JSON, by specificity (the most specific one in Accept sets JSON's weight)
+JSON_RANGES = {"*/*": 0, "application/*": 1, JSON_MEDIA_TYPE: 2}
+
+# Media type negotiated for the response of the current request
+response_media_type: ContextVar[str] = ContextVar(
+    "response_media_type", default=JSON_MEDIA_TYPE
+)
+
+# Counters of the negotiated task responses of this worker, exposed on the metrics endpoint
+stats = {"json": 0, "msgpack": 0}
+register_metrics("negotiation", lambda: {**stats, "msgpack_available": bool(msgpack)})
+
+
+# Function to pick the media type of the response for an Accept header
+def negotiate_media_type(accept: str | None) -> str:
+    if not accept or msgpack is None:
+        return JSON_MEDIA_TYPE
+    json_weight, msgpack_weight = 0.0, 0.0
+    json_specificity = -1
+    for item in accept.split(","):
+        media_type, *params = (part.strip() for part in item.split(";"))
+        media_type = media_type.lower()
+        weight = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    weight = float(param[2:])
+                except ValueError:
+                    weight = 0.0
+        if media_type in MSGPACK_MEDIA_TYPES:
+            msgpack_weight = max(msgpack_weight, weight)
+        elif JSON_RANGES.get(media_type, -1) > json_specificity:
+            json_weight, json_specificity = weight, JSON_RANGES[media_type]
+    if msgpack_weight > 0 and msgpack_weight >= json_weight:
+        return MSGPACK_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+# Dependency negotiating the media type of the task responses
+async def negotiate_response(request: Request) -> None:
+    response_media_type.set(negotiate_media_type(request.headers.get("accept")))
+
+
+# Response class of the task routes, rendering JSON or MessagePack as negotiated
+class TaskResponse(JSONResponse):
+    def __init__(
+        self,
+        content: Any,
+        status_code: int = 200,
+        headers: Mapping[str, str] | None = None,
+        media_type: str | None = None,
+        background: BackgroundTask | None = None,
+    ):
+        self.negotiated = media_type or response_media_type.get()
+        super().__init__(content, status_code, headers, self.negotiated, background)
+        # Keep a Vary the caller set, the body also depends on Accept
+        self.headers.add_vary_header("Accept")
+
+    def render(self, content: Any) -> bytes:
+        if self.negotiated == MSGPACK_MEDIA_TYPE:
+            stats["msgpack"] += 1
+            return msgpack.packb(content)
+        stats["json"] += 1
+        return super().render(content)
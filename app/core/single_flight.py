@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from app.core.metrics import register_metrics
+
+
+# Request coalescing ("single flight") for identical concurrent reads.
+# The first caller for a key runs the query; callers with the same key that arrive while it
+# is in flight await and share its result instead of running the query again. Once the call
+# has finished, the next caller runs the query again, so a read never sees a result older
+# than the call it joined. Failed calls are shared with the waiting callers too.
+class SingleFlight:
+    def __init__(self, name: str):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0}
+        register_metrics(f"single_flight.{name}", lambda: dict(self.stats))
+
+    # Function to run fn for the key, or share the result of an identical call in flight
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats["calls"] += 1
+
+        # Join the call in flight for the same key, if any
+        # If the caller running it is cancelled, the first waiter to resume runs the call
+        # again and the other waiters join that call
+        joined = False
+        while (future := self._calls.get(key)) is not None:
+            if not joined:
+                self.stats["coalesced"] += 1
+                joined = True
+            try:
+                # Shield the shared call so a cancelled waiter does not cancel it
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+
+        # Run the call and publish its outcome to the waiting callers
+        self.stats["executions"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody was waiting
+            raise
+        finally:
+            self._forget(key, future)
+
+        future.set_result(result)
+        return result
+
+    # Function to detach the calls in flight whose key matches the predicate (e.g. after a
+    # write), so later callers run a new query; the callers already waiting get their result
+    def forget(self, predicate: Callable[[Hashable], bool]) -> None:
+        for key in [key for key in self._calls if predicate(key)]:
+            del self._calls[key]
+
+    # Function to drop the entry of the key if it still belongs to the given call
+    def _forget(self, key: Hashable, future: asyncio.Future) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
@@ -0,0 +1,170 @@
+from fastapi import HTTPException, status
+
+from app.core.enums import (
+    TaskEventType,
+    TaskOrder,
+    TaskPriority,
+    TaskSortBy,
+    TaskStatus,
+)
+from app.core.security import Hash
+from app.db.memory_store import TaskRecord, UserRecord, store
+from app.schemas.task_schema import (
+    TaskBase,
+    TaskListOut,
+    TaskLookupOut,
+    TaskOut,
+    TaskUpdate,
+)
+from app.schemas.user_schema import UserIn
+from app.services.task_events import publish_task_event
+
+# CRUD functions of the in-memory storage backend (see app/db/memory_store.py).
+# task_crud and user_crud hand over to these when STORAGE_BACKEND=memory; they answer with
+# the same results and errors as the SQL versions. There is no archive in the store, so
+# include_archived makes no difference.
+
+
+# * GET A USER by email
+async def get_user_by_email(email: str) -> UserRecord | None:
+    return store.get_user_by_email(email)
+
+
+# * CREATE A USER
+async def create_user(request: UserIn) -> UserRecord:
+    # Check if a user with the same email already exists
+    if store.get_user_by_email(str(request.email)):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"User creation failed: User with {request.email} already exists",
+        )
+
+    # Add the user with the hashed password
+    user = store.create_user(
+        fullname=request.fullname,
+        email=str(request.email),
+        password=Hash.get_hash_password(request.password),
+    )
+    await store.sync()
+    return user
+
+
+# * GET A TASK by task.id
+async def get_task(task_id: int, user: UserRecord) -> TaskRecord:
+    task = store.get_task(task_id)
+
+    # If task not found, raise a 404 HTTP exception with a custom error message
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Task selection failed: Task with id {task_id} not found",
+        )
+
+    # If the task doesn't belong to the user, raise a 403 HTTP exception (Permission Denied)
+    if task.user_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Task selection failed: Permission to access this task denied",
+        )
+
+    return task
+
+
+# * GET TASKS by ids (lookup)
+async def get_tasks_by_ids(ids: list[int], user: UserRecord) -> TaskLookupOut:
+    tasks, missing, forbidden = [], [], []
+    for task_id in dict.fromkeys(ids):
+        task = store.get_task(task_id)
+        if task is None:
+            missing.append(task_id)
+        elif task.user_id != user.id:
+            forbidden.append(task_id)
+        else:
+            tasks.append(TaskOut.model_validate(task))
+    return TaskLookupOut(tasks=tasks, missing=missing, forbidden=forbidden)
+
+
+# * GET TASKS (search, filter, sort, order)
+async def get_tasks(
+    search: str,
+    filter_status: TaskStatus,
+    filter_priority: TaskPriority,
+    sort_by: TaskSortBy,
+    order: TaskOrder,
+    user: UserRecord,
+    page_number: int = 1,
+    page_size: int = 10,
+) -> TaskListOut:
+    # Walk the index of the sort option for the page
+    tasks, total_tasks = store.get_tasks(
+        user.id,
+        search,
+        filter_status,
+        filter_priority,
+        sort_by,
+        order,
+        (page_number - 1) * page_size,
+        page_size,
+    )
+
+    # If no tasks are found, raise a 404 HTTP exception with a custom error message
+    if not tasks:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task selection failed: No tasks found",
+        )
+
+    # Calculate total pages
+    total_pages = (total_tasks // page_size) + (1 if total_tasks % page_size > 0 else 0)
+
+    # Return the tasks along with the pagination info
+    return TaskListOut(
+        page_number=page_number,
+        page_size=page_size,
+        total_items=total_tasks,
+        total_pages=total_pages,
+        tasks=[TaskOut.model_validate(task) for task in tasks],
+    )
+
+
+# * CREATE A TASK
+async def create_task(request: TaskBase, user: UserRecord) -> TaskRecord:
+    task = store.create_task(request.model_dump(), user.id)
+    await store.sync()
+
+    # Notify the user's subscribed clients about the new task
+    await publish_task_event(TaskEventType.created, task)
+    return task
+
+
+# * UPDATE A TASK by task.id
+async def update_task(
+    request: TaskUpdate, task_id: int, user: UserRecord
+) -> TaskRecord:
+    # First, ensure the task exists and belongs to the user
+    task = await get_task(task_id, user)
+
+    # Only the fields set in the request are changed (none of them can be null)
+    values = {
+        name: value
+        for name, value in request.model_dump(exclude_unset=True).items()
+        if value is not None
+    }
+    [task] = store.update_tasks([task], values)
+    await store.sync()
+
+    # Notify the user's subscribed clients about the updated task
+    await publish_task_event(TaskEventType.updated, task)
+    return task
+
+
+# * DELETE A TASK by task.id
+async def delete_task(task_id: int, user: UserRecord) -> dict:
+    # First, ensure the task exists and belongs to the user
+    task = await get_task(task_id, user)
+    store.delete_task(task)
+    await store.sync()
+
+    # Notify the user's subscribed clients about the deleted task
+    await publish_task_event(TaskEventType.deleted, task)
+    return {"status": "ok", "message": "Task deleted successfully"}
@@ -1,23 +1,49 @@
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import insert, select, update, delete, asc, case, desc, func
-
-from app.db.models import Task, User
-from app.core.enums import TaskPriority, TaskSortBy, TaskOrder, TaskStatus
+from sqlalchemy import insert, select, update, delete
+
+from app.db.models import Task, User, ArchivedTask, with_sort_ranks
+from app.core.enums import (
+    TaskPriority,
+    TaskSortBy,
+    TaskOrder,
+    TaskStatus,
+    TaskEventType,
+)
+from app.services.task_events import publish_task_event
+from app.services.write_behind import write_behind
+from app.db.sharding import new_task_id, task_sessionmaker
+from app.db.memory_store import store
+from app.crud import memory_crud
+from app.core.config import config
+from app.core.single_flight import SingleFlight
+from app.crud.task_queries import task_list_params, task_list_template
 from app.schemas.task_schema import (
     TaskBase,
     TaskUpdate,
     TaskOut,
     TaskListOut,
+    TaskLookupOut,
 )
 
 
 # * GET A TASK by task.id
 # Define an asynchronous function to get a specific task by its ID
-async def get_task(task_id: int, user: User, db: AsyncSession) -> Task:
+# Archived tasks are only looked up when include_archived is set (they are read-only)
+async def get_task(
+    task_id: int, user: User, db: AsyncSession, include_archived: bool = False
+) -> Task | ArchivedTask:
+    # With the in-memory storage backend, the task is read from the store
+    if store is not None:
+        return await memory_crud.get_task(task_id, user)
+
     # Query the database for a task that matches the given task_id
     task = await db.scalar(select(Task).where(Task.id == task_id))
 
+    # Fall back to the archive if the task is no longer in the hot table
+    if not task and include_archived:
+        task = await db.scalar(select(ArchivedTask).where(ArchivedTask.id == task_id))
+
     # Check if the task was found in the database
     if not task:
         # If task not found, raise a 404 HTTP exception with a custom error message
@@ -38,6 +64,69 @@ async def get_task(task_id: int, user: User, db: AsyncSession) -> Task:
     return task
 
 
+# * GET TASKS by ids (lookup)
+# Define an asynchronous function to get many of the user's tasks by ID in one round trip
+# The user's tasks are fetched in a single query; only the ids not found there are looked
+# up in the archive, and then checked for existence to tell missing from forbidden ids
+async def get_tasks_by_ids(
+    ids: list[int], user: User, db: AsyncSession
+) -> TaskLookupOut:
+    # With the in-memory storage backend, the tasks are read from the store
+    if store is not None:
+        return await memory_crud.get_tasks_by_ids(ids, user)
+
+    # Drop duplicate ids, keeping the requested order
+    ids = list(dict.fromkeys(ids))
+
+    # Query the user's tasks with the requested ids
+    result = await db.scalars(
+        select(Task).where(Task.id.in_(ids), Task.user_id == user.id)
+    )
+    found: dict[int, Task | ArchivedTask] = {task.id: task for task in result.all()}
+
+    # Archived tasks are returned too, like by GET /tasks/{task_id}
+    leftover = [task_id for task_id in ids if task_id not in found]
+    if leftover:
+        result = await db.scalars(
+            select(ArchivedTask).where(
+                ArchivedTask.id.in_(leftover), ArchivedTask.user_id == user.id
+            )
+        )
+        found.update({task.id: task for task in result.all()})
+
+    # Ids that exist but belong to another user are forbidden, the rest are missing
+    # With sharding, other users' tasks usually live in another shard and show as missing
+    leftover = [task_id for task_id in ids if task_id not in found]
+    forbidden = set()
+    if leftover:
+        result = await db.scalars(select(Task.id).where(Task.id.in_(leftover)))
+        forbidden.update(result.all())
+        result = await db.scalars(
+            select(ArchivedTask.id).where(ArchivedTask.id.in_(leftover))
+        )
+        forbidden.update(result.all())
+
+    # Return the tasks in the requested order, with the ids that were not returned
+    return TaskLookupOut(
+        tasks=[
+            TaskOut.model_validate(found[task_id])
+            for task_id in ids
+            if task_id in found
+        ],
+        missing=[task_id for task_id in leftover if task_id not in forbidden],
+        forbidden=[task_id for task_id in leftover if task_id in forbidden],
+    )
+
+
+# Single-flight group that coalesces identical concurrent task list reads
+tasks_flight = SingleFlight("get_tasks")
+
+
+# Function to stop sharing task list reads of the user once one of their tasks changed
+def _forget_task_lists(user_id: int) -> None:
+    tasks_flight.forget(lambda key: key[0] == user_id)
+
+
 # * GET TASKS (search, filter, sort, order)
 # Define an asynchronous function to retrieve tasks with filters and sorting options
 async def get_tasks(
@@ -50,77 +139,82 @@ async def get_tasks(
     db: AsyncSession,  # Database session for querying tasks
     page_number: int = 1,  # Page number for pagination (default to 1)
     page_size: int = 10,  # Page size for pagination (default to 10)
+    include_archived: bool = False,  # Whether archived tasks are included
 ) -> TaskListOut:
-    # Initialize the query, selecting tasks where the user_id matches the requesting user's ID
-    query = select(Task).where(Task.user_id == user.id)
-
-    # Define the order function (asc or desc) based on the passed order parameter
-    order_func = desc if order == TaskOrder.desc else asc
-
-    # List to hold fields for sorting
-    sort_fields = []
-
-    # If a search term is provided, filter tasks by title or description
-    if search:
-        query = query.filter(
-            (Task.title.ilike(f"%{search}%")) | (Task.description.ilike(f"%{search}%"))
+    # With the in-memory storage backend, the page is read from the store's indexes
+    if store is not None:
+        return await memory_crud.get_tasks(
+            search,
+            filter_status,
+            filter_priority,
+            sort_by,
+            order,
+            user,
+            page_number,
+            page_size,
         )
 
-    # If a specific status filter is provided, filter tasks by status
-    if filter_status:
-        query = query.filter(Task.status == filter_status)
-
-    # If a specific priority filter is provided, filter tasks by priority
-    if filter_priority:
-        query = query.filter(Task.priority == filter_priority)
-
-    # If sorting is required, determine the sorting field and append it to the sort_fields list
-    if sort_by:
-        match sort_by:
-            case TaskSortBy.status:
-                # Sort tasks by status (pending, expired, completed)
-                sort_fields.append(
-                    case(
-                        (Task.status == TaskStatus.pending, 0),
-                        (Task.status == TaskStatus.expired, 1),
-                        (Task.status == TaskStatus.completed, 2),
-                        else_=3,
-                    )
-                )
-
-            case TaskSortBy.priority:
-                # Sort tasks by priority (low, medium, high)
-                sort_fields.append(
-                    case(
-                        (Task.priority == TaskPriority.low, 0),
-                        (Task.priority == TaskPriority.medium, 1),
-                        (Task.priority == TaskPriority.high, 2),
-                        else_=3,
-                    )
-                )
-
-            case _:
-                # Sort tasks by the chosen field in the sort_by parameter
-                sort_fields.append(getattr(Task, sort_by.value))
-    else:
-        # If no sorting field is specified, default to sorting by due date
-        sort_fields.append(Task.due_date)
+    # Identical concurrent reads of the same user share a single query
+    key = (
+        user.id,
+        search,
+        filter_status,
+        filter_priority,
+        sort_by,
+        order,
+        page_number,
+        page_size,
+        include_archived,
+    )
+    return await tasks_flight.do(
+        key,
+        lambda: _query_tasks(
+            search,
+            filter_status,
+            filter_priority,
+            sort_by,
+            order,
+            user,
+            db,
+            page_number,
+            page_size,
+            include_archived,
+        ),
+    )
 
-    # Apply the sorting to the query, passing multiple fields if necessary
-    query = query.order_by(order_func(*sort_fields))
 
-    # Calculate the offset based on the page_number and page_size
-    # The offset determines how many tasks to skip before returning the results
-    # For example, if page_number = 2 and page_size = 10, the offset will be (2-1) * 10 = 10
-    offset = (page_number - 1) * page_size
+# Define an asynchronous function to query a page of tasks for get_tasks
+# The statements come pre-built from the template registry (see app/crud/task_queries.py),
+# only the parameter values change from one call to the next
+async def _query_tasks(
+    search: str,
+    filter_status: TaskStatus,
+    filter_priority: TaskPriority,
+    sort_by: TaskSortBy,
+    order: TaskOrder,
+    user: User,
+    db: AsyncSession,
+    page_number: int,
+    page_size: int,
+    include_archived: bool,
+) -> TaskListOut:
+    # Get the statements for this combination of search, filters, sorting and order
+    template = task_list_template(
+        search, filter_status, filter_priority, sort_by, order, include_archived
+    )
 
-    # Apply the offset and limit to the query
-    # The offset skips the specified number of tasks, and the limit restricts the number of tasks returned
-    query = query.offset(offset).limit(page_size)
+    # Bind the values, e.g. page_number = 2 and page_size = 10 give offset 10 and limit 10
+    params = task_list_params(
+        user.id, search, filter_status, filter_priority, page_number, page_size
+    )
 
     # Execute the query and fetch the results
-    result = await db.scalars(query)
-    tasks = result.all()
+    if template.mappings:
+        result = await db.execute(template.page, params)
+        tasks = result.mappings().all()
+    else:
+        result = await db.scalars(template.page, params)
+        tasks = [task.__dict__ for task in result.all()]
 
     # If no tasks are found, raise a 404 HTTP exception with a custom error message
     if not tasks:
@@ -130,14 +224,13 @@ async def get_tasks(
         )
 
     # Count the total number of tasks for pagination
-    total_tasks_query = select(func.count(Task.id)).where(Task.user_id == user.id)
-    total_tasks = await db.scalar(total_tasks_query)
+    total_tasks = await db.scalar(template.count, {"user_id": user.id})
 
     # Calculate total pages
     total_pages = (total_tasks // page_size) + (1 if total_tasks % page_size > 0 else 0)
 
-    # Convert ORM objects to Pydantic models using the dictionary unpacking method
-    task_out_list = [TaskOut(**task.__dict__) for task in tasks]
+    # Convert the rows to Pydantic models using the dictionary unpacking method
+    task_out_list = [TaskOut(**task) for task in tasks]
 
     # Return the tasks along with the pagination info
     return TaskListOut(
@@ -152,9 +245,19 @@ async def get_tasks(
 # * CREATE A TASK
 # Define an asynchronous function to create a new task for a user
 async def create_task(request: TaskBase, user: User, db: AsyncSession) -> Task:
-    # Execute the insert statement to add the new task to the database
+    # With the in-memory storage backend, the task is added to the store
+    if store is not None:
+        return await memory_crud.create_task(request, user)
+
+    # With sharding, task ids come from the shared sequence so they are unique across shards
+    task_id = await new_task_id()
+    values = {"id": task_id} if task_id is not None else {}
+
+    # Execute the insert statement to add the new task (with its sort ranks) to the database
     result = await db.execute(
-        insert(Task).values(**request.model_dump(), user_id=user.id)
+        insert(Task).values(
+            **with_sort_ranks(request.model_dump()), **values, user_id=user.id
+        )
         # .returning(Task)  # Optionally, you can return the inserted row if needed
     )
 
@@ -171,6 +274,12 @@ async def create_task(request: TaskBase, user: User, db: AsyncSession) -> Task:
             detail="Task creation failed: Invalid input data",
         )
 
+    # Stop sharing task list reads that do not include the new task
+    _forget_task_lists(user.id)
+
+    # Notify the user's subscribed clients about the new task
+    await publish_task_event(TaskEventType.created, inserted_task)
+
     # Return the inserted task
     return inserted_task
 
@@ -179,16 +288,25 @@ async def create_task(request: TaskBase, user: User, db: AsyncSession) -> Task:
 # Define an asynchronous function to update an existing task
 async def update_task(
     request: TaskUpdate, task_id: int, user: User, db: AsyncSession
-) -> Task:
+) -> Task | TaskOut:
+    # With the in-memory storage backend, the task is changed in the store
+    if store is not None:
+        return await memory_crud.update_task(request, task_id, user)
+
     # First, ensure the task exists and belongs to the user
-    await get_task(task_id, user, db)
+    task = await get_task(task_id, user, db)
+
+    # In write-behind mode, queue the update instead of writing it in this request
+    if config.TASK_WRITE_BEHIND_ENABLED:
+        return await _queue_task_update(request, task, user, db)
 
     # Execute the update query on the Task table where the task ID matches the provided task_id
     # Use the data from the request, excluding unset fields (so only updated fields are included)
+    # A changed status also changes its sort rank
     await db.execute(
         update(Task)
         .where(Task.id == task_id)
-        .values(**request.model_dump(exclude_unset=True))
+        .values(**with_sort_ranks(request.model_dump(exclude_unset=True)))
         # .returning(Task),  # Optionally, return the updated task if needed
     )
 
@@ -205,15 +323,49 @@ async def update_task(
             detail="Task update failed: Task not found or not updated",
         )
 
+    # Stop sharing task list reads that do not include the update
+    _forget_task_lists(user.id)
+
+    # Notify the user's subscribed clients about the updated task
+    await publish_task_event(TaskEventType.updated, result)
+
     # Return the updated task
     return result
 
 
+# Function to queue a validated update of the task in the write-behind queue
+# The response is built from the loaded task plus the queued values
+async def _queue_task_update(
+    request: TaskUpdate, task: Task, user: User, db: AsyncSession
+) -> TaskOut:
+    values = request.model_dump(exclude_unset=True)
+    task_out = TaskOut.model_validate(task).model_copy(update=values)
+
+    # Release the pooled connection before waiting for the batch to be written
+    await db.close()
+
+    # Queue the update; returns once it is committed (see app/services/write_behind.py)
+    await write_behind.submit(task.id, with_sort_ranks(values), task_sessionmaker(user))
+
+    # Stop sharing task list reads that do not include the update
+    _forget_task_lists(task.user_id)
+
+    # Notify the user's subscribed clients about the updated task
+    await publish_task_event(TaskEventType.updated, task, task_out)
+
+    # Return the task as it is after the update
+    return task_out
+
+
 # * DELETE A TASK by task.id
 # Define an asynchronous function to delete a task
 async def delete_task(task_id: int, user: User, db: AsyncSession) -> dict:
+    # With the in-memory storage backend, the task is deleted from the store
+    if store is not None:
+        return await memory_crud.delete_task(task_id, user)
+
     # First, ensure the task exists and belongs to the user
-    await get_task(task_id, user, db)
+    task = await get_task(task_id, user, db)
 
     # Execute the delete query on the Task table where the task ID matches the provided task_id
     result = await db.execute(delete(Task).where(Task.id == task_id))
@@ -228,5 +380,11 @@ async def delete_task(task_id: int, user: User, db: AsyncSession) -> dict:
             detail=f"Task deletion failed: Task with id {task_id} not found",
         )
 
+    # Stop sharing task list reads that still include the deleted task
+    _forget_task_lists(user.id)
+
+    # Notify the user's subscribed clients about the deleted task
+    await publish_task_event(TaskEventType.deleted, task)
+
     # Return a success message if the task was successfully deleted
     return {"status": "ok", "message": "Task deleted successfully"}
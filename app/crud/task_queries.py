@@ -0,0 +1,149 @@
+from dataclasses import dataclass
+
+from sqlalchemy import Select, asc, bindparam, desc, func, select, union_all
+
+from app.core.enums import TaskOrder, TaskPriority, TaskSortBy, TaskStatus
+from app.db.models import ArchivedTask, Task
+
+# Statement templates of the get_tasks hot path.
+# Every combination of the get_tasks options (archive, search, filters, sort, order) maps to
+# one statement built once with bound parameters for the values (user id, search pattern,
+# status, priority, offset, limit). Executing the same statement object again skips
+# building a new select() and generating its cache key on every request. (Freshly built
+# statements already hit the engine's compiled cache, so compilation was never the cost;
+# see benchmarks/get_tasks_queries.py.)
+
+
+# A pre-built pair of statements for one combination of the get_tasks options
+@dataclass(frozen=True)
+class TaskListTemplate:
+    page: Select  # Page of tasks, takes the parameters of task_list_params
+    count: Select  # Total number of tasks of the user, takes the 'user_id' parameter
+    mappings: bool  # Whether rows are read as mappings (union) or as Task objects
+
+
+# Registry of the templates built so far, keyed by the get_tasks options
+_templates: dict[tuple, TaskListTemplate] = {}
+
+
+# Function to get the sort fields of the sort option on the given columns
+# Status and priority sort by their stored ranks, so pages sorted by them are walks of the
+# (user_id, rank, id) indexes. The id breaks ties of every sort, so pages never overlap
+# (and match the order of the in-memory backend)
+def _sort_fields(columns, sort_by: TaskSortBy | None) -> list:
+    match sort_by:
+        case TaskSortBy.status:
+            # Sort tasks by status (pending, expired, completed)
+            return [columns.status_rank, columns.id]
+        case TaskSortBy.priority:
+            # Sort tasks by priority (low, medium, high)
+            return [columns.priority_rank, columns.id]
+        case None:
+            # Default to sorting by due date
+            return [columns.due_date, columns.id]
+        case _:
+            # Sort tasks by the chosen field
+            return [getattr(columns, sort_by.value), columns.id]
+
+
+# Function to build the union of the user's hot and archived tasks
+# Both tables have the same task columns, so the union can be filtered and sorted like Task
+def _user_tasks_with_archive():
+    columns = [column.key for column in Task.__table__.columns]
+    return union_all(
+        select(*(getattr(Task, column) for column in columns)).where(
+            Task.user_id == bindparam("user_id")
+        ),
+        select(*(getattr(ArchivedTask, column) for column in columns)).where(
+            ArchivedTask.user_id == bindparam("user_id")
+        ),
+    ).subquery()
+
+
+# Function to build the template of one combination of the get_tasks options
+def _build_template(
+    include_archived: bool,
+    search: bool,
+    filter_status: bool,
+    filter_priority: bool,
+    sort_by: TaskSortBy | None,
+    order: TaskOrder | None,
+) -> TaskListTemplate:
+    # Only the hot 'tasks' table is queried, unless archived tasks are requested as well
+    if include_archived:
+        columns = _user_tasks_with_archive().c
+        query = select(columns)
+    else:
+        columns = Task
+        query = select(Task).where(Task.user_id == bindparam("user_id"))
+
+    if search:
+        query = query.where(
+            columns.title.ilike(bindparam("search"))
+            | columns.description.ilike(bindparam("search"))
+        )
+    if filter_status:
+        query = query.where(columns.status == bindparam("filter_status"))
+    if filter_priority:
+        query = query.where(columns.priority == bindparam("filter_priority"))
+
+    order_func = desc if order == TaskOrder.desc else asc
+    page = (
+        query.order_by(*(order_func(field) for field in _sort_fields(columns, sort_by)))
+        .offset(bindparam("offset"))
+        .limit(bindparam("limit"))
+    )
+
+    # The total counts all the user's tasks, regardless of the search and filters
+    count = select(func.count(columns.id))
+    if not include_archived:
+        count = count.where(Task.user_id == bindparam("user_id"))
+
+    return TaskListTemplate(page=page, count=count, mappings=include_archived)
+
+
+# Function to get the template for the get_tasks options, building it on first use
+def task_list_template(
+    search: str | None,
+    filter_status: TaskStatus | None,
+    filter_priority: TaskPriority | None,
+    sort_by: TaskSortBy | None,
+    order: TaskOrder | None,
+    include_archived: bool,
+) -> TaskListTemplate:
+    key = (
+        include_archived,
+        bool(search),
+        bool(filter_status),
+        bool(filter_priority),
+        sort_by,
+        order,
+    )
+    template = _templates.get(key)
+    if template is None:
+        template = _templates[key] = _build_template(*key)
+    return template
+
+
+# Function to build the parameters of a template's page statement
+# Parameters of options that are not set are unused by the template and left out
+def task_list_params(
+    user_id: int,
+    search: str | None,
+    filter_status: TaskStatus | None,
+    filter_priority: TaskPriority | None,
+    page_number: int,
+    page_size: int,
+) -> dict:
+    params = {
+        "user_id": user_id,
+        "offset": (page_number - 1) * page_size,
+        "limit": page_size,
+    }
+    if search:
+        params["search"] = f"%{search}%"
+    if filter_status:
+        params["filter_status"] = filter_status
+    if filter_priority:
+        params["filter_priority"] = filter_priority
+    return params
@@ -3,6 +3,7 @@ from fastapi.params import Depends
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy import select, insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from jose import jwt, ExpiredSignatureError, JWTError
 from datetime import datetime, timezone, timedelta
 from typing import Annotated
@@ -12,6 +13,9 @@ from app.db.models import User
 from app.schemas.user_schema import UserIn
 from app.core.security import Hash
 from app.core.config import config
+from app.core.single_flight import SingleFlight
+from app.db.memory_store import store
+from app.crud import memory_crud
 
 # OAuth2PasswordBearer is used to define the token URL for obtaining the OAuth2 password-based bearer token
 # It will automatically handle the validation of the token
@@ -28,11 +32,33 @@ credentials_exception = HTTPException(
 )
 
 
+# Single-flight group that coalesces identical concurrent user lookups (login and token storms)
+users_flight = SingleFlight("get_user_by_email")
+
+
 # * GET A USER by email
 # Function to retrieve a user from the database by their email.
 # It performs a query using SQLAlchemy's select statement to find a user whose email matches the provided email.
 # The result is a single user object, and if no user is found, it returns None.
-async def get_user_by_email(email: str, db: AsyncSession) -> User:
+# With coalesce=True, identical concurrent lookups share one query; this is only used on
+# read paths (login, token validation), never where the user was just created.
+async def get_user_by_email(
+    email: str, db: AsyncSession, coalesce: bool = False
+) -> User:
+    # With the in-memory storage backend, the user is read from the store
+    if store is not None:
+        return await memory_crud.get_user_by_email(email)
+
+    if coalesce:
+        # Only the column values are shared, every caller gets its own instance of the
+        # user in its own session (no session-bound object crosses requests)
+        row = await users_flight.do(email, lambda: _query_user_row(email, db))
+        if row is None:
+            return None
+        user = User(**row)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
     # Querying the database for a user with the given email using SQLAlchemy's 'select' and 'where' methods
     user = await db.scalar(select(User).where(User.email == email))
 
@@ -40,6 +66,18 @@ async def get_user_by_email(email: str, db: AsyncSession) -> User:
     return user
 
 
+# Function to read the column values of the user with the given email, as a plain mapping
+async def _query_user_row(email: str, db: AsyncSession):
+    result = await db.execute(user_row_query(email))
+    return result.mappings().first()
+
+
+# Function to build the query of a user's column values by email (login and every
+# authenticated request, see get_user_by_email with coalesce=True)
+def user_row_query(email: str):
+    return select(*User.__table__.columns).where(User.email == email)
+
+
 # * CREATE A USER
 # Function to create a new user in the database.
 # This function first checks if a user already exists with the provided email.
@@ -49,6 +87,10 @@ async def get_user_by_email(email: str, db: AsyncSession) -> User:
 # After that, it retrieves the newly inserted user by email to confirm the creation.
 # If the user is not found, it raises an HTTPException indicating an issue with the input data.
 async def create_user(request: UserIn, db: AsyncSession) -> User:
+    # With the in-memory storage backend, the user is added to the store
+    if store is not None:
+        return await memory_crud.create_user(request)
+
     # Check if a user with the same email already exists
     if await get_user_by_email(str(request.email), db):
         raise HTTPException(
@@ -147,8 +189,8 @@ def create_access_token(email: str) -> str:
 # and verifies that the provided password matches the stored hashed password.
 # If any of the checks fail, it raises an exception.
 async def authenticate_user(email: str, password: str, db: AsyncSession) -> User:
-    # Retrieve the user from the database by email.
-    user = await get_user_by_email(email, db)
+    # Retrieve the user from the database by email (shared with identical concurrent logins).
+    user = await get_user_by_email(email, db, coalesce=True)
 
     # If the user does not exist, raise a credentials exception.
     # This will prevent unauthorized access.
@@ -201,7 +243,8 @@ async def get_current_user(
         raise credentials_exception from e
 
     # Retrieve the user from the database using the email extracted from the token.
-    user = await get_user_by_email(email, db)
+    # Identical concurrent lookups (e.g. a shared token hitting many endpoints) share one query.
+    user = await get_user_by_email(email, db, coalesce=True)
 
     # If the user is not found in the database, raise credentials_exception (Unauthorized).
     if not user:
@@ -37,7 +37,8 @@ async def get_db():
 
 
 # Initializes the database by creating the necessary tables based on the metadata defined in your models.
-# This should be run at the start of your application.
+# The application runs the Alembic migrations on startup instead (see app/db/startup.py),
+# this is kept for throwaway databases (e.g. scripts and benchmarks).
 async def init_db():
     # Using engine.begin() to handle a database transaction for the schema creation.
     async with engine.begin() as conn:
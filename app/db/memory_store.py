@@ -0,0 +1,541 @@
+import asyncio
+import bisect
+import itertools
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, fields
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterable
+
+from app.core.config import config
+from app.core.enums import TaskOrder, TaskPriority, TaskSortBy, TaskStatus
+from app.core.metrics import register_metrics
+from app.db.models import PRIORITY_RANKS, STATUS_RANKS
+
+logger = logging.getLogger(__name__)
+
+# In-memory storage backend of the users and tasks (STORAGE_BACKEND=memory).
+# - All users and tasks are held in memory. Every user's tasks have sorted indexes on
+#   (due_date, id), (status_rank, id), (priority_rank, id) and (title, id), so a task page
+#   is a walk (or a plain slice, without filters) of one index.
+# - Every change is appended to a log (one JSON line per change, with a sequence number)
+#   before it is visible. With STORAGE_MEMORY_FSYNC, writers then await sync(), which
+#   fsyncs the log in a thread for all changes logged so far (group commit), so a write is
+#   only answered once it is on disk without blocking the event loop. Every STORAGE_MEMORY_SNAPSHOT_EVERY changes the whole state is
+#   written to a snapshot in a thread, after which the older log segments are deleted.
+# - On startup the last snapshot is loaded and the log segments are replayed on top of it;
+#   a line torn by a crash at the end of the log is dropped.
+# The store belongs to a single process: run one worker with it. The database is still used
+# for the scheduler lease and the idempotency keys; reminders and archival only apply to the
+# SQL backend.
+
+SNAPSHOT_FILE = "snapshot.json"
+LOG_PREFIX = "log-"  # Log segments are named after the first sequence number they hold
+
+
+# A stored user, with the attributes of the User model used by the application
+@dataclass(frozen=True, slots=True)
+class UserRecord:
+    id: int
+    fullname: str
+    email: str
+    password: str
+    is_active: bool = True
+    shard: str | None = None  # The in-memory store is never sharded
+
+    # Property: Get user's first name from full name
+    @property
+    def first_name(self) -> str:
+        return self.fullname.split(" ")[0]
+
+
+# A stored task, with the attributes of the Task model
+# Records are never changed in place, so snapshots can serialize them in a thread
+@dataclass(frozen=True, slots=True)
+class TaskRecord:
+    id: int
+    title: str
+    description: str
+    priority: TaskPriority
+    status: TaskStatus
+    created_at: datetime
+    due_date: datetime
+    user_id: int
+    status_rank: int
+    priority_rank: int
+
+
+# Function to store datetimes without their offset, like the DateTime columns of the SQL
+# backend (SQLite keeps the wall time and drops the offset)
+def _naive(value: datetime) -> datetime:
+    return value.replace(tzinfo=None)
+
+
+# Function to build a task record, deriving the sort ranks from the status and priority
+def _task_record(**values) -> TaskRecord:
+    values["priority"] = TaskPriority(values["priority"])
+    values["status"] = TaskStatus(values["status"])
+    values["created_at"] = _naive(values["created_at"])
+    values["due_date"] = _naive(values["due_date"])
+    values["status_rank"] = STATUS_RANKS[values["status"]]
+    values["priority_rank"] = PRIORITY_RANKS[values["priority"]]
+    return TaskRecord(**values)
+
+
+# Function to get the stored attributes of a record (ranks are derived, so they are left out)
+def _values(record: UserRecord | TaskRecord) -> dict[str, Any]:
+    return {
+        field.name: getattr(record, field.name)
+        for field in fields(record)
+        if field.name not in ("status_rank", "priority_rank")
+    }
+
+
+# Function to convert a record to its JSON form
+def _encode(record: UserRecord | TaskRecord) -> dict:
+    return {
+        name: value.isoformat() if isinstance(value, datetime) else value
+        for name, value in _values(record).items()
+    }
+
+
+# Function to convert the JSON form of a task back to a record
+def _decode_task(row: dict) -> TaskRecord:
+    row = dict(row)
+    row["created_at"] = datetime.fromisoformat(row["created_at"])
+    row["due_date"] = datetime.fromisoformat(row["due_date"])
+    return _task_record(**row)
+
+
+# Function to fsync a log segment (a segment closed meanwhile was synced when it was closed)
+def _fsync(file) -> None:
+    try:
+        os.fsync(file.fileno())
+    except ValueError:
+        pass
+
+
+# Function to get the position of the task in the index of the sort option
+def _sort_key(task: TaskRecord, sort_by: TaskSortBy) -> tuple:
+    match sort_by:
+        case TaskSortBy.status:
+            return (task.status_rank, task.id)
+        case TaskSortBy.priority:
+            return (task.priority_rank, task.id)
+        case TaskSortBy.title:
+            return (task.title, task.id)
+        case _:
+            return (task.due_date, task.id)
+
+
+# The tasks of one user, with one sorted index per sort option
+class UserTasks:
+    def __init__(self):
+        self.tasks: dict[int, TaskRecord] = {}
+        self.indexes: dict[TaskSortBy, list[tuple]] = {
+            sort_by: [] for sort_by in TaskSortBy
+        }
+
+    # Function to add the task, or replace the stored version of it
+    def put(self, task: TaskRecord) -> None:
+        old = self.tasks.get(task.id)
+        self.tasks[task.id] = task
+        for sort_by, index in self.indexes.items():
+            key = _sort_key(task, sort_by)
+            if old is not None:
+                old_key = _sort_key(old, sort_by)
+                if old_key == key:
+                    continue
+                del index[bisect.bisect_left(index, old_key)]
+            bisect.insort(index, key)
+
+    # Function to sort the indexes again from scratch (after loading a snapshot)
+    def rebuild(self) -> None:
+        for sort_by in self.indexes:
+            self.indexes[sort_by] = sorted(
+                _sort_key(task, sort_by) for task in self.tasks.values()
+            )
+
+    # Function to remove the task
+    def remove(self, task: TaskRecord) -> None:
+        del self.tasks[task.id]
+        for sort_by, index in self.indexes.items():
+            del index[bisect.bisect_left(index, _sort_key(task, sort_by))]
+
+    # Function to get a page of the tasks matching the filters, in the order of the sort option
+    # The (status_rank, id) and (priority_rank, id) indexes sort like the SQL backend; the
+    # id also breaks ties of the due date and title sorts
+    def page(
+        self,
+        search: str | None,
+        filter_status: TaskStatus | None,
+        filter_priority: TaskPriority | None,
+        sort_by: TaskSortBy | None,
+        order: TaskOrder | None,
+        offset: int,
+        limit: int,
+    ) -> list[TaskRecord]:
+        index = self.indexes[sort_by or TaskSortBy.due_date]
+        descending = order == TaskOrder.desc
+        offset = max(offset, 0)  # A negative offset counts as 0, like in SQL
+
+        # Without filters the page is a slice of the index
+        if not (search or filter_status or filter_priority):
+            if descending:
+                end = len(index) - offset
+                keys = index[max(end - limit, 0) : max(end, 0)][::-1]
+            else:
+                keys = index[offset : offset + limit]
+            return [self.tasks[key[-1]] for key in keys]
+
+        # Otherwise walk the index, skipping the tasks that do not match
+        search = search.lower() if search else None
+        matches = (
+            task
+            for task in (
+                self.tasks[key[-1]]
+                for key in (reversed(index) if descending else index)
+            )
+            if (filter_status is None or task.status == filter_status)
+            and (filter_priority is None or task.priority == filter_priority)
+            and (
+                search is None
+                or search in task.title.lower()
+                or search in task.description.lower()
+            )
+        )
+        return list(itertools.islice(matches, offset, offset + limit))
+
+
+# The store: the in-memory state and the log and snapshots it is persisted to
+class MemoryStore:
+    def __init__(self, path: str, snapshot_every: int, fsync: bool):
+        self.path = Path(path)  # Directory of the snapshot and the log segments
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.users: dict[int, UserRecord] = {}
+        self.users_by_email: dict[str, UserRecord] = {}
+        self.tasks: dict[int, TaskRecord] = {}
+        self.user_tasks: dict[int, UserTasks] = {}
+        self.next_user_id = 1
+        self.next_task_id = 1
+        self.seq = 0  # Sequence number of the last logged change
+        self._log = None  # Open log segment
+        self._synced = 0  # Sequence number of the last change known to be on disk
+        self._sync_task: asyncio.Task | None = None  # fsync running in a thread
+        self._logged = 0  # Changes logged since the last snapshot
+        self._snapshot_task: asyncio.Task | None = None
+        self.stats = {
+            "recovered_changes": 0,
+            "recovery_ms": 0.0,
+            "snapshots": 0,
+            "last_snapshot_ms": 0.0,
+        }
+
+    # RECOVERY
+    # Function to load the snapshot and replay the log, then open a new log segment
+    def recover(self) -> None:
+        started = time.perf_counter()
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        snapshot = self.path / SNAPSHOT_FILE
+        if snapshot.exists():
+            with snapshot.open(encoding="utf-8") as file:
+                state = json.load(file)
+            self.seq = state["seq"]
+            self.next_user_id = state["next_user_id"]
+            self.next_task_id = state["next_task_id"]
+            for row in state["users"]:
+                self._apply_user(UserRecord(**row))
+            # Load the tasks first and sort each user's indexes once
+            for row in state["tasks"]:
+                task = _decode_task(row)
+                self.tasks[task.id] = task
+                self.user_tasks.setdefault(task.user_id, UserTasks()).tasks[
+                    task.id
+                ] = task
+            for user_tasks in self.user_tasks.values():
+                user_tasks.rebuild()
+
+        replayed = 0
+        for segment in self._segments():
+            replayed += self._replay(segment)
+        self.stats["recovered_changes"] = replayed
+
+        self._open_segment()
+        self.stats["recovery_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(
+            "Memory store recovered %s users and %s tasks (%s logged changes) in %s ms",
+            len(self.users),
+            len(self.tasks),
+            replayed,
+            self.stats["recovery_ms"],
+        )
+
+    # Function to list the log segments, oldest first
+    def _segments(self) -> list[Path]:
+        return sorted(self.path.glob(f"{LOG_PREFIX}*.jsonl"))
+
+    # Function to apply the changes of a log segment that are newer than the snapshot
+    # A torn last line (the process died while writing it) is cut off the segment
+    def _replay(self, segment: Path) -> int:
+        replayed = 0
+        offset = 0
+        with segment.open("rb") as file:
+            for line in file:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    change = json.loads(line)
+                except ValueError:
+                    logger.warning(
+                        "Memory store dropped a torn change at the end of %s", segment
+                    )
+                    break
+                offset += len(line)
+                if change["seq"] > self.seq:
+                    self._apply_change(change)
+                    self.seq = change["seq"]
+                    replayed += 1
+        if offset < segment.stat().st_size:
+            os.truncate(segment, offset)
+        return replayed
+
+    # Function to apply a logged change to the state
+    def _apply_change(self, change: dict) -> None:
+        match change["op"]:
+            case "user":
+                self._apply_user(UserRecord(**change["row"]))
+            case "task":
+                self._apply_task(_decode_task(change["row"]))
+            case "delete_task":
+                self._remove_task(self.tasks[change["id"]])
+
+    # LOG
+    # Function to start a new log segment, named after the next sequence number
+    def _open_segment(self) -> Path:
+        if self._log is not None:
+            if self.fsync:
+                # The segment is closed here, so sync its last changes now
+                os.fsync(self._log.fileno())
+                self._synced = self.seq
+            self._log.close()
+        segment = self.path / f"{LOG_PREFIX}{self.seq + 1:012d}.jsonl"
+        self._log = segment.open("a", encoding="utf-8")
+        return segment
+
+    # Function to append changes to the log; they are written before they are applied
+    # With fsync enabled, writers await sync() before answering
+    def _append(self, changes: list[dict]) -> None:
+        lines = []
+        for change in changes:
+            self.seq += 1
+            lines.append(json.dumps({"seq": self.seq, **change}) + "\n")
+        self._log.write("".join(lines))
+        self._log.flush()
+
+        # Snapshot in the background once enough changes were logged
+        self._logged += len(changes)
+        if self._logged >= self.snapshot_every and self._snapshot_task is None:
+            self._snapshot_task = asyncio.create_task(self.snapshot())
+
+    # Function to wait until the changes logged so far are on disk (with fsync enabled)
+    # Concurrent writers share one fsync, run in a thread, for all the changes before it
+    async def sync(self) -> None:
+        if not self.fsync:
+            return
+        target = self.seq
+        while self._synced < target:
+            if self._sync_task is None:
+                self._sync_task = asyncio.create_task(self._sync_log())
+            await asyncio.shield(self._sync_task)
+
+    # Function to fsync the open log segment in a thread
+    async def _sync_log(self) -> None:
+        seq, log = self.seq, self._log
+        try:
+            await asyncio.to_thread(_fsync, log)
+            self._synced = max(self._synced, seq)
+        finally:
+            self._sync_task = None
+
+    # SNAPSHOTS
+    # Function to write the whole state to the snapshot and delete the log it covers
+    # The state is captured at once; the file is written in a thread while changes go on
+    # being logged to a new segment
+    async def snapshot(self) -> None:
+        started = time.perf_counter()
+        state = {
+            "seq": self.seq,
+            "next_user_id": self.next_user_id,
+            "next_task_id": self.next_task_id,
+            "users": list(self.users.values()),
+            "tasks": list(self.tasks.values()),
+        }
+        self._logged = 0
+        current = self._open_segment()
+        covered = [segment for segment in self._segments() if segment != current]
+        try:
+            await asyncio.to_thread(self._write_snapshot, state)
+            for segment in covered:
+                segment.unlink()
+        except Exception:
+            logger.exception("Memory store snapshot failed, the log is kept")
+        else:
+            self.stats["snapshots"] += 1
+            self.stats["last_snapshot_ms"] = round(
+                (time.perf_counter() - started) * 1000, 2
+            )
+        finally:
+            self._snapshot_task = None
+
+    # Function to write the snapshot file atomically (write, fsync, rename)
+    def _write_snapshot(self, state: dict) -> None:
+        state["users"] = [_encode(user) for user in state["users"]]
+        state["tasks"] = [_encode(task) for task in state["tasks"]]
+        temporary = self.path / f"{SNAPSHOT_FILE}.tmp"
+        with temporary.open("w", encoding="utf-8") as file:
+            json.dump(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path / SNAPSHOT_FILE)
+
+    # Function to snapshot the state and close the log on shutdown
+    async def close(self) -> None:
+        if self._snapshot_task is not None:
+            await self._snapshot_task
+        if self._logged:
+            await self.snapshot()
+        self._log.close()
+
+    # STATE
+    def _apply_user(self, user: UserRecord) -> None:
+        self.users[user.id] = user
+        self.users_by_email[user.email] = user
+        self.next_user_id = max(self.next_user_id, user.id + 1)
+
+    def _apply_task(self, task: TaskRecord) -> None:
+        self.tasks[task.id] = task
+        self.user_tasks.setdefault(task.user_id, UserTasks()).put(task)
+        self.next_task_id = max(self.next_task_id, task.id + 1)
+
+    def _remove_task(self, task: TaskRecord) -> None:
+        del self.tasks[task.id]
+        self.user_tasks[task.user_id].remove(task)
+
+    # OPERATIONS
+    # Function to get a user by email (None if there is none)
+    def get_user_by_email(self, email: str) -> UserRecord | None:
+        return self.users_by_email.get(email)
+
+    # Function to add a user
+    def create_user(self, fullname: str, email: str, password: str) -> UserRecord:
+        user = UserRecord(
+            id=self.next_user_id, fullname=fullname, email=email, password=password
+        )
+        self._append([{"op": "user", "row": _encode(user)}])
+        self._apply_user(user)
+        return user
+
+    # Function to get a task by ID (None if there is none)
+    def get_task(self, task_id: int) -> TaskRecord | None:
+        return self.tasks.get(task_id)
+
+    # Function to add a task of the user
+    def create_task(self, values: dict[str, Any], user_id: int) -> TaskRecord:
+        task = _task_record(
+            id=self.next_task_id,
+            status=TaskStatus.pending,
+            created_at=datetime.now(timezone.utc),
+            user_id=user_id,
+            **values,
+        )
+        self._append([{"op": "task", "row": _encode(task)}])
+        self._apply_task(task)
+        return task
+
+    # Function to change some attributes of tasks, all logged as one write
+    def update_tasks(
+        self, tasks: Iterable[TaskRecord], values: dict[str, Any]
+    ) -> list[TaskRecord]:
+        updated = [_task_record(**{**_values(task), **values}) for task in tasks]
+        if updated:
+            self._append([{"op": "task", "row": _encode(task)} for task in updated])
+            for task in updated:
+                self._apply_task(task)
+        return updated
+
+    # Function to delete a task
+    def delete_task(self, task: TaskRecord) -> None:
+        self._append([{"op": "delete_task", "id": task.id}])
+        self._remove_task(task)
+
+    # Function to get a page of the user's tasks and the user's task count
+    def get_tasks(
+        self,
+        user_id: int,
+        search: str | None,
+        filter_status: TaskStatus | None,
+        filter_priority: TaskPriority | None,
+        sort_by: TaskSortBy | None,
+        order: TaskOrder | None,
+        offset: int,
+        limit: int,
+    ) -> tuple[list[TaskRecord], int]:
+        user_tasks = self.user_tasks.get(user_id)
+        if user_tasks is None:
+            return [], 0
+        page = user_tasks.page(
+            search, filter_status, filter_priority, sort_by, order, offset, limit
+        )
+        return page, len(user_tasks.tasks)
+
+    # Function to expire the tasks whose due date has passed, returns the expired tasks
+    def expire_tasks(self, now: datetime) -> list[TaskRecord]:
+        now = _naive(now)
+        due = [
+            task
+            for task in self.tasks.values()
+            if task.due_date < now and task.status != TaskStatus.expired
+        ]
+        return self.update_tasks(due, {"status": TaskStatus.expired})
+
+
+# Create the store if the in-memory storage backend is selected (None for the SQL backend)
+if config.STORAGE_BACKEND not in ("sql", "memory"):
+    raise ValueError(f"Unknown STORAGE_BACKEND {config.STORAGE_BACKEND!r}")
+store = (
+    MemoryStore(
+        config.STORAGE_MEMORY_PATH,
+        config.STORAGE_MEMORY_SNAPSHOT_EVERY,
+        config.STORAGE_MEMORY_FSYNC,
+    )
+    if config.STORAGE_BACKEND == "memory"
+    else None
+)
+if store is not None:
+    register_metrics(
+        "memory_store",
+        lambda: {
+            **store.stats,
+            "users": len(store.users),
+            "tasks": len(store.tasks),
+            "seq": store.seq,
+            "logged_since_snapshot": store._logged,
+        },
+    )
+
+
+# Function to load the store on application startup (in-memory backend only)
+async def startup_store() -> None:
+    if store is not None:
+        store.recover()
+
+
+# Function to persist and close the store on application shutdown
+async def close_store() -> None:
+    if store is not None:
+        await store.close()
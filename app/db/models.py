@@ -1,10 +1,20 @@
 import enum
 
-from sqlalchemy import String, Integer, Boolean, DateTime, ForeignKey, Enum, Text
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import (
+    String,
+    Integer,
+    BigInteger,
+    Boolean,
+    DateTime,
+    Enum,
+    Text,
+    Index,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import Mapped, mapped_column, validates
 from datetime import datetime, timezone
 
-from app.core.enums import TaskPriority, TaskStatus
+from app.core.enums import TaskPriority, TaskStatus, ReminderStatus
 from app.db.database import Base
 
 
@@ -13,7 +23,7 @@ from app.db.database import Base
 class User(Base):
     __tablename__ = "users"  # Table name
 
-    # User attributes: id, fullname, email, password, is_active
+    # User attributes: id, fullname, email, password, is_active, shard
     id: Mapped[int] = mapped_column(
         Integer, primary_key=True, index=True, autoincrement=True
     )
@@ -23,19 +33,10 @@ class User(Base):
     )
     password: Mapped[str] = mapped_column(String(60), nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
-
-    # Relationship: One user has many tasks
-    tasks: Mapped[list["Task"]] = relationship(
-        "Task",
-        back_populates="user",
-        lazy="selectin",
-        cascade="all, delete-orphan",
-    )
-
-    # Property: Count of tasks for the user
-    @property
-    def tasks_count(self):
-        return len(self.tasks)
+    # Shard holding the user's tasks; None means the consistent-hash placement is used
+    shard: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # End of a move of the user's tasks to another shard; task requests are refused until then
+    shard_moving_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     # Property: Get user's first name from full name
     @property
@@ -44,7 +45,24 @@ class User(Base):
 
     # String representation for debugging
     def __repr__(self):
-        return f"<User(id={self.id}, fullname='{self.fullname}', email='{self.email}', is_active={self.is_active}, tasks_count={self.tasks_count})>"
+        return f"<User(id={self.id}, fullname='{self.fullname}', email='{self.email}', is_active={self.is_active})>"
+
+
+# Sort ranks of the task statuses and priorities, stored on every task so that sorting by
+# status or priority can walk an index instead of sorting by a CASE expression
+STATUS_RANKS = {TaskStatus.pending: 0, TaskStatus.expired: 1, TaskStatus.completed: 2}
+PRIORITY_RANKS = {TaskPriority.low: 0, TaskPriority.medium: 1, TaskPriority.high: 2}
+
+
+# Function to add the sort ranks matching the status and priority in the values of a
+# Core insert or update of tasks (ORM attribute changes are handled by Task itself)
+def with_sort_ranks(values: dict) -> dict:
+    values = dict(values)
+    if values.get("status") is not None:
+        values["status_rank"] = STATUS_RANKS[TaskStatus(values["status"])]
+    if values.get("priority") is not None:
+        values["priority_rank"] = PRIORITY_RANKS[TaskPriority(values["priority"])]
+    return values
 
 
 # TASK MODEL -> 'tasks'
@@ -52,7 +70,8 @@ class User(Base):
 class Task(Base):
     __tablename__ = "tasks"  # Table name
 
-    # Task attributes: id, title, description, priority, status, created_at, due_date
+    # Task attributes: id, title, description, priority, status, created_at, due_date,
+    # status_rank, priority_rank
     id: Mapped[int] = mapped_column(
         Integer, primary_key=True, index=True, autoincrement=True, nullable=False
     )
@@ -66,13 +85,138 @@ class Task(Base):
         DateTime, nullable=False, default=datetime.now(timezone.utc)
     )
     due_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # Sort ranks of the status and priority (see STATUS_RANKS and PRIORITY_RANKS)
+    status_rank: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=STATUS_RANKS[TaskStatus.pending]
+    )
+    priority_rank: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    # Id of the owning User, without a foreign key: with sharding the users live in the
+    # primary database, not in the shard holding the tasks (indexed by the indexes below)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
 
-    # Foreign key to User
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    __table_args__ = (
+        # Serves the scans for tasks by status ordered by due date (expiry, reminders, archival)
+        Index("ix_tasks_status_due_date", "status", "due_date", "id"),
+        # Serve the user's task pages sorted by status or priority as index walks
+        Index("ix_tasks_user_status_rank", "user_id", "status_rank", "id"),
+        Index("ix_tasks_user_priority_rank", "user_id", "priority_rank", "id"),
+        # Never reuse the ids of deleted or archived tasks on SQLite
+        {"sqlite_autoincrement": True},
+    )
 
-    # Relationship: Task belongs to a user
-    user: Mapped["User"] = relationship("User", back_populates="tasks")
+    # Keep the sort ranks in step when the status or priority is set on a Task object
+    @validates("status", "priority")
+    def _update_sort_rank(self, key, value):
+        if key == "status":
+            self.status_rank = STATUS_RANKS[TaskStatus(value)]
+        else:
+            self.priority_rank = PRIORITY_RANKS[TaskPriority(value)]
+        return value
 
     # String representation for debugging
     def __repr__(self):
         return f"<Task(id={self.id}, title='{self.title}', status={self.status}, created_at={self.created_at}, due_date={self.due_date})>"
+
+
+# ARCHIVED TASK MODEL -> 'tasks_archive'
+# Completed and expired tasks moved out of the 'tasks' table by the archival job
+# It has the same columns as Task (keeping the original id) plus archived_at
+class ArchivedTask(Base):
+    __tablename__ = "tasks_archive"  # Table name
+
+    # Archived task attributes: the Task attributes plus archived_at
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(String(255), nullable=False)
+    description: Mapped[str] = mapped_column(Text, nullable=False)
+    priority: Mapped[enum.Enum] = mapped_column(Enum(TaskPriority), nullable=False)
+    status: Mapped[enum.Enum] = mapped_column(Enum(TaskStatus), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    due_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    status_rank: Mapped[int] = mapped_column(Integer, nullable=False)
+    priority_rank: Mapped[int] = mapped_column(Integer, nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    # String representation for debugging
+    def __repr__(self):
+        return f"<ArchivedTask(id={self.id}, title='{self.title}', status={self.status}, due_date={self.due_date}, archived_at={self.archived_at})>"
+
+
+# SCHEDULER LEASE MODEL -> 'scheduler_leases'
+# Lease row used to elect a single worker process to run the scheduled jobs
+class SchedulerLease(Base):
+    __tablename__ = "scheduler_leases"  # Table name
+
+    # Lease attributes: name, holder, expires_at
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(255), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    # String representation for debugging
+    def __repr__(self):
+        return f"<SchedulerLease(name='{self.name}', holder='{self.holder}', expires_at={self.expires_at})>"
+
+
+# ID BLOCK MODEL -> 'id_blocks'
+# Next free id of a sequence shared by all shards, handed out to workers in blocks
+class IdBlock(Base):
+    __tablename__ = "id_blocks"  # Table name
+
+    # Id block attributes: name, next_id
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    next_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    # String representation for debugging
+    def __repr__(self):
+        return f"<IdBlock(name='{self.name}', next_id={self.next_id})>"
+
+
+# IDEMPOTENCY KEY MODEL -> 'idempotency_keys'
+# Outcome of a task write sent with an Idempotency-Key header, replayed to retries
+# A row without a status_code is a claim: the write is still running in some worker
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"  # Table name
+
+    # Idempotency key attributes: user_id, key, fingerprint, status_code, body, expires_at
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    body: Mapped[str | None] = mapped_column(Text, nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+    # String representation for debugging
+    def __repr__(self):
+        return f"<IdempotencyKey(user_id={self.user_id}, key='{self.key}', status_code={self.status_code}, expires_at={self.expires_at})>"
+
+
+# TASK REMINDER MODEL -> 'task_reminders'
+# Outbox of due date reminders, filled by the scheduler and drained by the dispatcher
+class TaskReminder(Base):
+    __tablename__ = "task_reminders"  # Table name
+
+    # Reminder attributes: id, task_id, user_id, title, due_date, remind_at, status, attempts
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    task_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    title: Mapped[str] = mapped_column(String(255), nullable=False)
+    due_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    remind_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    status: Mapped[enum.Enum] = mapped_column(
+        Enum(ReminderStatus), nullable=False, default=ReminderStatus.pending
+    )
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    claimed_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # One reminder per task and due date, so a task is never enqueued twice
+        UniqueConstraint("task_id", "due_date", name="uq_task_reminders_task_due"),
+        # Serves the dispatcher's scan for reminders in a given state
+        Index("ix_task_reminders_status_id", "status", "id"),
+    )
+
+    # String representation for debugging
+    def __repr__(self):
+        return f"<TaskReminder(id={self.id}, task_id={self.task_id}, status={self.status}, remind_at={self.remind_at})>"
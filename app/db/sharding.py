@@ -0,0 +1,458 @@
+import argparse
+import asyncio
+import bisect
+import functools
+import hashlib
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, Any, Awaitable, Callable
+
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from app.core.config import config
+from app.crud.user_crud import get_current_user
+from app.db.database import AsyncSessionLocal, get_db
+from app.db.models import ArchivedTask, IdBlock, Task, TaskReminder, User
+from app.db.startup import startup_db
+
+# Sharding of task data by user_id (enabled by setting DATABASE_SHARD_URLS):
+# - Users, scheduler leases and id blocks stay in the primary database (DATABASE_URL).
+# - Tasks, archived tasks and reminders of a user live in exactly one shard. The shard is
+#   stored on the user row (users.shard, loaded by get_current_user anyway); users without
+#   one are placed by a consistent-hash ring over the configured shards.
+# - Task ids are allocated from a sequence in the primary database, so they are unique
+#   across shards and are kept when a user's tasks are moved to another shard.
+
+# Longest time a user's task requests are refused by a move
+MOVE_LOCK_SECONDS = 3600
+# Wait for the user's requests already running before a move copies
+MOVE_DRAIN_SECONDS = 5
+
+logger = logging.getLogger(__name__)
+
+
+# A single shard database
+@dataclass
+class Shard:
+    name: str  # Shard name, stored in users.shard
+    engine: AsyncEngine  # Async engine of the shard
+    sessionmaker: async_sessionmaker[AsyncSession]  # Session maker of the shard
+
+
+# Consistent-hash ring mapping user ids to shard names
+# Each shard owns many virtual points on the ring, so adding a shard only moves ~1/N users
+class HashRing:
+    def __init__(self, names: list[str], points_per_shard: int = 128):
+        self._points: list[tuple[int, str]] = sorted(
+            (self._hash(f"{name}#{i}"), name)
+            for name in names
+            for i in range(points_per_shard)
+        )
+        self._keys = [point for point, _ in self._points]
+
+    # Function to hash a key to a position on the ring
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest())
+
+    # Function to find the shard owning the user id (the first point clockwise)
+    def shard_for(self, user_id: int) -> str:
+        index = bisect.bisect(self._keys, self._hash(str(user_id))) % len(self._keys)
+        return self._points[index][1]
+
+
+# Function to create a shard with its own engine and session maker
+def _create_shard(index: int, url: str) -> Shard:
+    engine = create_async_engine(url, echo=config.DATABASE_ECHO)
+    return Shard(
+        name=f"shard{index}",
+        engine=engine,
+        sessionmaker=async_sessionmaker(
+            engine, class_=AsyncSession, expire_on_commit=False
+        ),
+    )
+
+
+# Create the configured shards and the ring placing users on them
+shards: dict[str, Shard] = {
+    shard.name: shard
+    for shard in (
+        _create_shard(index, url)
+        for index, url in enumerate(config.DATABASE_SHARD_URLS)
+    )
+}
+ring = HashRing(list(shards)) if shards else None
+
+
+# Function to get a configured shard by name
+def get_shard(name: str) -> Shard:
+    try:
+        return shards[name]
+    except KeyError:
+        raise LookupError(
+            f"Shard '{name}' is not configured (DATABASE_SHARD_URLS has: {', '.join(shards) or 'none'})"
+        ) from None
+
+
+# Function to resolve the shard holding the user's tasks (None when not sharded)
+def shard_for_user(user: User) -> Shard | None:
+    if not shards:
+        return None
+    return get_shard(user.shard or ring.shard_for(user.id))
+
+
+# Function to get the session maker for the user's tasks
+def task_sessionmaker(user: User) -> async_sessionmaker[AsyncSession]:
+    shard = shard_for_user(user)
+    return shard.sessionmaker if shard else AsyncSessionLocal
+
+
+# Function to list the session makers of every database holding tasks (for the scheduled jobs)
+def task_sessionmakers() -> list[async_sessionmaker[AsyncSession]]:
+    if not shards:
+        return [AsyncSessionLocal]
+    return [shard.sessionmaker for shard in shards.values()]
+
+
+# Decorator to run a scheduled job once per database holding tasks, in parallel
+# The job takes the session maker of the database it works on
+def on_every_shard(
+    job: Callable[[async_sessionmaker[AsyncSession]], Awaitable[Any]],
+) -> Callable[[], Awaitable[list]]:
+    @functools.wraps(job)
+    async def wrapper() -> list:
+        return await asyncio.gather(
+            *(job(sessionmaker) for sessionmaker in task_sessionmakers())
+        )
+
+    return wrapper
+
+
+# Function to get the ids of the users whose tasks are being moved to another shard
+# The scheduled jobs leave their tasks alone until the move is done (see move_user)
+async def moving_user_ids() -> list[int]:
+    if not shards:
+        return []
+    async with AsyncSessionLocal() as db:
+        result = await db.scalars(
+            select(User.id).where(User.shard_moving_until > _utcnow())
+        )
+        return result.all()
+
+
+# Dependency that provides a session on the shard of the current user.
+# Without sharding it is the same session as get_db, so a request still uses one session.
+# While the user's tasks are being moved to another shard, the request is refused (503).
+async def get_task_db(
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+):
+    shard = shard_for_user(current_user)
+    if shard is None:
+        yield db
+        return
+    moving_until = current_user.shard_moving_until
+    if moving_until is not None and moving_until > _utcnow():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Request rejected: Tasks are being moved, retry shortly",
+            headers={"Retry-After": str(MOVE_DRAIN_SECONDS)},
+        )
+    async with shard.sessionmaker() as session:
+        yield session
+
+
+# Function to prepare every shard database on application startup, in parallel
+async def startup_shards() -> None:
+    await asyncio.gather(
+        *(startup_db(shard.engine, shard.name) for shard in shards.values())
+    )
+
+
+# Allocator of task ids, unique across shards
+# Reserves blocks of DATABASE_SHARD_ID_BLOCK ids from the 'id_blocks' row in the primary
+# database and hands them out from memory, so only one in every block allocations
+# touches the primary database.
+class IdAllocator:
+    def __init__(self, name: str, block_size: int):
+        self.name = name
+        self.block_size = block_size
+        self._next = 0  # Next id to hand out
+        self._end = 0  # End (exclusive) of the reserved block
+        self._lock = asyncio.Lock()
+
+    # Function to get the next task id
+    async def next_id(self) -> int:
+        async with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = await self._reserve_block()
+            self._next += 1
+            return self._next - 1
+
+    # Function to reserve the next block of ids in the primary database
+    async def _reserve_block(self) -> tuple[int, int]:
+        async with AsyncSessionLocal() as db:
+            # Move the shared counter first, which locks the row until the commit
+            result = await db.execute(
+                update(IdBlock)
+                .where(IdBlock.name == self.name)
+                .values(next_id=IdBlock.next_id + self.block_size)
+            )
+            if result.rowcount == 0:
+                # First allocation ever, create the counter
+                try:
+                    await db.execute(
+                        insert(IdBlock).values(
+                            name=self.name, next_id=1 + self.block_size
+                        )
+                    )
+                except IntegrityError:
+                    await db.rollback()
+                    return await self._reserve_block()
+            end = await db.scalar(
+                select(IdBlock.next_id).where(IdBlock.name == self.name)
+            )
+            await db.commit()
+        return end - self.block_size, end
+
+
+# Create the task id allocator
+task_ids = IdAllocator("tasks", config.DATABASE_SHARD_ID_BLOCK)
+
+
+# Function to get an explicit id for a new task (None when not sharded, the database assigns it)
+async def new_task_id() -> int | None:
+    if not shards:
+        return None
+    return await task_ids.next_id()
+
+
+# Function to get the current UTC time as stored in DateTime columns (naive)
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# REBALANCING TOOLS
+# Function to copy all rows of the user from one table to another database, in batches
+# Returns the ids of the copied rows in the source database
+async def _copy_rows(
+    table, user_id: int, source: AsyncSession, target: AsyncSession, keep_ids: bool
+) -> list[int]:
+    copied, last_id = [], 0
+    columns = [c for c in table.columns if keep_ids or not c.primary_key]
+    while True:
+        rows = (
+            await source.execute(
+                select(table)
+                .where(table.c.user_id == user_id, table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(500)
+            )
+        ).all()
+        if not rows:
+            return copied
+        await target.execute(
+            insert(table),
+            [{c.key: row._mapping[c] for c in columns} for row in rows],
+        )
+        copied.extend(row.id for row in rows)
+        last_id = rows[-1].id
+
+
+# Function to set the user's shard and move flag in the primary database
+async def _set_placement(user_id: int, **values) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(User).where(User.id == user_id).values(**values))
+        await db.commit()
+
+
+# Function to move all task data of the user to the target shard
+# Steps:
+# - Refuse the user's task requests (users.shard_moving_until, see get_task_db) and wait
+#   for the ones already running, so nothing is written to the source during the copy.
+# - Copy to the target (replacing leftovers of an earlier, interrupted move).
+# - Point users.shard at the target and let the user's requests in again.
+# - Delete exactly the copied rows from the source. Rows written there in the meantime
+#   are kept and reported, never deleted unseen. The expiry and archival jobs skip the
+#   user while the move runs (see moving_user_ids).
+async def move_user(user: User, target_name: str) -> int:
+    source, target = shard_for_user(user), get_shard(target_name)
+    if source is target:
+        return 0
+
+    tables = [Task.__table__, ArchivedTask.__table__, TaskReminder.__table__]
+    await _set_placement(
+        user.id,
+        shard_moving_until=_utcnow() + timedelta(seconds=MOVE_LOCK_SECONDS),
+    )
+    switched = False
+    try:
+        await asyncio.sleep(MOVE_DRAIN_SECONDS)
+        async with source.sessionmaker() as src, target.sessionmaker() as dst:
+            for table in tables:
+                await dst.execute(delete(table).where(table.c.user_id == user.id))
+            # Task ids are kept, reminder ids are shard-local and reassigned
+            copied = {
+                table: await _copy_rows(
+                    table,
+                    user.id,
+                    src,
+                    dst,
+                    keep_ids=table is not TaskReminder.__table__,
+                )
+                for table in tables
+            }
+            await dst.commit()
+
+            await _set_placement(user.id, shard=target_name, shard_moving_until=None)
+            switched = True
+
+            for table, ids in copied.items():
+                for start in range(0, len(ids), 500):
+                    await src.execute(
+                        delete(table).where(table.c.id.in_(ids[start : start + 500]))
+                    )
+            await src.commit()
+
+            # Verify that nothing of the user is left behind on the source
+            for table in tables:
+                left = await src.scalar(
+                    select(func.count())
+                    .select_from(table)
+                    .where(table.c.user_id == user.id)
+                )
+                if left:
+                    logger.warning(
+                        "%d rows of user %d were written to %s.%s during the move and were kept there",
+                        left,
+                        user.id,
+                        source.name,
+                        table.name,
+                    )
+    finally:
+        if not switched:
+            await _set_placement(user.id, shard_moving_until=None)
+    return len(copied[Task.__table__])
+
+
+# Function to iterate over all users of the primary database, in batches
+async def _iter_users():
+    last_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            users = (
+                await db.scalars(
+                    select(User)
+                    .where(User.id > last_id)
+                    .order_by(User.id)
+                    .limit(500)
+                    .execution_options(populate_existing=True)
+                )
+            ).all()
+        if not users:
+            return
+        for user in users:
+            yield user
+        last_id = users[-1].id
+
+
+# Function to store the current placement of every user without one on the user row
+# Run it before changing DATABASE_SHARD_URLS, so no user's tasks move implicitly.
+# With a shard name, all those users are pinned to that shard instead (e.g. when an
+# existing database becomes the first shard) and the task id sequence is moved past
+# the ids already used there.
+async def pin_users(shard_name: str | None = None) -> int:
+    pinned = 0
+    async for user in _iter_users():
+        if user.shard is None:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(User)
+                    .where(User.id == user.id)
+                    .values(shard=shard_name or ring.shard_for(user.id))
+                )
+                await db.commit()
+            pinned += 1
+
+    # Start the shared id sequence after the highest task id of any shard
+    max_ids = []
+    for shard in shards.values():
+        async with shard.sessionmaker() as db:
+            max_ids.append(await db.scalar(select(func.max(Task.id))) or 0)
+            max_ids.append(await db.scalar(select(func.max(ArchivedTask.id))) or 0)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(IdBlock)
+            .where(IdBlock.name == task_ids.name, IdBlock.next_id <= max(max_ids))
+            .values(next_id=max(max_ids) + 1)
+        )
+        if result.rowcount == 0 and not await db.get(IdBlock, task_ids.name):
+            await db.execute(
+                insert(IdBlock).values(name=task_ids.name, next_id=max(max_ids) + 1)
+            )
+        await db.commit()
+    return pinned
+
+
+# Function to move every user whose shard differs from their ring placement
+# Run it after adding shards to DATABASE_SHARD_URLS to spread users onto the new shards
+async def rebalance(dry_run: bool = False) -> dict[str, int]:
+    moves: dict[str, int] = {}
+    async for user in _iter_users():
+        target = ring.shard_for(user.id)
+        if shard_for_user(user).name != target:
+            moves[target] = moves.get(target, 0) + 1
+            if not dry_run:
+                await move_user(user, target)
+    return moves
+
+
+# Command line entry point: python -m app.db.sharding {pin,move,rebalance}
+async def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.db.sharding")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pin_parser = commands.add_parser(
+        "pin", help="store the current shard on every user"
+    )
+    pin_parser.add_argument("shard", nargs="?", help="pin all unplaced users here")
+    move_parser = commands.add_parser("move", help="move one user to a shard")
+    move_parser.add_argument("user_id", type=int)
+    move_parser.add_argument("shard")
+    rebalance_parser = commands.add_parser(
+        "rebalance", help="move users to their ring placement"
+    )
+    rebalance_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not shards:
+        parser.error("DATABASE_SHARD_URLS is not set")
+
+    if getattr(args, "shard", None) is not None:
+        try:
+            get_shard(args.shard)
+        except LookupError as e:
+            parser.error(str(e))
+
+    if args.command == "pin":
+        print(f"Pinned {await pin_users(args.shard)} users")
+    elif args.command == "move":
+        async with AsyncSessionLocal() as db:
+            user = await db.get(User, args.user_id)
+        if user is None:
+            parser.error(f"User with id {args.user_id} not found")
+        print(f"Moved {await move_user(user, args.shard)} tasks to {args.shard}")
+    else:
+        print(f"Moves per target shard: {await rebalance(args.dry_run)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import config
+from app.core.metrics import register_metrics
+from app.crud.task_queries import task_list_params, task_list_template
+from app.crud.user_crud import user_row_query
+from app.db import statement_cache  # noqa: F401 (counts compiled cache hits)
+from app.db.database import engine
+from app.db.models import Task, User
+
+logger = logging.getLogger(__name__)
+
+# Root of the project, where alembic.ini and the migrations directory live
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+# Timing breakdown (in milliseconds) of the last startup per database, exposed on the metrics endpoint
+timings: dict[str, dict[str, float]] = {}
+register_metrics("startup", lambda: dict(timings))
+
+# Alembic keeps the running migration in module state, so databases are migrated one at a time
+_migrate_lock = asyncio.Lock()
+
+# Lock serializing the migrations of the worker processes starting together
+MIGRATION_LOCK_NAME = "todo_list_api_migrations"
+MIGRATION_LOCK_TIMEOUT_SECONDS = 300  # Max wait for another process to finish migrating
+
+
+# Function to build the Alembic configuration, independent of the working directory
+def alembic_config() -> Config:
+    alembic_cfg = Config(str(PROJECT_ROOT / "alembic.ini"))
+    alembic_cfg.set_main_option("script_location", str(PROJECT_ROOT / "migrations"))
+    return alembic_cfg
+
+
+# Function to read the schema version stored in the database (None if never migrated)
+def _current_revision(connection: Connection) -> str | None:
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+# Function to hold a lock that keeps other processes from migrating the same database
+# - SQLite: the database's write lock, taken up front and held until the transaction ends
+# - MySQL: a named lock of the connection, released when the migration is done
+# - PostgreSQL: an advisory lock of the transaction
+@contextmanager
+def _schema_lock(connection: Connection) -> Iterator[None]:
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        # Wait for the lock as long as for the other databases, then restore the timeout
+        # of the pooled connection
+        busy_timeout = connection.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        connection.exec_driver_sql(
+            f"PRAGMA busy_timeout = {MIGRATION_LOCK_TIMEOUT_SECONDS * 1000}"
+        )
+        try:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        finally:
+            connection.exec_driver_sql(f"PRAGMA busy_timeout = {busy_timeout}")
+        yield
+    elif dialect in ("mysql", "mariadb"):
+        acquired = connection.execute(
+            text("SELECT GET_LOCK(:name, :timeout)"),
+            {"name": MIGRATION_LOCK_NAME, "timeout": MIGRATION_LOCK_TIMEOUT_SECONDS},
+        ).scalar()
+        if acquired != 1:
+            raise RuntimeError("Timed out waiting for another process to migrate")
+        try:
+            yield
+        finally:
+            connection.execute(
+                text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK_NAME}
+            )
+    elif dialect == "postgresql":
+        connection.execute(
+            text("SELECT pg_advisory_xact_lock(hashtext(:name))"),
+            {"name": MIGRATION_LOCK_NAME},
+        )
+        yield
+    else:
+        yield
+
+
+# Function to bring the schema to the latest revision on the given connection
+# The version is read again under the lock, as another worker may have migrated meanwhile;
+# returns the revision the schema was migrated from, or the head if it was up to date.
+# Databases created by create_all before migrations existed have no version row and are
+# adopted by the first revision (see migrations/versions/0001_initial_schema.py).
+def _upgrade(connection: Connection, head: str) -> str | None:
+    with _schema_lock(connection):
+        current = _current_revision(connection)
+        if current != head:
+            alembic_cfg = alembic_config()
+            alembic_cfg.attributes["connection"] = connection
+            command.upgrade(alembic_cfg, "head")
+        return current
+
+
+# Function to open pooled connections up front, so the first requests do not pay for them
+async def warm_pool(db_engine: AsyncEngine, count: int) -> None:
+    connections = await asyncio.gather(*(db_engine.connect() for _ in range(count)))
+    # Returning them all at once keeps every one of them in the pool
+    for connection in connections:
+        await connection.close()
+
+
+# Function to build statements with the same structure as the hot CRUD queries
+# Executing them once fills the engine's compiled statement cache
+def hot_statements() -> list[tuple]:
+    # get_tasks, default page (sorted by due date) and total count
+    tasks_page = task_list_template(None, None, None, None, None, False)
+    tasks_params = task_list_params(0, None, None, None, 1, 10)
+    return [
+        # get_user_by_email with coalescing (login and every authenticated request)
+        (user_row_query(""), {}),
+        # get_user_by_email without it (registration)
+        (select(User).where(User.email == ""), {}),
+        # get_task
+        (select(Task).where(Task.id == 0), {}),
+        (tasks_page.page, tasks_params),
+        (tasks_page.count, {"user_id": 0}),
+    ]
+
+
+# Function to compile the hot statements by executing them with parameters that match nothing
+async def precompile(db_engine: AsyncEngine) -> None:
+    async with db_engine.connect() as connection:
+        for statement, params in hot_statements():
+            await connection.execute(statement, params)
+
+
+# Function to prepare the database on application startup
+# - Checks the schema version row and only runs Alembic migrations when it is behind,
+#   instead of reflecting every table with create_all on each worker start. Workers
+#   starting together take a lock, so only the first one migrates.
+# - Pre-warms DATABASE_WARM_CONNECTIONS pooled connections.
+# - Pre-compiles the hot statements.
+# Returns the timing breakdown (in milliseconds), which is also logged.
+async def startup_db(
+    db_engine: AsyncEngine = engine, name: str = "primary"
+) -> dict[str, float]:
+    started = last = time.perf_counter()
+    step_timings = {}
+
+    # Function to record the time spent since the previous step
+    def lap(step: str) -> None:
+        nonlocal last
+        now = time.perf_counter()
+        step_timings[step] = round((now - last) * 1000, 2)
+        last = now
+
+    # Compare the stored schema version with the latest migration
+    async with db_engine.connect() as connection:
+        current = await connection.run_sync(_current_revision)
+    head = ScriptDirectory.from_config(alembic_config()).get_current_head()
+    lap("schema_check")
+
+    # Migrate only when the schema is behind, one process at a time
+    if current != head:
+        async with _migrate_lock, db_engine.begin() as connection:
+            current = await connection.run_sync(_upgrade, head)
+        if current != head:
+            logger.info(
+                "Database %s schema migrated from %s to %s", name, current, head
+            )
+    lap("migrate")
+
+    await warm_pool(db_engine, config.DATABASE_WARM_CONNECTIONS)
+    lap("pool_warmup")
+
+    await precompile(db_engine)
+    lap("precompile")
+
+    step_timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+    timings[name] = step_timings
+    logger.info("Database %s startup timings (ms): %s", name, step_timings)
+    return step_timings
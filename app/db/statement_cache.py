@@ -0,0 +1,36 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.metrics import register_metrics
+
+# Counters of the compiled statement cache lookups of every engine (primary and shards)
+# - hits: the statement was found compiled in the engine's cache
+# - misses: the statement had to be compiled (first use, or evicted from the cache)
+# - uncached: the statement cannot be cached (e.g. DDL or raw SQL strings)
+stats = {"executions": 0, "hits": 0, "misses": 0, "uncached": 0}
+
+
+# Function to return the counters and the hit rate of the cacheable executions
+def cache_stats() -> dict:
+    cacheable = stats["hits"] + stats["misses"]
+    return {
+        **stats,
+        "hit_rate": round(stats["hits"] / cacheable, 4) if cacheable else None,
+    }
+
+
+register_metrics("compiled_cache", cache_stats)
+
+
+# Count the cache lookup of every statement executed by any engine
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_cache_lookup(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    stats["executions"] += 1
+    if context.cache_hit == context.dialect.CACHE_HIT:
+        stats["hits"] += 1
+    elif context.cache_hit == context.dialect.CACHE_MISS:
+        stats["misses"] += 1
+    else:
+        stats["uncached"] += 1
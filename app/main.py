@@ -1,28 +1,63 @@
-from fastapi import FastAPI
+import logging
+
+from fastapi import Depends, FastAPI
 from contextlib import asynccontextmanager
 
 from app.services.background_tasks import schedular
-from app.db.database import init_db
-from app.routers import task, auth
+from app.services.leader_election import elector
+from app.db.startup import startup_db
+from app.db.sharding import startup_shards
+from app.db.memory_store import startup_store, close_store
+from app.core.config import config
+from app.routers import task, auth, metrics
+from app.services.task_events import broker
+from app.core.compression import CompressionMiddleware
+from app.services.write_behind import write_behind
+from app.services.admission import (
+    admit_client,
+    admit_user,
+    backend as admission_backend,
+)
 
 
 # Async context manager to manage the lifespan of the FastAPI application
 @asynccontextmanager
 async def lifespan(fastapi_app: FastAPI):
-    await init_db()  # Initialize the database connection on startup
+    # Migrate the schema if needed, warm up the pool and compile the hot statements
+    await startup_db()
+    await startup_shards()  # Same for every shard database, if sharding is enabled
+    await startup_store()  # Recover the in-memory store, if it is the storage backend
+    await elector.heartbeat()  # Try to become the scheduler leader before the first job runs
     schedular.start()
     yield  # Continue with the app's normal lifecycle
+    schedular.shutdown(wait=False)  # Stop scheduling jobs in this worker
+    await elector.release()  # Hand the scheduler lease over to another worker
+    await write_behind.drain()  # Write the task updates still in the write-behind queue
+    await close_store()  # Snapshot the in-memory store, if it is the storage backend
+    await broker.stop()  # Close the task events backend
+    await admission_backend.close()  # Close the rate limit backend
     print("App is shutting down...")  # Print a message when the app is shutting down
 
 
+# Send the application's log records (e.g. startup timings, reminders) to the console
+logging.basicConfig(
+    level=config.LOG_LEVEL, format="%(levelname)s:     [%(name)s] %(message)s"
+)
+
 # FastAPI app instance with custom lifespan management
 app = FastAPI(lifespan=lifespan)  # Assign the custom lifespan to the app
 
 # Include routers for user authentication and task management
+# Both are behind admission control: auth requests are rate limited per client address,
+# task requests per user (see app/services/admission.py)
 # Register the auth router with the "User" tag
-app.include_router(auth.router, tags=["User"])
+app.include_router(auth.router, tags=["User"], dependencies=[Depends(admit_client)])
 # Register the task router with the "Task" tag and a "/tasks" prefix
-app.include_router(task.router, prefix="/tasks", tags=["Task"])
-
-
-# TODO - due date reminder
+app.include_router(
+    task.router, prefix="/tasks", tags=["Task"], dependencies=[Depends(admit_user)]
+)
+# Register the metrics router with the "Metrics" tag
+app.include_router(metrics.router, tags=["Metrics"])
+
+# Compress the responses the client accepts encoded (see app/core/compression.py)
+app.add_middleware(CompressionMiddleware, minimum_size=config.COMPRESSION_MIN_SIZE)
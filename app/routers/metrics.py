@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+
+from app.core.metrics import collect_metrics
+
+router = APIRouter()
+
+
+# GET /metrics
+# GET request to retrieve the runtime metrics of this worker process
+@router.get("/metrics")
+async def get_metrics():
+    # Collect a snapshot from every registered metric provider
+    return collect_metrics()
@@ -1,19 +1,37 @@
-from fastapi import APIRouter, Depends, status
+import asyncio
+
+from fastapi import APIRouter, Depends, Header, Request, status
 from fastapi.params import Path, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Annotated
 
 from app.crud import task_crud as crud
 from app.db.database import get_db
+from app.db.sharding import get_task_db
 from app.db.models import User
 from app.core.enums import TaskPriority, TaskSortBy, TaskOrder, TaskStatus
-from app.schemas.task_schema import TaskBase, TaskOut, TaskUpdate, TaskListOut
+from app.schemas.task_schema import (
+    TaskBase,
+    TaskOut,
+    TaskUpdate,
+    TaskListOut,
+    TaskLookup,
+    TaskLookupOut,
+)
 from app.crud.user_crud import get_current_user
+from app.core.config import config
+from app.services.task_events import broker, format_sse
+from app.services.idempotency import idempotent_write
+from app.core.negotiation import TaskResponse, negotiate_response
 
 db_dependency: Annotated[AsyncSession, Depends(get_db)]
 user_dependency: Annotated[User, Depends(get_current_user)]
 
-router = APIRouter()
+# Task responses are JSON or MessagePack, as negotiated through Accept
+router = APIRouter(
+    default_response_class=TaskResponse, dependencies=[Depends(negotiate_response)]
+)
 
 
 # POST /tasks
@@ -25,11 +43,26 @@ async def create_task(
         User, Depends(get_current_user)
     ],  # The current authenticated user, fetched from the dependency
     db: Annotated[
-        AsyncSession, Depends(get_db)
-    ],  # The database session, fetched from the dependency
+        AsyncSession, Depends(get_task_db)
+    ],  # The database session on the user's shard, fetched from the dependency
+    http_request: Request,  # The incoming request, fingerprinted for the idempotency key
+    idempotency_key: Annotated[
+        str | None, Header(alias="Idempotency-Key", max_length=255)
+    ] = None,  # Optional key making retries of this request return the first response
 ):
     # Calling the CRUD function to create the task in the database
-    return await crud.create_task(request, current_user, db)
+    async def write() -> TaskOut:
+        return TaskOut.model_validate(await crud.create_task(request, current_user, db))
+
+    # Run the write once per Idempotency-Key (see app/services/idempotency.py)
+    return await idempotent_write(
+        http_request,
+        request,
+        current_user.id,
+        idempotency_key,
+        write,
+        status.HTTP_201_CREATED,
+    )
 
 
 # GET /tasks
@@ -40,8 +73,8 @@ async def get_tasks(
         User, Depends(get_current_user)
     ],  # The current authenticated user, fetched from the dependency
     db: Annotated[
-        AsyncSession, Depends(get_db)
-    ],  # The database session, fetched from the dependency
+        AsyncSession, Depends(get_task_db)
+    ],  # The database session on the user's shard, fetched from the dependency
     search: (
         str | None
     ) = Query(  # Optional search query to filter tasks by title or description
@@ -74,6 +107,10 @@ async def get_tasks(
     ),
     page_number: int = 1,  # The page number to return (default is 1) (Optional)
     page_size: int = 10,  # The number of tasks to return per page (default is 10) (Optional)
+    include_archived: bool = Query(  # Optional flag to include archived tasks
+        False,
+        description="Include archived (old completed and expired) tasks",
+    ),
 ):
     # Calling the CRUD function to fetch the tasks with the applied filters and sorting options
     return await crud.get_tasks(
@@ -84,11 +121,67 @@ async def get_tasks(
         order=order,  # Sorting order (asc or desc)
         page_number=page_number,  # Page number
         page_size=page_size,  # Page size (tasks limit)
+        include_archived=include_archived,  # Whether archived tasks are included
         user=current_user,  # Current authenticated user
         db=db,  # Database session
     )
 
 
+# GET /tasks/events
+# GET request to subscribe to live task changes as server-sent events
+# Declared before /{task_id} so "events" is not parsed as a task ID
+@router.get("/events", response_class=StreamingResponse)
+async def task_events(
+    request: Request,  # The incoming request, used to detect client disconnects
+    current_user: Annotated[
+        User, Depends(get_current_user)
+    ],  # The current authenticated user, fetched from the dependency
+):
+    # Register the subscription before streaming so no event is missed
+    subscription = await broker.subscribe(current_user.id)
+
+    # Generator that yields queued events, with keep-alive comments while idle
+    async def event_stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    payload = await asyncio.wait_for(
+                        subscription.queue.get(),
+                        timeout=config.TASK_EVENTS_KEEPALIVE_SECONDS,
+                    )
+                except asyncio.TimeoutError:
+                    # Keep proxies from closing the idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(payload)
+        finally:
+            # Always drop the subscription once the client goes away
+            broker.unsubscribe(subscription)
+
+    # Stream the events; disable proxy buffering so events are delivered immediately
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# POST /tasks/lookup
+# POST request to retrieve many tasks by their IDs in one call
+@router.post("/lookup", response_model=TaskLookupOut)
+async def lookup_tasks(
+    request: TaskLookup,  # The IDs of the tasks to fetch (at most TASKS_LOOKUP_MAX_IDS)
+    current_user: Annotated[
+        User, Depends(get_current_user)
+    ],  # The current authenticated user, fetched from the dependency
+    db: Annotated[
+        AsyncSession, Depends(get_task_db)
+    ],  # The database session on the user's shard, fetched from the dependency
+):
+    # Calling the CRUD function to fetch the tasks, with the missing and forbidden IDs
+    return await crud.get_tasks_by_ids(request.ids, current_user, db)
+
+
 # GET /tasks/{task_id}
 # GET request to retrieve a specific task by its ID
 @router.get("/{task_id}", response_model=TaskOut)
@@ -97,12 +190,12 @@ async def get_task(
         User, Depends(get_current_user)
     ],  # The current authenticated user, fetched from the dependency
     db: Annotated[
-        AsyncSession, Depends(get_db)
-    ],  # The database session, fetched from the dependency
+        AsyncSession, Depends(get_task_db)
+    ],  # The database session on the user's shard, fetched from the dependency
     task_id: int = Path(Ellipsis),  # Task ID provided as part of the URL path
 ):
-    # Calling the CRUD function to fetch the task by ID
-    return await crud.get_task(task_id, current_user, db)
+    # Calling the CRUD function to fetch the task by ID (archived tasks included)
+    return await crud.get_task(task_id, current_user, db, include_archived=True)
 
 
 # PATCH /tasks/{task_id}
@@ -114,12 +207,29 @@ async def update_task(
         User, Depends(get_current_user)
     ],  # The current authenticated user, fetched from the dependency
     db: Annotated[
-        AsyncSession, Depends(get_db)
-    ],  # The database session, fetched from the dependency
+        AsyncSession, Depends(get_task_db)
+    ],  # The database session on the user's shard, fetched from the dependency
+    http_request: Request,  # The incoming request, fingerprinted for the idempotency key
     task_id: int = Path(Ellipsis),  # Task ID provided as part of the URL path
+    idempotency_key: Annotated[
+        str | None, Header(alias="Idempotency-Key", max_length=255)
+    ] = None,  # Optional key making retries of this request return the first response
 ):
     # Calling the CRUD function to update the task based on the task ID and input data
-    return await crud.update_task(request, task_id, current_user, db)
+    async def write() -> TaskOut:
+        return TaskOut.model_validate(
+            await crud.update_task(request, task_id, current_user, db)
+        )
+
+    # Run the write once per Idempotency-Key (see app/services/idempotency.py)
+    return await idempotent_write(
+        http_request,
+        request,
+        current_user.id,
+        idempotency_key,
+        write,
+        status.HTTP_200_OK,
+    )
 
 
 # DELETE /tasks/{task_id}
@@ -130,8 +240,8 @@ async def delete_task(
         User, Depends(get_current_user)
     ],  # The current authenticated user, fetched from the dependency
     db: Annotated[
-        AsyncSession, Depends(get_db)
-    ],  # The database session, fetched from the dependency
+        AsyncSession, Depends(get_task_db)
+    ],  # The database session on the user's shard, fetched from the dependency
     task_id: int = Path(Ellipsis),  # Task ID provided as part of the URL path
 ):
     # Calling the CRUD function to delete the task based on the task ID
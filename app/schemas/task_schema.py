@@ -4,7 +4,8 @@ from typing import Any, Self
 from pydantic import BaseModel, ConfigDict, EmailStr, field_validator, Field
 from datetime import datetime
 
-from app.core.enums import TaskStatus
+from app.core.config import config
+from app.core.enums import TaskStatus, TaskEventType
 from app.db.models import TaskPriority
 
 
@@ -41,6 +42,18 @@ class TaskListOut(PaginationBase):
     tasks: list[TaskOut]
 
 
+# Task lookup model, lists the ids of the tasks to fetch in one request
+class TaskLookup(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=config.TASKS_LOOKUP_MAX_IDS)
+
+
+# Task lookup output model, includes the found tasks and the ids that were not returned
+class TaskLookupOut(BaseModel):
+    tasks: list[TaskOut]  # Found tasks, in the order of the requested ids
+    missing: list[int]  # Ids of tasks that do not exist
+    forbidden: list[int]  # Ids of tasks that belong to another user
+
+
 # Task update model, allows for optional updates to title, description, status, and due date
 class TaskUpdate(BaseModel):
     title: str | None = None
@@ -54,3 +67,11 @@ class TaskUpdate(BaseModel):
         if value not in [TaskStatus.pending, TaskStatus.completed]:
             raise ValueError("Status must be 'pending' or 'completed'")
         return value
+
+
+# Task event model, pushed to subscribed clients when one of their tasks changes
+class TaskEvent(BaseModel):
+    type: TaskEventType  # Kind of change (created, updated, deleted, expired, resync)
+    task_id: int | None = None  # ID of the changed task (None for resync events)
+    task: TaskOut | None = None  # Task state after the change (None for deletes)
+    occurred_at: datetime  # Time (UTC) when the change was published
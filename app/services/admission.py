@@ -0,0 +1,244 @@
+import asyncio
+import heapq
+import importlib
+import itertools
+import math
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import config
+from app.core.metrics import register_metrics
+from app.crud.user_crud import get_current_user
+from app.db.database import get_db
+from app.db.models import User
+
+# Admission control of the task and auth requests, in two steps:
+# 1. Rate limit: a token bucket per user (task routes) or per client address (auth routes).
+#    An empty bucket answers 429 at once, with Retry-After set to when a token is back.
+# 2. Load shedding: at most ADMISSION_MAX_IN_FLIGHT requests run at a time in a worker, so
+#    they cannot take more than the database pool. Other requests wait in a priority queue
+#    (cheap reads first, then writes, then searches and archive reads). If the queue is full
+#    or the wait exceeds ADMISSION_QUEUE_TIMEOUT_MS, the request is answered 503 with
+#    Retry-After: ADMISSION_RETRY_AFTER_SECONDS.
+# The buckets live in the configured backend, shared by all workers if it is a shared one;
+# the in-flight cap is always per worker, like the database pool it protects.
+
+# Priorities of the admission queue, lower ones are admitted first
+PRIORITY_READ = 0  # Single task and plain list reads
+PRIORITY_WRITE = 1  # Creates, updates, deletes and auth requests
+PRIORITY_HEAVY = 2  # Searches and reads including the archive
+
+# Routes that only read although they are POSTed (e.g. to send a body), ranked as reads
+READ_ONLY_POST_ROUTES = {"lookup_tasks"}
+
+
+# BACKENDS
+# Base rate limit backend, holding one token bucket per key
+# A shared backend (e.g. Redis) makes the limits apply across all workers
+class AdmissionBackend(ABC):
+    # Take a token from the key's bucket; returns 0 if taken, or the seconds until one is back
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: int) -> float: ...
+
+    # Release any connections held by the backend
+    async def close(self) -> None:
+        pass
+
+
+# In-process backend, used by default (the limits apply per worker)
+class LocalAdmissionBackend(AdmissionBackend):
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys  # Bucket count above which full buckets are dropped
+        # key -> (tokens, updated, rate, burst); keys of different routes have other limits
+        self._buckets: dict[str, tuple[float, float, float, int]] = {}
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, updated, _, _ = self._buckets.get(key, (burst, now, rate, burst))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now, rate, burst)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0
+        self._buckets[key] = (tokens, now, rate, burst)
+        return (1 - tokens) / rate
+
+    # Function to drop the buckets that have refilled completely (same as a new bucket),
+    # each with its own rate and burst
+    def _prune(self, now: float) -> None:
+        self._buckets = {
+            key: bucket
+            for key, bucket in self._buckets.items()
+            if bucket[0] + (now - bucket[1]) * bucket[2] < bucket[3]
+        }
+
+
+# Function to build the configured backend from ADMISSION_BACKEND ('module:Class')
+def load_backend(path: str | None) -> AdmissionBackend:
+    if not path:
+        return LocalAdmissionBackend()
+    module_name, _, class_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+# IN-FLIGHT CAP
+# Limits the requests running at a time; waiting requests are admitted by priority
+class InFlightLimiter:
+    def __init__(self, max_in_flight: int, max_queue: int):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0  # Requests holding a slot
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []  # Heap of waiters
+        self._order = itertools.count()  # FIFO order within a priority
+
+    # Property: Number of requests waiting for a slot
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    # Function to take a slot, waiting up to timeout seconds; returns whether it was taken
+    async def acquire(self, priority: int, timeout: float) -> bool:
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            return False
+
+        waiter = (
+            priority,
+            next(self._order),
+            asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._waiters, waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter[2]), timeout)
+            return True
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter[2].done():
+                # The slot was handed over just as the wait ended
+                if isinstance(e, asyncio.CancelledError):
+                    self.release()
+                    raise
+                return True
+            waiter[2].cancel()
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return False
+
+    # Function to give the slot back, handing it straight to the first waiter if any
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+# Create the backend, the in-flight cap and the counters shared by all requests
+backend = load_backend(config.ADMISSION_BACKEND)
+limiter = InFlightLimiter(config.ADMISSION_MAX_IN_FLIGHT, config.ADMISSION_MAX_QUEUE)
+stats = {"admitted": 0, "queued": 0, "shed_rate_limited": 0, "shed_overloaded": 0}
+register_metrics(
+    "admission",
+    lambda: {**stats, "in_flight": limiter.in_flight, "waiting": limiter.queued},
+)
+
+
+# Function to rank a request in the admission queue
+def request_priority(request: Request) -> int:
+    route = request.scope.get("route")
+    if (
+        request.method != "GET"
+        and getattr(route, "name", None) not in READ_ONLY_POST_ROUTES
+    ):
+        return PRIORITY_WRITE
+    search = request.query_params.get("search")
+    archived = request.query_params.get("include_archived", "").lower()
+    if search or archived in ("1", "true"):
+        return PRIORITY_HEAVY
+    return PRIORITY_READ
+
+
+# Context manager that admits a request, or raises the 429/503 response shedding it
+# Event streams are rate limited but hold no slot, they are idle most of the time
+@asynccontextmanager
+async def admit(request: Request, key: str, rate: float, burst: int, db=None):
+    if not config.ADMISSION_ENABLED:
+        yield
+        return
+
+    # Rate limit the user or client
+    retry_after = await backend.take(key, rate, burst)
+    if retry_after > 0:
+        stats["shed_rate_limited"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Request rejected: Rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+    route = request.scope.get("route")
+    if getattr(route, "response_class", None) is StreamingResponse:
+        stats["admitted"] += 1
+        yield
+        return
+
+    # Wait for a slot, without holding a pooled connection while queued
+    if limiter.in_flight >= limiter.max_in_flight:
+        stats["queued"] += 1
+        if db is not None:
+            await db.close()
+    admitted = await limiter.acquire(
+        request_priority(request), config.ADMISSION_QUEUE_TIMEOUT_MS / 1000
+    )
+    if not admitted:
+        stats["shed_overloaded"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Request rejected: Server is overloaded",
+            headers={"Retry-After": str(config.ADMISSION_RETRY_AFTER_SECONDS)},
+        )
+
+    stats["admitted"] += 1
+    try:
+        yield
+    finally:
+        limiter.release()
+
+
+# Dependency admitting requests of the task routes, rate limited per user
+async def admit_user(
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+):
+    async with admit(
+        request,
+        f"user:{current_user.id}",
+        config.ADMISSION_USER_RATE_PER_SECOND,
+        config.ADMISSION_USER_BURST,
+        db,
+    ):
+        yield
+
+
+# Dependency admitting requests of the auth routes, rate limited per client address
+async def admit_client(request: Request):
+    client = request.client.host if request.client else "unknown"
+    async with admit(
+        request,
+        f"client:{client}",
+        config.ADMISSION_CLIENT_RATE_PER_SECOND,
+        config.ADMISSION_CLIENT_BURST,
+    ):
+        yield
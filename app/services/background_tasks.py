@@ -1,17 +1,68 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
+from app.services.leader_election import elector, leader_only
+from app.db.sharding import on_every_shard
 from app.services.tasks_expire_service import tasks_expire_due_date
+from app.services.reminder_service import enqueue_due_reminders, dispatch_reminders
+from app.services.tasks_archive_service import tasks_archive_old
+from app.services.idempotency import purge_idempotency_keys
 from app.core.config import config
 
 # Create a scheduler instance for periodic task execution
+# The scheduler runs in every worker, but the jobs below only run in the elected leader
+# Jobs working on tasks run once per shard (or once on the single database)
 schedular = AsyncIOScheduler()
 
+# Add the lease heartbeat to the scheduler, it runs in every worker
+# The leader renews its lease, followers take over once the leader's lease expires
+schedular.add_job(
+    elector.heartbeat,  # Function to execute
+    IntervalTrigger(seconds=config.SCHEDULER_LEASE_RENEW_SECONDS),  # Renewal interval
+    id="leader_heartbeat_job",  # Unique job ID for identification
+    replace_existing=True,  # Replace any existing job with the same ID
+)
+
 # Add the 'tasks_expire_due_date' function to the scheduler to run at regular intervals
-# The job will run every minute (IntervalTrigger(1 hour))
+# The job will run every hour (IntervalTrigger(1 hour)), in the leader only
 schedular.add_job(
-    tasks_expire_due_date,  # Function to execute
+    leader_only(on_every_shard(tasks_expire_due_date)),  # Function to execute
     IntervalTrigger(hours=config.TASKS_EXPIRE_INTERVAL_HOURS),  # Set interval to 1 hour
     id="expire_task_job",  # Unique job ID for identification
     replace_existing=True,  # Replace any existing job with the same ID
 )
+
+# Add the 'enqueue_due_reminders' function to fill the reminder outbox at regular intervals
+schedular.add_job(
+    leader_only(on_every_shard(enqueue_due_reminders)),  # Function to execute
+    IntervalTrigger(seconds=config.REMINDER_ENQUEUE_INTERVAL_SECONDS),  # Fill interval
+    id="enqueue_reminders_job",  # Unique job ID for identification
+    replace_existing=True,  # Replace any existing job with the same ID
+)
+
+# Add the 'dispatch_reminders' function to drain the reminder outbox at regular intervals
+schedular.add_job(
+    leader_only(on_every_shard(dispatch_reminders)),  # Function to execute
+    IntervalTrigger(seconds=config.REMINDER_DISPATCH_INTERVAL_SECONDS),
+    id="dispatch_reminders_job",  # Unique job ID for identification
+    replace_existing=True,  # Replace any existing job with the same ID
+)
+
+# Add the 'tasks_archive_old' function to move finished tasks to the archive at regular intervals
+schedular.add_job(
+    leader_only(on_every_shard(tasks_archive_old)),  # Function to execute
+    IntervalTrigger(minutes=config.TASKS_ARCHIVE_INTERVAL_MINUTES),  # Archival interval
+    id="archive_tasks_job",  # Unique job ID for identification
+    replace_existing=True,  # Replace any existing job with the same ID
+)
+
+# Add the 'purge_idempotency_keys' function to delete expired idempotency keys at regular intervals
+# The keys live in the primary database, so the job runs once (not per shard)
+schedular.add_job(
+    leader_only(purge_idempotency_keys),  # Function to execute
+    IntervalTrigger(
+        minutes=config.IDEMPOTENCY_PURGE_INTERVAL_MINUTES
+    ),  # Purge interval
+    id="purge_idempotency_keys_job",  # Unique job ID for identification
+    replace_existing=True,  # Replace any existing job with the same ID
+)
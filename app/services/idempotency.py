@@ -0,0 +1,354 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import config
+from app.core.metrics import register_metrics
+from app.core.negotiation import TaskResponse
+from app.db.database import AsyncSessionLocal
+from app.db.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+# Idempotency keys for the task writes (POST /tasks, PATCH /tasks/{task_id}).
+# - The first request with a given (user, Idempotency-Key) runs the write. Its status code
+#   and body are kept for IDEMPOTENCY_TTL_SECONDS, in memory (bounded LRU) and in the
+#   'idempotency_keys' table, so every worker can replay them.
+# - Retries get the stored response (with an 'Idempotent-Replayed: true' header) without
+#   running the write again. Duplicates arriving while the first request is still running
+#   wait for its result: in the same worker on a shared future, in other workers by polling
+#   the claim row for up to IDEMPOTENCY_WAIT_SECONDS (then 409). If the first request is
+#   cancelled, one of the waiting duplicates runs the write instead.
+# - A claim only holds for IDEMPOTENCY_CLAIM_LEASE_SECONDS and is renewed while the write
+#   runs. If the worker dies, the lease lapses and a retry takes the key over and runs the
+#   write; only the stored outcome is kept for IDEMPOTENCY_TTL_SECONDS.
+# - The write and its outcome are committed in separate transactions. If the worker dies
+#   between the two, the write is done but the key is unanswered, so a retry after the
+#   lease runs the write again (at least once, not exactly once, in that window).
+# - Client errors (4xx) are stored like successes. If the write fails unexpectedly, the key
+#   is released so a retry runs it again.
+# - A key reused with a different request (method, path or body) is rejected with 422.
+
+
+# Stored outcome of a write
+@dataclass
+class StoredResponse:
+    fingerprint: str  # Hash of the request the key was first used with
+    status_code: int  # Status code of the response
+    body: str  # JSON body of the response
+    expires_at: float  # Expiry on the monotonic clock (in-memory copies only)
+
+
+# Counters of this worker's idempotency store, exposed on the metrics endpoint
+stats = {"executed": 0, "replayed": 0, "waited": 0, "conflicts": 0}
+register_metrics("idempotency", lambda: dict(stats))
+
+
+# Function to hash the parts of a request that must match when a key is reused
+def request_fingerprint(request: Request, body: BaseModel) -> str:
+    payload = f"{request.method} {request.url.path} {body.model_dump_json()}"
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# In-process cache in front of the 'idempotency_keys' table
+class IdempotencyStore:
+    def __init__(
+        self, ttl_seconds: int, max_size: int, wait_seconds: int, lease_seconds: int
+    ):
+        self.ttl = ttl_seconds
+        self.max_size = max_size
+        self.wait = wait_seconds
+        self.lease = lease_seconds
+        self._cache: OrderedDict[tuple[int, str], StoredResponse] = OrderedDict()
+        self._running: dict[tuple[int, str], asyncio.Future] = {}  # Writes in progress
+
+    # Function to run the write once per (user, key) and build the response to send
+    async def run(
+        self,
+        user_id: int,
+        key: str,
+        fingerprint: str,
+        write: Callable[[], Awaitable[Any]],
+        status_code: int,
+    ) -> TaskResponse:
+        cache_key = (user_id, key)
+        while True:
+            # Replay a result kept in this worker
+            stored = self._cached(cache_key)
+            if stored is not None:
+                return self._replay(stored, fingerprint)
+            future = self._running.get(cache_key)
+            if future is None:
+                return await self._execute(cache_key, fingerprint, write, status_code)
+
+            # Wait for the identical request running in this worker
+            stats["waited"] += 1
+            try:
+                stored = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # That request was cancelled, the first waiter runs the write in its place
+                if not future.cancelled():
+                    raise
+                continue
+            return self._replay(stored, fingerprint)
+
+    # Function to claim the key and run the write, or pick up the result of another worker
+    async def _execute(
+        self,
+        cache_key: tuple[int, str],
+        fingerprint: str,
+        write: Callable[[], Awaitable[Any]],
+        status_code: int,
+    ) -> TaskResponse:
+        future = asyncio.get_running_loop().create_future()
+        self._running[cache_key] = future
+        try:
+            stored = await self._claim(cache_key, fingerprint)
+            executed = stored is None
+            if executed:
+                stored = await self._write(cache_key, fingerprint, write, status_code)
+            self._remember(cache_key, stored)
+            future.set_result(stored)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody was waiting
+            raise
+        except BaseException:
+            # Cancelled (client gone, shutdown), not an outcome to hand to the waiters
+            future.cancel()
+            raise
+        finally:
+            del self._running[cache_key]
+
+        if executed:
+            return self._response(stored, replayed=False)
+        # Another worker already ran this write
+        return self._replay(stored, fingerprint)
+
+    # Function to run the write and store its outcome
+    async def _write(
+        self,
+        cache_key: tuple[int, str],
+        fingerprint: str,
+        write: Callable[[], Awaitable[Any]],
+        status_code: int,
+    ) -> StoredResponse:
+        renewal = asyncio.create_task(self._renew_claim(cache_key))
+        try:
+            result = await write()
+        except HTTPException as e:
+            # Client errors are final, a retry would fail the same way
+            if e.status_code >= 500:
+                await self._release(cache_key)
+                raise
+            status_code, body = e.status_code, {"detail": e.detail}
+        except BaseException:
+            await self._release(cache_key)
+            raise
+        else:
+            body = jsonable_encoder(result)
+        finally:
+            renewal.cancel()
+
+        stats["executed"] += 1
+        stored = StoredResponse(
+            fingerprint, status_code, json.dumps(body), time.monotonic() + self.ttl
+        )
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(IdempotencyKey)
+                .where(
+                    IdempotencyKey.user_id == cache_key[0],
+                    IdempotencyKey.key == cache_key[1],
+                    IdempotencyKey.status_code.is_(None),
+                )
+                .values(
+                    status_code=stored.status_code,
+                    body=stored.body,
+                    expires_at=datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+                )
+            )
+            await db.commit()
+        return stored
+
+    # Function to extend the lease of the key's claim while its write is running
+    async def _renew_claim(self, cache_key: tuple[int, str]) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(IdempotencyKey)
+                        .where(
+                            IdempotencyKey.user_id == cache_key[0],
+                            IdempotencyKey.key == cache_key[1],
+                            IdempotencyKey.status_code.is_(None),
+                        )
+                        .values(
+                            expires_at=datetime.now(timezone.utc)
+                            + timedelta(seconds=self.lease)
+                        )
+                    )
+                    await db.commit()
+            except Exception:
+                logger.warning("Failed to renew an idempotency claim", exc_info=True)
+
+    # Function to insert the claim row of the key, leased for IDEMPOTENCY_CLAIM_LEASE_SECONDS
+    # Returns None once claimed, or the outcome of the worker that claimed it first
+    async def _claim(
+        self, cache_key: tuple[int, str], fingerprint: str
+    ) -> StoredResponse | None:
+        user_id, key = cache_key
+        deadline = time.monotonic() + self.wait
+        while True:
+            now = datetime.now(timezone.utc)
+            async with AsyncSessionLocal() as db:
+                # Drop an expired outcome or a lapsed claim of the key, it no longer counts
+                await db.execute(
+                    delete(IdempotencyKey).where(
+                        IdempotencyKey.user_id == user_id,
+                        IdempotencyKey.key == key,
+                        IdempotencyKey.expires_at <= now,
+                    )
+                )
+                try:
+                    await db.execute(
+                        insert(IdempotencyKey).values(
+                            user_id=user_id,
+                            key=key,
+                            fingerprint=fingerprint,
+                            expires_at=now + timedelta(seconds=self.lease),
+                        )
+                    )
+                    await db.commit()
+                    return None
+                except IntegrityError:
+                    await db.rollback()
+                row = await db.scalar(
+                    select(IdempotencyKey).where(
+                        IdempotencyKey.user_id == user_id, IdempotencyKey.key == key
+                    )
+                )
+
+            if row is not None:
+                if row.fingerprint != fingerprint:
+                    raise self._reuse_error()
+                if row.status_code is not None:
+                    return StoredResponse(
+                        row.fingerprint,
+                        row.status_code,
+                        row.body,
+                        time.monotonic() + self.ttl,
+                    )
+
+            # Another worker is running the write, poll until it stores the outcome
+            if time.monotonic() >= deadline:
+                stats["conflicts"] += 1
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Request failed: A request with this Idempotency-Key is still in progress",
+                )
+            await asyncio.sleep(0.05)
+
+    # Function to delete the claim row so the write can run again
+    async def _release(self, cache_key: tuple[int, str]) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(IdempotencyKey).where(
+                    IdempotencyKey.user_id == cache_key[0],
+                    IdempotencyKey.key == cache_key[1],
+                    IdempotencyKey.status_code.is_(None),
+                )
+            )
+            await db.commit()
+
+    # Function to get the unexpired in-memory outcome of the key
+    def _cached(self, cache_key: tuple[int, str]) -> StoredResponse | None:
+        stored = self._cache.get(cache_key)
+        if stored is None:
+            return None
+        if stored.expires_at <= time.monotonic():
+            del self._cache[cache_key]
+            return None
+        self._cache.move_to_end(cache_key)
+        return stored
+
+    # Function to keep the outcome in memory, evicting the least recently used ones
+    def _remember(self, cache_key: tuple[int, str], stored: StoredResponse) -> None:
+        self._cache[cache_key] = stored
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    # Function to answer a retry with the stored outcome
+    def _replay(self, stored: StoredResponse, fingerprint: str) -> TaskResponse:
+        if stored.fingerprint != fingerprint:
+            raise self._reuse_error()
+        stats["replayed"] += 1
+        return self._response(stored, replayed=True)
+
+    # Function to build the error of a key reused with a different request
+    @staticmethod
+    def _reuse_error() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Request failed: Idempotency-Key was already used with a different request",
+        )
+
+    # Function to build the response of a stored outcome
+    @staticmethod
+    def _response(stored: StoredResponse, replayed: bool) -> TaskResponse:
+        return TaskResponse(
+            content=json.loads(stored.body),
+            status_code=stored.status_code,
+            headers={"Idempotent-Replayed": "true"} if replayed else None,
+        )
+
+
+# Create the store shared by the task routes
+idempotency = IdempotencyStore(
+    config.IDEMPOTENCY_TTL_SECONDS,
+    config.IDEMPOTENCY_CACHE_SIZE,
+    config.IDEMPOTENCY_WAIT_SECONDS,
+    config.IDEMPOTENCY_CLAIM_LEASE_SECONDS,
+)
+
+
+# Function to run a task write, once per Idempotency-Key if the client sent one
+# Without a key the write's result is returned as is, for the route's response model
+async def idempotent_write(
+    request: Request,
+    body: BaseModel,
+    user_id: int,
+    key: str | None,
+    write: Callable[[], Awaitable[BaseModel]],
+    status_code: int,
+) -> Any:
+    if key is None:
+        return await write()
+    fingerprint = request_fingerprint(request, body)
+    return await idempotency.run(user_id, key, fingerprint, write, status_code)
+
+
+# Function to delete the expired keys from the table (scheduled job)
+async def purge_idempotency_keys() -> int:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            delete(IdempotencyKey).where(
+                IdempotencyKey.expires_at <= datetime.now(timezone.utc)
+            )
+        )
+        await db.commit()
+    return result.rowcount
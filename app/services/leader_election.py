@@ -0,0 +1,153 @@
+import functools
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.core.config import config
+from app.core.metrics import register_metrics
+from app.db.database import AsyncSessionLocal
+from app.db.models import SchedulerLease
+
+
+# Leader election based on a single lease row in the database.
+# Every worker process runs the scheduler, but only the worker holding the lease runs the jobs.
+# The leader renews the lease periodically; if it dies, the lease expires and the next
+# worker to send a heartbeat takes over (failover within SCHEDULER_LEASE_SECONDS).
+class LeaderElector:
+    def __init__(self, name: str, lease_seconds: int):
+        self.name = name  # Name of the lease row
+        self.lease_seconds = lease_seconds  # Lifetime of an acquired or renewed lease
+        # Unique identity of this worker process
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_expires_at: datetime | None = None  # Expiry of the lease held by us
+        self.current_leader: str | None = None  # Holder seen at the last heartbeat
+        self.leader_since: datetime | None = None  # When this worker became leader
+        self.terms = 0  # Number of times this worker became leader
+        self.heartbeat_failures = 0  # Heartbeats that failed on a database error
+
+    # Property: Whether this worker currently holds a valid lease
+    # The expiry is checked locally too, so a stalled worker steps down on its own
+    @property
+    def is_leader(self) -> bool:
+        return (
+            self.lease_expires_at is not None
+            and datetime.now(timezone.utc) < self.lease_expires_at
+        )
+
+    # Function to acquire the lease, or renew it if this worker already holds it
+    async def heartbeat(self) -> bool:
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+
+        try:
+            async with AsyncSessionLocal() as db:
+                # Take the lease if we already hold it or the previous holder let it expire
+                result = await db.execute(
+                    update(SchedulerLease)
+                    .where(
+                        SchedulerLease.name == self.name,
+                        or_(
+                            SchedulerLease.holder == self.holder_id,
+                            SchedulerLease.expires_at < now,
+                        ),
+                    )
+                    .values(holder=self.holder_id, expires_at=expires_at)
+                )
+                acquired = result.rowcount == 1
+
+                # If the lease row does not exist yet, try to create it
+                if not acquired:
+                    holder = await db.scalar(
+                        select(SchedulerLease.holder).where(
+                            SchedulerLease.name == self.name
+                        )
+                    )
+                    if holder is None:
+                        await db.execute(
+                            insert(SchedulerLease).values(
+                                name=self.name,
+                                holder=self.holder_id,
+                                expires_at=expires_at,
+                            )
+                        )
+                        acquired = True
+                    else:
+                        self.current_leader = holder
+
+                await db.commit()
+
+        # Another worker created the lease row first, it is the leader
+        except IntegrityError:
+            acquired = False
+
+        # On any other database error, step down rather than risk two leaders
+        except SQLAlchemyError:
+            self.heartbeat_failures += 1
+            self._step_down()
+            return False
+
+        if acquired:
+            if not self.is_leader:
+                self.terms += 1
+                self.leader_since = now
+            self.lease_expires_at = expires_at
+            self.current_leader = self.holder_id
+        else:
+            self._step_down()
+
+        return acquired
+
+    # Function to give up the lease on shutdown so another worker can take over immediately
+    async def release(self) -> None:
+        if not self.is_leader:
+            return
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(SchedulerLease)
+                .where(
+                    SchedulerLease.name == self.name,
+                    SchedulerLease.holder == self.holder_id,
+                )
+                .values(expires_at=datetime.now(timezone.utc))
+            )
+            await db.commit()
+        self._step_down()
+
+    # Function to forget the local leadership state
+    def _step_down(self) -> None:
+        self.lease_expires_at = None
+        self.leader_since = None
+
+    # Function to return a snapshot of the election state for the metrics endpoint
+    def stats(self) -> dict:
+        return {
+            "holder_id": self.holder_id,
+            "is_leader": self.is_leader,
+            "current_leader": self.current_leader,
+            "leader_since": self.leader_since,
+            "lease_expires_at": self.lease_expires_at,
+            "terms": self.terms,
+            "heartbeat_failures": self.heartbeat_failures,
+        }
+
+
+# Create the elector instance shared by the scheduler jobs
+elector = LeaderElector("scheduler", config.SCHEDULER_LEASE_SECONDS)
+register_metrics("scheduler_leader", elector.stats)
+
+
+# Decorator to run a scheduled job only in the worker that currently holds the lease
+def leader_only(job: Callable[[], Awaitable[None]]) -> Callable[[], Awaitable[None]]:
+    @functools.wraps(job)
+    async def wrapper() -> None:
+        # Followers stay idle
+        if not elector.is_leader:
+            return
+        await job()
+
+    return wrapper
@@ -0,0 +1,67 @@
+import asyncio
+import importlib
+import json
+import logging
+from abc import ABC, abstractmethod
+
+from app.db.models import TaskReminder
+
+logger = logging.getLogger(__name__)
+
+
+# Base reminder sender. A sender delivers a batch of reminders (e.g. email, push, webhook);
+# raising an exception marks the whole batch as failed so it is retried.
+class ReminderSender(ABC):
+    @abstractmethod
+    async def send(self, reminders: list[TaskReminder]) -> None: ...
+
+
+# Sender that writes reminders to the application log (default, for local runs)
+class LogReminderSender(ReminderSender):
+    async def send(self, reminders: list[TaskReminder]) -> None:
+        for reminder in reminders:
+            logger.info(
+                "Reminder: task %s '%s' of user %s is due at %s",
+                reminder.task_id,
+                reminder.title,
+                reminder.user_id,
+                reminder.due_date,
+            )
+
+
+# Sender that appends reminders to a JSON lines file (for local runs and load tests)
+class FileReminderSender(ReminderSender):
+    def __init__(self, path: str):
+        self.path = path
+
+    async def send(self, reminders: list[TaskReminder]) -> None:
+        lines = "".join(
+            json.dumps(
+                {
+                    "reminder_id": reminder.id,
+                    "task_id": reminder.task_id,
+                    "user_id": reminder.user_id,
+                    "title": reminder.title,
+                    "due_date": reminder.due_date.isoformat(),
+                }
+            )
+            + "\n"
+            for reminder in reminders
+        )
+        # Write in a thread so file I/O does not block the event loop
+        await asyncio.to_thread(self._append, lines)
+
+    # Function to append the serialized batch to the output file
+    def _append(self, lines: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(lines)
+
+
+# Function to build the configured sender ('log', 'file' or 'module:Class')
+def load_sender(name: str, file_path: str) -> ReminderSender:
+    if name == "log":
+        return LogReminderSender()
+    if name == "file":
+        return FileReminderSender(file_path)
+    module_name, _, class_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
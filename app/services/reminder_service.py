@@ -0,0 +1,306 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, case, delete, exists, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import config
+from app.core.enums import ReminderStatus, TaskStatus
+from app.core.metrics import register_metrics
+from app.db.database import AsyncSessionLocal
+from app.db.models import Task, TaskReminder
+from app.services.reminder_senders import load_sender
+
+logger = logging.getLogger(__name__)
+
+# Delivery semantics: a reminder is claimed ('sending') before it is handed to the sender
+# and only confirmed ('sent') afterwards. Claimed reminders that are never confirmed
+# (e.g. the process died mid-send) are marked 'failed' instead of being sent again,
+# so a restart never re-sends a reminder (at-most-once delivery).
+# Reminders are enqueued up to REMINDER_SCHEDULE_AHEAD_MINUTES before their remind_at and
+# sent once it has passed. A reminder whose task has since been deleted, finished or given
+# another due date is deleted from the outbox instead of being sent.
+
+
+# Async token bucket limiting how many reminders are delivered per second
+class RateLimiter:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # Tokens added per second
+        self.capacity = capacity  # Max tokens that can be accumulated
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    # Wait until the given number of tokens is available and take them
+    async def acquire(self, tokens: int) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+# Create the sender and rate limiter shared by all dispatch runs
+sender = load_sender(config.REMINDER_SENDER, config.REMINDER_FILE_PATH)
+limiter = RateLimiter(
+    config.REMINDER_RATE_PER_SECOND,
+    max(config.REMINDER_RATE_PER_SECOND, config.REMINDER_SEND_BATCH_SIZE),
+)
+
+# Counters of this worker's reminder pipeline, exposed on the metrics endpoint
+stats = {
+    "enqueued": 0,
+    "sent": 0,
+    "delivery_failures": 0,
+    "abandoned": 0,
+    "cancelled": 0,
+}
+register_metrics("reminders", lambda: dict(stats))
+
+
+# * ENQUEUE REMINDERS
+# Function to add a reminder to the outbox for every pending task to remind about within
+# the schedule-ahead window
+# Tasks are read in (due_date, id) order in fixed-size batches, so memory stays bounded
+async def enqueue_due_reminders(
+    sessionmaker: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+) -> int:
+    now = datetime.now(timezone.utc)
+    lead = timedelta(minutes=config.REMINDER_LEAD_MINUTES)
+    ahead = timedelta(minutes=config.REMINDER_SCHEDULE_AHEAD_MINUTES)
+    enqueued = 0
+
+    # Keyset position of the last task read, starting at the current time
+    last_due_date, last_id = now, 0
+
+    async with sessionmaker() as db:
+        while True:
+            # Select the next batch of pending tasks to remind about that have no reminder yet
+            query = (
+                select(Task.id, Task.user_id, Task.title, Task.due_date)
+                .outerjoin(
+                    TaskReminder,
+                    and_(
+                        TaskReminder.task_id == Task.id,
+                        TaskReminder.due_date == Task.due_date,
+                    ),
+                )
+                .where(
+                    Task.status == TaskStatus.pending,
+                    Task.due_date <= now + lead + ahead,
+                    or_(
+                        Task.due_date > last_due_date,
+                        and_(Task.due_date == last_due_date, Task.id > last_id),
+                    ),
+                    TaskReminder.id.is_(None),
+                )
+                .order_by(Task.due_date, Task.id)
+                .limit(config.REMINDER_BATCH_SIZE)
+            )
+            rows = (await db.execute(query)).all()
+
+            # Stop when there are no more tasks to remind about
+            if not rows:
+                break
+
+            # Insert the whole batch into the outbox in a single statement
+            try:
+                await db.execute(
+                    insert(TaskReminder),
+                    [
+                        {
+                            "task_id": row.id,
+                            "user_id": row.user_id,
+                            "title": row.title,
+                            "due_date": row.due_date,
+                            "remind_at": row.due_date - lead,
+                            "status": ReminderStatus.pending,
+                            "attempts": 0,
+                        }
+                        for row in rows
+                    ],
+                )
+                await db.commit()
+
+            # Another run enqueued some of these tasks first, pick them up next time
+            except IntegrityError:
+                await db.rollback()
+                break
+
+            enqueued += len(rows)
+            last_due_date, last_id = rows[-1].due_date, rows[-1].id
+
+            # A short batch means the range is exhausted
+            if len(rows) < config.REMINDER_BATCH_SIZE:
+                break
+
+        # Purge finished reminders of tasks that are already due, they can never be enqueued again
+        await db.execute(
+            delete(TaskReminder).where(
+                TaskReminder.status.in_([ReminderStatus.sent, ReminderStatus.failed]),
+                TaskReminder.due_date < now,
+            )
+        )
+        await db.commit()
+
+    stats["enqueued"] += enqueued
+    return enqueued
+
+
+# Function to hand a batch of reminders to the sender, within the concurrency and rate limits
+async def _deliver(
+    reminders: list[TaskReminder], semaphore: asyncio.Semaphore
+) -> tuple[list[TaskReminder], bool]:
+    async with semaphore:
+        await limiter.acquire(len(reminders))
+        try:
+            await sender.send(reminders)
+            return reminders, True
+        except Exception:
+            logger.exception(
+                "Reminder delivery failed for %d reminders", len(reminders)
+            )
+            return reminders, False
+
+
+# Function to build the conditions under which a reminder's task still needs it
+def _task_still_due() -> tuple:
+    return (
+        Task.id == TaskReminder.task_id,
+        Task.status == TaskStatus.pending,
+        Task.due_date == TaskReminder.due_date,
+    )
+
+
+# * DISPATCH REMINDERS
+# Function to deliver pending reminders from the outbox, one batch at a time
+async def dispatch_reminders(
+    sessionmaker: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+) -> int:
+    now = datetime.now(timezone.utc)
+    sent = 0
+
+    # Keyset position of the last reminder read, so each run visits a reminder only once
+    last_id = 0
+
+    async with sessionmaker() as db:
+        # Give up on reminders claimed by a previous run that never confirmed them
+        result = await db.execute(
+            update(TaskReminder)
+            .where(
+                TaskReminder.status == ReminderStatus.sending,
+                TaskReminder.claimed_at
+                < now - timedelta(seconds=config.REMINDER_CLAIM_TIMEOUT_SECONDS),
+            )
+            .values(status=ReminderStatus.failed)
+        )
+        await db.commit()
+        stats["abandoned"] += result.rowcount
+
+        # Drop the ready reminders whose task is gone, no longer pending or due at another time
+        result = await db.execute(
+            delete(TaskReminder).where(
+                TaskReminder.status == ReminderStatus.pending,
+                TaskReminder.remind_at <= now,
+                ~exists().where(*_task_still_due()),
+            )
+        )
+        await db.commit()
+        stats["cancelled"] += result.rowcount
+
+        while True:
+            # Read the next batch of reminders that are ready to be sent
+            # The task is checked again so changes since the cleanup above are not reminded of
+            result = await db.scalars(
+                select(TaskReminder)
+                .where(
+                    TaskReminder.status == ReminderStatus.pending,
+                    TaskReminder.remind_at <= now,
+                    TaskReminder.id > last_id,
+                    exists().where(*_task_still_due()),
+                )
+                .order_by(TaskReminder.id)
+                .limit(config.REMINDER_BATCH_SIZE)
+            )
+            reminders = result.all()
+
+            # Stop when the outbox is drained
+            if not reminders:
+                break
+
+            last_id = reminders[-1].id
+
+            # Claim the batch before delivering it
+            await db.execute(
+                update(TaskReminder)
+                .where(TaskReminder.id.in_([reminder.id for reminder in reminders]))
+                .values(
+                    status=ReminderStatus.sending,
+                    claimed_at=datetime.now(timezone.utc),
+                )
+            )
+            await db.commit()
+
+            # Deliver the batch in chunks, concurrently up to REMINDER_CONCURRENCY
+            semaphore = asyncio.Semaphore(config.REMINDER_CONCURRENCY)
+            chunk_size = config.REMINDER_SEND_BATCH_SIZE
+            results = await asyncio.gather(
+                *(
+                    _deliver(reminders[i : i + chunk_size], semaphore)
+                    for i in range(0, len(reminders), chunk_size)
+                )
+            )
+
+            # Split the batch into delivered and failed reminder ids
+            sent_ids = [r.id for chunk, ok in results if ok for r in chunk]
+            failed_ids = [r.id for chunk, ok in results if not ok for r in chunk]
+
+            # Confirm the delivered reminders
+            if sent_ids:
+                await db.execute(
+                    update(TaskReminder)
+                    .where(TaskReminder.id.in_(sent_ids))
+                    .values(
+                        status=ReminderStatus.sent,
+                        attempts=TaskReminder.attempts + 1,
+                        sent_at=datetime.now(timezone.utc),
+                    )
+                )
+
+            # Put failed reminders back in the outbox, or give up after REMINDER_MAX_ATTEMPTS
+            if failed_ids:
+                await db.execute(
+                    update(TaskReminder)
+                    .where(TaskReminder.id.in_(failed_ids))
+                    .values(
+                        status=case(
+                            (
+                                TaskReminder.attempts + 1
+                                >= config.REMINDER_MAX_ATTEMPTS,
+                                ReminderStatus.failed.name,
+                            ),
+                            else_=ReminderStatus.pending.name,
+                        ),
+                        attempts=TaskReminder.attempts + 1,
+                    )
+                )
+            await db.commit()
+
+            sent += len(sent_ids)
+            stats["sent"] += len(sent_ids)
+            stats["delivery_failures"] += len(failed_ids)
+
+            # A short batch means the outbox is drained
+            if len(reminders) < config.REMINDER_BATCH_SIZE:
+                break
+
+    return sent
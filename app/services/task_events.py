@@ -0,0 +1,164 @@
+import asyncio
+import importlib
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+from app.core.config import config
+from app.core.enums import TaskEventType
+from app.db.models import Task
+from app.schemas.task_schema import TaskEvent, TaskOut
+
+# Callback signature used by backends to hand a published event to the local broker
+Deliver = Callable[[int, str], Awaitable[None]]
+
+
+# BACKENDS
+# Base pub/sub backend. A backend moves serialized events from the publishing process
+# to every process that has subscribers (e.g. Redis pub/sub, Postgres LISTEN/NOTIFY).
+class EventBackend(ABC):
+    # Called once with the broker's delivery callback before the first publish
+    @abstractmethod
+    async def start(self, deliver: Deliver) -> None: ...
+
+    # Publish a serialized event for the given user to all processes
+    @abstractmethod
+    async def publish(self, user_id: int, payload: str) -> None: ...
+
+    # Release any connections held by the backend
+    async def stop(self) -> None:
+        pass
+
+
+# In-process backend, used by default and in tests (single worker only)
+class LocalEventBackend(EventBackend):
+    def __init__(self):
+        self._deliver: Deliver | None = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def publish(self, user_id: int, payload: str) -> None:
+        # Deliver straight to the local broker, no serialization round trip needed
+        if self._deliver:
+            await self._deliver(user_id, payload)
+
+
+# Function to build the configured backend from TASK_EVENTS_BACKEND ('module:Class')
+def load_backend(path: str | None) -> EventBackend:
+    if not path:
+        return LocalEventBackend()
+    module_name, _, class_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+# SUBSCRIPTIONS
+# A single connected client. Events are buffered in a bounded queue so a slow consumer
+# can never make publishers wait or grow memory without limit.
+class Subscription:
+    def __init__(self, user_id: int, max_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=max_size)
+        self.dropped = 0  # Number of events dropped because the client fell behind
+
+    # Enqueue an event without blocking; on overflow, drop the buffer and ask for a resync
+    def offer(self, payload: str) -> None:
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # The client is too far behind for individual events to be useful,
+            # so drop everything buffered and tell it to refetch its task list instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.dropped += 1
+            self.queue.put_nowait(_serialize(TaskEventType.resync))
+
+
+# BROKER
+# Fans out published events to the subscriptions of the owning user in this process
+class TaskEventBroker:
+    def __init__(self, backend: EventBackend, queue_size: int):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscriptions: dict[int, set[Subscription]] = {}
+        self._started = False
+        self.published = 0  # Events published from this process
+        self.dropped = 0  # Events dropped for slow consumers in this process
+
+    # Lazily start the backend on first use (needs a running event loop)
+    async def _ensure_started(self) -> None:
+        if not self._started:
+            self._started = True
+            await self.backend.start(self._deliver)
+
+    # Called by the backend for every event, from any process
+    async def _deliver(self, user_id: int, payload: str) -> None:
+        for subscription in self._subscriptions.get(user_id, ()):
+            dropped = subscription.dropped
+            subscription.offer(payload)
+            self.dropped += subscription.dropped - dropped
+
+    # Register a new subscription for the user
+    async def subscribe(self, user_id: int) -> Subscription:
+        await self._ensure_started()
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    # Remove a subscription once its client disconnects
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    # Publish an event for the user through the backend
+    async def publish(self, user_id: int, payload: str) -> None:
+        await self._ensure_started()
+        self.published += 1
+        await self.backend.publish(user_id, payload)
+
+    # Stop the backend on application shutdown
+    async def stop(self) -> None:
+        if self._started:
+            await self.backend.stop()
+            self._started = False
+
+
+# Function to serialize a task event into its JSON wire form
+def _serialize(
+    event_type: TaskEventType, task_id: int | None = None, task: TaskOut | None = None
+) -> str:
+    return TaskEvent(
+        type=event_type,
+        task_id=task_id,
+        task=task,
+        occurred_at=datetime.now(timezone.utc),
+    ).model_dump_json()
+
+
+# Create the broker instance shared by the CRUD layer, services and routers
+broker = TaskEventBroker(
+    load_backend(config.TASK_EVENTS_BACKEND), config.TASK_EVENTS_QUEUE_SIZE
+)
+
+
+# Function to publish a change of the given task to its owner's subscribers
+# task_out can be passed when the new state is not reflected in the task object yet
+async def publish_task_event(
+    event_type: TaskEventType, task: Task, task_out: TaskOut | None = None
+) -> None:
+    # Deleted tasks are sent without a body, everything else carries the new state
+    if event_type == TaskEventType.deleted:
+        task_out = None
+    elif task_out is None:
+        task_out = TaskOut.model_validate(task)
+    await broker.publish(task.user_id, _serialize(event_type, task.id, task_out))
+
+
+# Function to format an event payload as a server-sent events message
+# The event type is part of the JSON payload, so the default 'message' event is used
+def format_sse(payload: str) -> str:
+    return f"data: {payload}\n\n"
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import config
+from app.core.enums import TaskStatus
+from app.core.metrics import register_metrics
+from app.db.database import AsyncSessionLocal
+from app.db.models import ArchivedTask, Task
+from app.db.sharding import moving_user_ids
+
+# Statuses in which a task can no longer change on its own, and can be archived
+ARCHIVABLE_STATUSES = [TaskStatus.completed, TaskStatus.expired]
+
+# Counters of this worker's archival job, exposed on the metrics endpoint
+stats = {"archived": 0, "batches": 0}
+register_metrics("tasks_archive", lambda: dict(stats))
+
+
+# Function to move completed and expired tasks, due more than TASKS_ARCHIVE_AFTER_DAYS ago,
+# from the 'tasks' table to the 'tasks_archive' table
+# Tasks are moved in small transactions with a pause in between, so the job never holds
+# locks for long or competes with the request traffic for the database
+async def tasks_archive_old(
+    sessionmaker: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+) -> int:
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=config.TASKS_ARCHIVE_AFTER_DAYS)
+    archived = 0
+
+    # Columns copied from the 'tasks' table, the archive adds archived_at
+    columns = [column.key for column in Task.__table__.columns]
+
+    # One status at a time, so each batch is a range of ix_tasks_status_due_date
+    # (status = ?, due_date < cutoff, in (due_date, id) order) that stops at the batch size
+    for status in ARCHIVABLE_STATUSES:
+        while True:
+            # Leave the tasks of users being moved to another shard for the next run
+            moving = await moving_user_ids()
+
+            async with sessionmaker() as db:
+                # Select the next batch of archivable tasks with this status
+                query = (
+                    select(Task.id)
+                    .where(Task.status == status, Task.due_date < cutoff)
+                    .order_by(Task.due_date, Task.id)
+                    .limit(config.TASKS_ARCHIVE_BATCH_SIZE)
+                )
+                if moving:
+                    query = query.where(Task.user_id.not_in(moving))
+                result = await db.scalars(query)
+                task_ids = result.all()
+
+                # Go on with the next status when there is nothing left to archive
+                if not task_ids:
+                    break
+
+                # Copy the batch to the archive and remove it from the hot table atomically
+                await db.execute(
+                    insert(ArchivedTask).from_select(
+                        [*columns, "archived_at"],
+                        select(
+                            *(getattr(Task, column) for column in columns),
+                            literal(now),
+                        ).where(Task.id.in_(task_ids)),
+                    )
+                )
+                await db.execute(delete(Task).where(Task.id.in_(task_ids)))
+                await db.commit()
+
+            archived += len(task_ids)
+            stats["archived"] += len(task_ids)
+            stats["batches"] += 1
+
+            # A short batch means every task with this status is archived
+            if len(task_ids) < config.TASKS_ARCHIVE_BATCH_SIZE:
+                break
+
+            # Throttle between batches
+            await asyncio.sleep(config.TASKS_ARCHIVE_BATCH_PAUSE_MS / 1000)
+
+    return archived
@@ -1,15 +1,29 @@
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from datetime import timezone, datetime
 
 from app.db.database import AsyncSessionLocal
 from app.db.models import Task
-from app.core.enums import TaskStatus
-
-
-# Function to expire tasks whose due date has passed
-async def tasks_expire_due_date():
-    # Use AsyncSessionLocal to interact with the database asynchronously
-    async with AsyncSessionLocal() as db:
+from app.db.sharding import moving_user_ids
+from app.core.enums import TaskStatus, TaskEventType
+from app.services.task_events import publish_task_event
+from app.db.memory_store import store
+
+
+# Function to expire tasks whose due date has passed (in the database of the session maker)
+async def tasks_expire_due_date(
+    sessionmaker: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+):
+    # With the in-memory storage backend, the tasks are expired in the store
+    if store is not None:
+        expired = store.expire_tasks(datetime.now(timezone.utc))
+        await store.sync()
+        for task in expired:
+            await publish_task_event(TaskEventType.expired, task)
+        return
+
+    # Use the session maker to interact with the database asynchronously
+    async with sessionmaker() as db:
         # Get the current UTC time
         now = datetime.now(timezone.utc)
 
@@ -18,6 +32,11 @@ async def tasks_expire_due_date():
             Task.due_date < now, Task.status != TaskStatus.expired
         )
 
+        # Leave the tasks of users being moved to another shard for the next run
+        moving = await moving_user_ids()
+        if moving:
+            query = query.where(Task.user_id.not_in(moving))
+
         # Execute the query and fetch tasks that need to be expired
         result = await db.scalars(query)
         tasks_to_expire = result.all()
@@ -32,3 +51,7 @@ async def tasks_expire_due_date():
 
         # Commit the changes to the database, updating the status of the tasks
         await db.commit()
+
+        # Notify the owners' subscribed clients about each expired task
+        for task in tasks_to_expire:
+            await publish_task_event(TaskEventType.expired, task)
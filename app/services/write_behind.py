@@ -0,0 +1,156 @@
+import asyncio
+import logging
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import config
+from app.core.metrics import register_metrics
+from app.db.database import AsyncSessionLocal
+from app.db.models import Task
+
+logger = logging.getLogger(__name__)
+
+# Durability contract of the write-behind mode (TASK_WRITE_BEHIND_ENABLED=True):
+# - Updates are validated and ownership-checked before they are queued.
+# - Queued updates of the same task are merged (later fields win) and written together
+#   with the other queued updates in one transaction, every TASK_WRITE_BEHIND_FLUSH_MS
+#   milliseconds or as soon as TASK_WRITE_BEHIND_MAX_BATCH tasks are queued.
+# - With TASK_WRITE_BEHIND_AWAIT_FLUSH=True (default) the response is only sent after the
+#   batch holding the update is committed, so a confirmed update is as durable as before.
+#   If the batch fails, every request in it fails.
+# - With TASK_WRITE_BEHIND_AWAIT_FLUSH=False the response is sent once the update is queued.
+#   Updates still in the queue are lost if the process crashes, and a read sent right after
+#   the response may not see the update yet. Flush failures are only logged.
+# - With sharding, the updates of a batch are written in one transaction per shard, in
+#   parallel; if any of them fails, every request in the batch fails.
+# - Batches are written one after the other, in the order they were queued, so an older
+#   update never overwrites a newer one of the same task.
+
+
+# In-process queue that coalesces task updates per task id and writes them in batches
+class TaskWriteBehindQueue:
+    def __init__(self, flush_interval_ms: int, max_batch: int):
+        self.flush_interval = flush_interval_ms / 1000  # Max queueing time (seconds)
+        self.max_batch = max_batch  # Number of queued tasks that triggers a flush
+        # Queued values, merged per task id, per database (shard) holding the tasks
+        self._pending: dict[async_sessionmaker[AsyncSession], dict[int, dict]] = {}
+        self._size = 0  # Number of queued tasks
+        self._committed: asyncio.Future | None = None  # Resolved once batch is written
+        self._timer: asyncio.TimerHandle | None = None  # Scheduled flush of the batch
+        self._flushes: set[asyncio.Task] = set()  # Flushes in progress
+        self._last_flush: asyncio.Task | None = None  # Flush the next batch waits for
+        self.stats = {
+            "submitted": 0,
+            "coalesced": 0,
+            "batches": 0,
+            "rows": 0,
+            "failures": 0,
+        }
+
+    # Function to queue an update of the task; returns once the update is committed,
+    # or immediately if TASK_WRITE_BEHIND_AWAIT_FLUSH is off
+    async def submit(
+        self,
+        task_id: int,
+        values: dict,
+        sessionmaker: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+    ) -> None:
+        self.stats["submitted"] += 1
+
+        # Merge the values into a queued update of the same task, if any
+        pending = self._pending.setdefault(sessionmaker, {})
+        if task_id in pending:
+            self.stats["coalesced"] += 1
+            pending[task_id].update(values)
+        else:
+            pending[task_id] = dict(values)
+            self._size += 1
+
+        # The first update of a new batch schedules its flush
+        committed = self._committed
+        if committed is None:
+            loop = asyncio.get_running_loop()
+            committed = self._committed = loop.create_future()
+            self._timer = loop.call_later(self.flush_interval, self._start_flush)
+
+        # Flush early once the batch is full
+        if self._size >= self.max_batch:
+            self._start_flush()
+
+        if config.TASK_WRITE_BEHIND_AWAIT_FLUSH:
+            # Shield the batch so a cancelled request does not cancel it for everyone
+            await asyncio.shield(committed)
+
+    # Function to hand the current batch over to a background flush, queued behind the
+    # flush of the previous batch
+    def _start_flush(self) -> None:
+        if self._committed is None:
+            return
+        if self._timer:
+            self._timer.cancel()
+        pending, committed = self._pending, self._committed
+        self._pending, self._committed, self._timer = {}, None, None
+        self._size = 0
+
+        flush = asyncio.create_task(self._flush(pending, committed, self._last_flush))
+        self._flushes.add(flush)
+        flush.add_done_callback(self._flushes.discard)
+        self._last_flush = flush
+
+    # Function to write a batch of merged updates, in a single transaction per database
+    async def _flush(
+        self,
+        pending: dict[async_sessionmaker[AsyncSession], dict[int, dict]],
+        committed: asyncio.Future,
+        previous: asyncio.Task | None,
+    ) -> None:
+        # Wait for the previous batch to be written (or to fail) before writing this one
+        if previous is not None:
+            await asyncio.wait([previous])
+
+        rows = sum(len(tasks) for tasks in pending.values())
+        try:
+            await asyncio.gather(
+                *(
+                    self._write(sessionmaker, tasks)
+                    for sessionmaker, tasks in pending.items()
+                )
+            )
+        except Exception as e:
+            self.stats["failures"] += 1
+            logger.exception("Write-behind flush of %d tasks failed", rows)
+            committed.set_exception(e)
+            # Nobody awaits the result in fire-and-forget mode, avoid "never retrieved" warnings
+            committed.exception()
+            return
+
+        self.stats["batches"] += 1
+        self.stats["rows"] += rows
+        committed.set_result(None)
+
+    # Function to write the merged updates of one database in a single transaction
+    @staticmethod
+    async def _write(
+        sessionmaker: async_sessionmaker[AsyncSession], tasks: dict[int, dict]
+    ) -> None:
+        async with sessionmaker() as db:
+            # ORM bulk UPDATE by primary key, executed as few executemany calls
+            await db.execute(
+                update(Task),
+                [{"id": task_id, **values} for task_id, values in tasks.items()],
+            )
+            await db.commit()
+
+    # Function to write everything still queued, used on application shutdown
+    async def drain(self) -> None:
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+# Create the queue shared by the CRUD layer
+write_behind = TaskWriteBehindQueue(
+    config.TASK_WRITE_BEHIND_FLUSH_MS, config.TASK_WRITE_BEHIND_MAX_BATCH
+)
+register_metrics("task_write_behind", lambda: dict(write_behind.stats))
@@ -0,0 +1,136 @@
+# Throughput benchmark of the storage backends (STORAGE_BACKEND=sql and memory)
+# Runs the task CRUD functions the routes call, one session per call like a request, for
+# each backend in its own process (the backend is chosen when the app is imported). The
+# SQL backend uses an SQLite file, the memory backend logs to a directory next to it.
+#
+# Usage: SECRET_KEY=x ALGORITHM=HS256 DATABASE_URL=sqlite+aiosqlite:///bench.db python -m benchmarks.storage_backends
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+TASKS = 2000  # Tasks created (then read, updated and deleted) per backend
+READS = 2000  # Calls per measured read
+
+
+# Function to measure the calls per second of an operation run count times
+async def measure(results: dict, name: str, count: int, operation) -> None:
+    started = time.perf_counter()
+    for i in range(count):
+        await operation(i)
+    results[name] = round(count / (time.perf_counter() - started))
+
+
+# Function to run the benchmark against the backend configured in this process
+async def run() -> dict:
+    from app.core.enums import TaskPriority, TaskSortBy, TaskStatus
+    from app.crud import task_crud, user_crud
+    from app.db.database import AsyncSessionLocal
+    from app.db.memory_store import close_store, startup_store
+    from app.db.startup import startup_db
+    from app.schemas.task_schema import TaskBase, TaskUpdate
+    from app.schemas.user_schema import UserIn
+
+    await startup_db()
+    await startup_store()
+    async with AsyncSessionLocal() as db:
+        user = await user_crud.create_user(
+            UserIn(
+                fullname="Bench User", email="bench@example.com", password="B3nch!pw"
+            ),
+            db,
+        )
+
+    ids = []
+    results = {}
+
+    async def create(i):
+        request = TaskBase(
+            title=f"benchmark task {i}",
+            description="urgent" if i % 10 == 0 else "later",
+            priority=list(TaskPriority)[i % 3],
+            due_date=f"2030-{1 + i % 12:02d}-{1 + i % 28:02d}T00:00:00",
+        )
+        async with AsyncSessionLocal() as db:
+            ids.append((await task_crud.create_task(request, user, db)).id)
+
+    async def get(i):
+        async with AsyncSessionLocal() as db:
+            await task_crud.get_task(ids[i % len(ids)], user, db)
+
+    async def page(i):
+        async with AsyncSessionLocal() as db:
+            await task_crud.get_tasks(
+                None, None, None, None, None, user, db, 1 + i % 20, 10
+            )
+
+    async def search(i):
+        async with AsyncSessionLocal() as db:
+            await task_crud.get_tasks(
+                "urgent",
+                TaskStatus.pending,
+                None,
+                TaskSortBy.priority,
+                None,
+                user,
+                db,
+                1 + i % 5,
+                10,
+            )
+
+    async def update(i):
+        request = TaskUpdate(status=TaskStatus.completed, title=f"updated task {i}")
+        async with AsyncSessionLocal() as db:
+            await task_crud.update_task(request, ids[i], user, db)
+
+    async def delete(i):
+        async with AsyncSessionLocal() as db:
+            await task_crud.delete_task(ids[i], user, db)
+
+    await measure(results, "create_task", TASKS, create)
+    await measure(results, "get_task", READS, get)
+    await measure(results, "get_tasks (page)", READS, page)
+    await measure(results, "get_tasks (search)", READS, search)
+    await measure(results, "update_task", TASKS, update)
+    await measure(results, "delete_task", TASKS, delete)
+    await close_store()
+    return results
+
+
+def main() -> None:
+    # Child process: run the configured backend and print its results
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        print(json.dumps(asyncio.run(run())))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in ("sql", "memory"):
+            env = {
+                **os.environ,
+                "STORAGE_BACKEND": backend,
+                "STORAGE_MEMORY_PATH": os.path.join(directory, f"{backend}-store"),
+                "DATABASE_URL": f"sqlite+aiosqlite:///{directory}/{backend}.db",
+                "LOG_LEVEL": "WARNING",
+            }
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.storage_backends", "--run"],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results[backend] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{TASKS} tasks, {READS} calls per read (calls per second)")
+    print(f"{'operation':<20} {'sql':>10} {'memory':>10} {'speedup':>9}")
+    for name, sql in results["sql"].items():
+        memory = results["memory"][name]
+        print(f"{name:<20} {sql:>10} {memory:>10} {memory / sql:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# Benchmark of the wire formats of a task list page
+# Reports, for each body format (JSON, MessagePack) and Content-Encoding (none, gzip, br,
+# zstd), the bytes sent on the wire and the server CPU time per response (rendering the
+# page with TaskResponse and compressing it like CompressionMiddleware), plus the client
+# time to decode it. Formats whose optional package is not installed are skipped.
+#
+# Usage: SECRET_KEY=x ALGORITHM=HS256 DATABASE_URL=sqlite+aiosqlite:///bench.db python -m benchmarks.wire_formats
+import gzip
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.core.compression import brotli, encoders, zstandard
+from app.core.enums import TaskPriority, TaskStatus
+from app.core.negotiation import (
+    JSON_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE,
+    TaskResponse,
+    msgpack,
+    response_media_type,
+)
+from app.schemas.task_schema import TaskListOut, TaskOut
+
+PAGE_SIZE = 100  # Tasks per page
+ROUNDS = 200  # Responses measured per format
+
+
+# Function to build a page of tasks with realistic (not repetitive) descriptions
+def build_page() -> dict:
+    rng = random.Random(0)
+    words = [
+        "".join(
+            rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9))
+        )
+        for _ in range(2000)
+    ]
+    tasks = [
+        TaskOut(
+            id=i,
+            title=" ".join(rng.choices(words, k=rng.randint(2, 6))).capitalize(),
+            description=" ".join(rng.choices(words, k=rng.randint(20, 200))),
+            priority=rng.choice(list(TaskPriority)),
+            status=rng.choice(list(TaskStatus)),
+            due_date=datetime(2030, 1, 1) + timedelta(minutes=rng.randint(0, 10**6)),
+        )
+        for i in range(1, PAGE_SIZE + 1)
+    ]
+    page = TaskListOut(
+        page_number=1,
+        page_size=PAGE_SIZE,
+        total_items=PAGE_SIZE,
+        total_pages=1,
+        tasks=tasks,
+    )
+    # The routes render what FastAPI's serialization produces (JSON-compatible values)
+    return page.model_dump(mode="json")
+
+
+# Decoders of the client side
+DECOMPRESS = {
+    "identity": lambda body: body,
+    "gzip": gzip.decompress,
+    "br": brotli.decompress if brotli else None,
+    "zstd": (
+        (lambda body: zstandard.ZstdDecompressor().decompress(body))
+        if zstandard
+        else None
+    ),
+}
+PARSE = {
+    JSON_MEDIA_TYPE: json.loads,
+    MSGPACK_MEDIA_TYPE: msgpack.unpackb if msgpack else None,
+}
+
+
+def main() -> None:
+    content = build_page()
+    media_types = [JSON_MEDIA_TYPE] + ([MSGPACK_MEDIA_TYPE] if msgpack else [])
+    encodings = ["identity"] + list(encoders)[::-1]
+
+    print(f"Task list page of {PAGE_SIZE} tasks, {ROUNDS} responses per format")
+    print(
+        f"{'format':<22} {'encoding':<9} {'bytes':>8} {'ratio':>6}"
+        f" {'server us':>10} {'client us':>10}"
+    )
+    baseline = None
+    for media_type in media_types:
+        response_media_type.set(media_type)
+        for encoding in encodings:
+            encoder = encoders.get(encoding)
+
+            # Server: render the page and compress it (CPU time of this process)
+            started = time.process_time()
+            for _ in range(ROUNDS):
+                body = TaskResponse(content).body
+                if encoder is not None:
+                    body = encoder.compress(body)
+            server_us = (time.process_time() - started) / ROUNDS * 1e6
+
+            # Client: decompress and parse the body
+            started = time.process_time()
+            for _ in range(ROUNDS):
+                PARSE[media_type](DECOMPRESS[encoding](body))
+            client_us = (time.process_time() - started) / ROUNDS * 1e6
+
+            baseline = baseline or len(body)
+            print(
+                f"{media_type:<22} {encoding:<9} {len(body):>8} {len(body) / baseline:>6.2f}"
+                f" {server_us:>10.1f} {client_us:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
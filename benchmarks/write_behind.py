@@ -0,0 +1,121 @@
+# Throughput benchmark of contended task updates with and without the write-behind queue
+# Many concurrent writers toggle the status of a few tasks (PATCH /tasks/{task_id} with
+# status pending/completed), calling update_task with one session per call like a request.
+# Each mode (TASK_WRITE_BEHIND_ENABLED=False and True) runs in its own process on its own
+# SQLite file; with write-behind the responses wait for the batch commit (the default).
+#
+# Usage: SECRET_KEY=x ALGORITHM=HS256 DATABASE_URL=sqlite+aiosqlite:///bench.db python -m benchmarks.write_behind
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+TASKS = 10  # Tasks whose status is toggled (the contended rows)
+WRITERS = 100  # Concurrent writers
+UPDATES = 20  # Updates per writer
+
+
+# Function to run the benchmark in the mode configured in this process
+async def run() -> dict:
+    from app.core.enums import TaskPriority, TaskStatus
+    from app.crud import task_crud, user_crud
+    from app.db.database import AsyncSessionLocal
+    from app.db.startup import startup_db
+    from app.schemas.task_schema import TaskBase, TaskUpdate
+    from app.schemas.user_schema import UserIn
+    from app.services.write_behind import write_behind
+
+    await startup_db()
+    async with AsyncSessionLocal() as db:
+        user = await user_crud.create_user(
+            UserIn(
+                fullname="Bench User", email="bench@example.com", password="B3nch!pw"
+            ),
+            db,
+        )
+    ids = []
+    for i in range(TASKS):
+        async with AsyncSessionLocal() as db:
+            task = await task_crud.create_task(
+                TaskBase(
+                    title=f"contended task {i}",
+                    description="toggled",
+                    priority=TaskPriority.medium,
+                    due_date="2030-01-01T00:00:00",
+                ),
+                user,
+                db,
+            )
+            ids.append(task.id)
+
+    statuses = [TaskStatus.pending, TaskStatus.completed]
+    failures = 0
+
+    async def writer(number: int) -> None:
+        nonlocal failures
+        for i in range(UPDATES):
+            request = TaskUpdate(status=statuses[(number + i) % 2])
+            try:
+                async with AsyncSessionLocal() as db:
+                    await task_crud.update_task(
+                        request, ids[(number + i) % TASKS], user, db
+                    )
+            except Exception:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(number) for number in range(WRITERS)))
+    elapsed = time.perf_counter() - started
+    await write_behind.drain()
+    return {
+        "updates_per_second": round(WRITERS * UPDATES / elapsed),
+        "failures": failures,
+        "batches": write_behind.stats["batches"],
+    }
+
+
+def main() -> None:
+    # Child process: run the configured mode and print its results
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        print(json.dumps(asyncio.run(run())))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("False", "True"):
+            env = {
+                **os.environ,
+                "TASK_WRITE_BEHIND_ENABLED": mode,
+                "DATABASE_URL": f"sqlite+aiosqlite:///{directory}/{mode}.db",
+                "ADMISSION_ENABLED": "False",
+                "LOG_LEVEL": "WARNING",
+            }
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.write_behind", "--run"],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    off, on = results["False"], results["True"]
+    print(
+        f"{WRITERS} writers x {UPDATES} status toggles on {TASKS} tasks (updates per second)"
+    )
+    print(f"{'mode':<14} {'updates/s':>10} {'failures':>9} {'batches':>8}")
+    print(
+        f"{'direct':<14} {off['updates_per_second']:>10} {off['failures']:>9} {'-':>8}"
+    )
+    print(
+        f"{'write-behind':<14} {on['updates_per_second']:>10} {on['failures']:>9}"
+        f" {on['batches']:>8}"
+    )
+    print(f"speedup: {on['updates_per_second'] / off['updates_per_second']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import asyncio
+from logging.config import fileConfig
+
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from alembic import context
+
+from app.core.config import config as app_config
+from app.db.database import Base
+import app.db.models  # noqa: F401 - registers the models on Base.metadata
+
+# Alembic Config object, which provides access to the values within the .ini file in use
+config = context.config
+
+# Connection passed in by the application on startup (see app/db/startup.py), if any
+connection = config.attributes.get("connection")
+
+# Set up logging from the .ini file when running from the alembic command line only,
+# so migrations run on startup do not reconfigure the application's loggers
+if config.config_file_name is not None and connection is None:
+    fileConfig(config.config_file_name)
+
+# Metadata of the application models, used by 'alembic revision --autogenerate'
+target_metadata = Base.metadata
+
+
+# Run migrations in 'offline' mode, emitting the SQL to the script output
+def run_migrations_offline() -> None:
+    context.configure(
+        url=app_config.DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,  # Emulate ALTER TABLE on SQLite
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+# Run migrations on the given connection
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=True,  # Emulate ALTER TABLE on SQLite
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+# Create an async engine for DATABASE_URL and run the migrations on one of its connections
+async def run_async_migrations() -> None:
+    connectable = create_async_engine(app_config.DATABASE_URL, poolclass=pool.NullPool)
+
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
+
+
+# Run migrations in 'online' mode, on the application's connection if one was passed in
+def run_migrations_online() -> None:
+    if connection is not None:
+        do_run_migrations(connection)
+    else:
+        asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
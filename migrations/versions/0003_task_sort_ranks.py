@@ -0,0 +1,82 @@
+"""task sort ranks
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 08:14:57.257616
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Sort ranks at the time of this revision (app.db.models.STATUS_RANKS and PRIORITY_RANKS)
+STATUS_RANKS = {"pending": 0, "expired": 1, "completed": 2}
+PRIORITY_RANKS = {"low": 0, "medium": 1, "high": 2}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table_name in ("tasks", "tasks_archive"):
+        # Add the rank columns as nullable, so existing rows can be backfilled first
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.add_column(sa.Column("status_rank", sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column("priority_rank", sa.Integer(), nullable=True))
+
+        # Backfill the ranks of the existing rows from their status and priority
+        table = sa.table(
+            table_name,
+            sa.column("status", sa.String),
+            sa.column("priority", sa.String),
+            sa.column("status_rank", sa.Integer),
+            sa.column("priority_rank", sa.Integer),
+        )
+        op.execute(
+            table.update().values(
+                status_rank=sa.case(STATUS_RANKS, value=table.c.status),
+                priority_rank=sa.case(PRIORITY_RANKS, value=table.c.priority),
+            )
+        )
+
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.alter_column(
+                "status_rank", existing_type=sa.Integer(), nullable=False
+            )
+            batch_op.alter_column(
+                "priority_rank", existing_type=sa.Integer(), nullable=False
+            )
+
+    # Index the user's tasks by rank, so sorted pages are index walks
+    with op.batch_alter_table("tasks", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_tasks_user_priority_rank",
+            ["user_id", "priority_rank", "id"],
+            unique=False,
+        )
+        batch_op.create_index(
+            "ix_tasks_user_status_rank", ["user_id", "status_rank", "id"], unique=False
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table("tasks_archive", schema=None) as batch_op:
+        batch_op.drop_column("priority_rank")
+        batch_op.drop_column("status_rank")
+
+    with op.batch_alter_table("tasks", schema=None) as batch_op:
+        batch_op.drop_index("ix_tasks_user_status_rank")
+        batch_op.drop_index("ix_tasks_user_priority_rank")
+        batch_op.drop_column("priority_rank")
+        batch_op.drop_column("status_rank")
+
+    # ### end Alembic commands ###
@@ -0,0 +1,58 @@
+"""sqlite tasks autoincrement
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 10:02:41.318204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# On SQLite, the tasks table lost AUTOINCREMENT when 0003 recreated it (and tables created
+# before the archive never had it), so the ids of the last deleted or archived tasks could
+# be handed out again. Rebuild it with AUTOINCREMENT and start its id sequence above every
+# archived id. Other databases never reuse ids and are left as they are.
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite":
+        return
+
+    sql = bind.scalar(
+        sa.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tasks'")
+    )
+    if "AUTOINCREMENT" in sql.upper():
+        return
+
+    with op.batch_alter_table(
+        "tasks",
+        schema=None,
+        recreate="always",
+        table_kwargs={"sqlite_autoincrement": True},
+    ):
+        pass
+
+    op.execute(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'tasks', 0 "
+        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'tasks')"
+    )
+    op.execute(
+        "UPDATE sqlite_sequence SET seq = MAX(seq, "
+        "(SELECT COALESCE(MAX(id), 0) FROM tasks_archive)) WHERE name = 'tasks'"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # AUTOINCREMENT is kept, it has no effect on the earlier revisions
+    pass
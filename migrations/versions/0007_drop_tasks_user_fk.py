@@ -0,0 +1,62 @@
+"""drop tasks user fk
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 18:40:12.730581
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# With sharding, the users live in the primary database and a shard's users table stays
+# empty, so the foreign key from tasks.user_id to users.id fails every task insert on a
+# database enforcing it. Drop it everywhere, like tasks_archive and task_reminders have none.
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    foreign_keys = [
+        foreign_key
+        for foreign_key in sa.inspect(bind).get_foreign_keys("tasks")
+        if foreign_key["referred_table"] == "users"
+    ]
+    if not foreign_keys:
+        return
+
+    if bind.dialect.name != "sqlite":
+        for foreign_key in foreign_keys:
+            op.drop_constraint(foreign_key["name"], "tasks", type_="foreignkey")
+        return
+
+    # SQLite's foreign key has no name, give it one to drop it while the table is rebuilt.
+    # The rebuild restarts the AUTOINCREMENT sequence at the highest id, so restore it.
+    seq = bind.scalar(sa.text("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'"))
+    with op.batch_alter_table(
+        "tasks",
+        schema=None,
+        recreate="always",
+        naming_convention={"fk": "fk_%(table_name)s_%(column_0_name)s"},
+        table_kwargs={"sqlite_autoincrement": True},
+    ) as batch_op:
+        batch_op.drop_constraint("fk_tasks_user_id", type_="foreignkey")
+    if seq is not None:
+        op.execute(
+            sa.text(
+                "UPDATE sqlite_sequence SET seq = MAX(seq, :seq) WHERE name = 'tasks'"
+            ).bindparams(seq=seq)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The foreign key is not restored, the shards could not satisfy it
+    pass
@@ -0,0 +1,169 @@
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from itertools import count
+from urllib.parse import urlencode
+
+import pytest
+
+# The settings are read when the app is imported, so set the test ones first: a throwaway
+# SQLite database, and no admission control (the tests send bursts of requests)
+_directory = tempfile.mkdtemp(prefix="todo-list-api-tests-")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_directory}/test.db")
+os.environ.setdefault("ADMISSION_ENABLED", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from app.crud import memory_crud, task_crud, user_crud  # noqa: E402
+from app.db.memory_store import MemoryStore  # noqa: E402
+from app.db.startup import startup_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services import tasks_expire_service  # noqa: E402
+
+PASSWORD = "T3st!pass"  # Password of the test users
+_emails = count(1)  # Numbers the test users, so every test has its own
+
+
+# Response of an in-process request
+@dataclass
+class Response:
+    status_code: int
+    headers: dict[str, str]
+    content: bytes
+
+    def json(self):
+        return json.loads(self.content)
+
+
+# Client sending requests straight to the ASGI app (no server, no lifespan)
+class Client:
+    def __init__(self, asgi_app=app):
+        self.app = asgi_app
+        self.headers: dict[str, str] = {}  # Headers sent with every request
+
+    # Function to send a request and collect the whole response
+    async def request(
+        self,
+        method: str,
+        path: str,
+        json_body=None,
+        form: dict | None = None,
+        params: dict | None = None,
+        headers: dict | None = None,
+    ) -> Response:
+        headers = {**self.headers, **(headers or {})}
+        body = b""
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif form is not None:
+            body = urlencode(form).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        scope = {
+            "type": "http",
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": urlencode(params or {}).encode(),
+            "headers": [
+                (name.lower().encode(), value.encode())
+                for name, value in headers.items()
+            ],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                return {"type": "http.disconnect"}
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        start, chunks = {}, []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return Response(
+            start["status"],
+            {name.decode().lower(): value.decode() for name, value in start["headers"]},
+            b"".join(chunks),
+        )
+
+    async def get(self, path: str, **kwargs) -> Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def patch(self, path: str, **kwargs) -> Response:
+        return await self.request("PATCH", path, **kwargs)
+
+    async def delete(self, path: str, **kwargs) -> Response:
+        return await self.request("DELETE", path, **kwargs)
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+# Fixture that migrates the test database once
+@pytest.fixture(scope="session")
+async def database(anyio_backend):
+    await startup_db()
+
+
+# Fixture that runs the test once per storage backend (STORAGE_BACKEND=sql and memory)
+# The memory backend gets a new store in the test's temporary directory
+@pytest.fixture(params=["sql", "memory"])
+async def backend(request, database, tmp_path, monkeypatch):
+    store = None
+    if request.param == "memory":
+        store = MemoryStore(str(tmp_path / "store"), snapshot_every=1000, fsync=False)
+        store.recover()
+    for module in (task_crud, user_crud, memory_crud, tasks_expire_service):
+        monkeypatch.setattr(module, "store", store)
+    yield request.param
+    if store is not None:
+        await store.close()
+
+
+# Function to register a new user and get a client authenticated as them
+async def signed_in_client() -> Client:
+    client = Client()
+    email = f"user{next(_emails)}@example.com"
+    response = await client.post(
+        "/register",
+        json_body={"fullname": "Test User", "email": email, "password": PASSWORD},
+    )
+    assert response.status_code == 201, response.content
+    response = await client.post(
+        "/token", form={"username": email, "password": PASSWORD}
+    )
+    assert response.status_code == 200, response.content
+    client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+    return client
+
+
+# Fixture of a client signed in as a new user, on the backend of the test
+@pytest.fixture
+async def client(backend) -> Client:
+    return await signed_in_client()
+
+
+# Fixture of a client signed in as another new user
+@pytest.fixture
+async def other_client(backend) -> Client:
+    return await signed_in_client()
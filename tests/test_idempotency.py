@@ -0,0 +1,154 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from app.db.database import AsyncSessionLocal
+from app.db.models import IdempotencyKey
+from app.services.idempotency import IdempotencyStore
+from tests.test_tasks import DUE_DATE, page_ids
+
+# Idempotency keys of the task writes: replays, reused keys, concurrent duplicates (in one
+# worker and across workers) and claims left behind by a worker that died
+
+pytestmark = pytest.mark.anyio
+
+TASK = {
+    "title": "Idempotent task",
+    "description": "something to do",
+    "priority": "low",
+    "due_date": DUE_DATE,
+}
+
+
+# Function to build a store like the app's, one per simulated worker
+def new_store(wait_seconds: int = 10, lease_seconds: int = 30) -> IdempotencyStore:
+    return IdempotencyStore(3600, 100, wait_seconds, lease_seconds)
+
+
+# Function to build a write that counts its runs and returns their number
+def counted_write(runs: list, delay: float = 0.05):
+    async def write():
+        runs.append(1)
+        await asyncio.sleep(delay)
+        return {"run": len(runs)}
+
+    return write
+
+
+# Function to POST a task with the given Idempotency-Key
+async def post_task(client, key: str, **values):
+    return await client.post(
+        "/tasks", json_body={**TASK, **values}, headers={"Idempotency-Key": key}
+    )
+
+
+# THROUGH THE API
+async def test_a_retry_is_replayed(client):
+    key = uuid.uuid4().hex
+    first = await post_task(client, key)
+    assert first.status_code == 201
+    assert "idempotent-replayed" not in first.headers
+
+    retry = await post_task(client, key)
+    assert retry.status_code == 201
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+    assert await page_ids(client) == [first.json()["id"]]
+
+
+async def test_a_key_reused_with_another_body_is_rejected(client):
+    key = uuid.uuid4().hex
+    assert (await post_task(client, key)).status_code == 201
+    response = await post_task(client, key, title="Another task")
+    assert response.status_code == 422
+    assert len(await page_ids(client)) == 1
+
+
+async def test_concurrent_duplicates_create_one_task(client):
+    key = uuid.uuid4().hex
+    responses = await asyncio.gather(*(post_task(client, key) for _ in range(5)))
+    assert {response.status_code for response in responses} == {201}
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert len(await page_ids(client)) == 1
+
+
+# THE STORE
+async def test_concurrent_duplicates_in_other_workers_run_once(database):
+    runs = []
+    write = counted_write(runs)
+    workers = [new_store() for _ in range(3)]
+    key = uuid.uuid4().hex
+    responses = await asyncio.gather(
+        *(worker.run(1, key, "a", write, 201) for worker in workers)
+    )
+    assert len(runs) == 1
+    assert {json.loads(response.body)["run"] for response in responses} == {1}
+    replayed = [
+        response for response in responses if "idempotent-replayed" in response.headers
+    ]
+    assert len(replayed) == 2
+
+
+async def test_a_lapsed_claim_is_taken_over(database):
+    key = uuid.uuid4().hex
+    # The worker that claimed the key died, its lease ran out
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            insert(IdempotencyKey).values(
+                user_id=1,
+                key=key,
+                fingerprint="a",
+                expires_at=datetime.now(timezone.utc) - timedelta(seconds=1),
+            )
+        )
+        await db.commit()
+
+    runs = []
+    response = await new_store(wait_seconds=0).run(
+        1, key, "a", counted_write(runs), 201
+    )
+    assert response.status_code == 201
+    assert "idempotent-replayed" not in response.headers
+    assert len(runs) == 1
+
+
+async def test_a_live_claim_is_a_conflict(database):
+    key = uuid.uuid4().hex
+    runs = []
+    running = asyncio.create_task(
+        new_store().run(1, key, "a", counted_write(runs, delay=0.5), 201)
+    )
+    await asyncio.sleep(0.1)
+
+    # Another worker gives up waiting for it
+    with pytest.raises(HTTPException) as error:
+        await new_store(wait_seconds=0).run(1, key, "a", counted_write(runs), 201)
+    assert error.value.status_code == 409
+    await running
+    assert len(runs) == 1
+
+
+async def test_a_cancelled_request_hands_the_write_to_a_duplicate(database):
+    store = new_store()
+    key = uuid.uuid4().hex
+    runs = []
+    write = counted_write(runs, delay=0.2)
+    first = asyncio.create_task(store.run(1, key, "a", write, 201))
+    await asyncio.sleep(0.05)
+    duplicates = [
+        asyncio.create_task(store.run(1, key, "a", write, 201)) for _ in range(3)
+    ]
+    await asyncio.sleep(0.05)
+    first.cancel()
+
+    # One duplicate runs the write again, the others replay its outcome
+    responses = await asyncio.gather(*duplicates)
+    assert {response.status_code for response in responses} == {201}
+    assert {json.loads(response.body)["run"] for response in responses} == {2}
+    assert len(runs) == 2
+    assert first.cancelled()
@@ -0,0 +1,154 @@
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+
+from app.core.enums import TaskPriority, TaskSortBy, TaskStatus
+from app.db.memory_store import MemoryStore
+
+# Recovery of the in-memory store: snapshot plus log replay, torn log lines, snapshots
+# taken while changes go on, and the shared fsync of the log
+
+pytestmark = pytest.mark.anyio
+
+
+# Function to open a store in the directory, recovering what is there
+def open_store(path, snapshot_every: int = 1000, fsync: bool = False) -> MemoryStore:
+    store = MemoryStore(str(path), snapshot_every, fsync)
+    store.recover()
+    return store
+
+
+# Function to stop a store like a crash would: the log is closed, nothing is snapshotted
+def crash(store: MemoryStore) -> None:
+    store._log.close()
+
+
+# Function to get the whole state of a store, including its sorted indexes
+def state(store: MemoryStore) -> tuple:
+    return (
+        store.users,
+        store.tasks,
+        store.next_user_id,
+        store.next_task_id,
+        store.seq,
+        {
+            user_id: user_tasks.indexes
+            for user_id, user_tasks in store.user_tasks.items()
+        },
+    )
+
+
+# Function to add a task to the store
+def add_task(store: MemoryStore, user_id: int, number: int):
+    return store.create_task(
+        {
+            "title": f"Task number {number}",
+            "description": "something to do",
+            "priority": TaskPriority.medium,
+            "due_date": datetime(2030, 1, 1 + number % 28),
+        },
+        user_id,
+    )
+
+
+async def test_snapshot_and_log_replay(tmp_path):
+    store = open_store(tmp_path)
+    user = store.create_user("Test User", "user@example.com", "hash")
+    tasks = [add_task(store, user.id, i) for i in range(10)]
+    await store.snapshot()
+
+    # Changes after the snapshot are only in the log
+    store.update_tasks(tasks[:3], {"status": TaskStatus.completed})
+    store.delete_task(store.get_task(tasks[5].id))
+    add_task(store, user.id, 10)
+    crash(store)
+
+    recovered = open_store(tmp_path)
+    assert state(recovered) == state(store)
+    assert recovered.stats["recovered_changes"] == 3 + 1 + 1
+    page, total = recovered.get_tasks(
+        user.id, None, None, None, TaskSortBy.status, None, 0, 20
+    )
+    assert total == 10
+    assert [task.status for task in page][-3:] == [TaskStatus.completed] * 3
+
+
+async def test_torn_last_line_is_dropped(tmp_path):
+    store = open_store(tmp_path)
+    user = store.create_user("Test User", "user@example.com", "hash")
+    add_task(store, user.id, 1)
+    expected = state(store)
+    segment = store._segments()[-1]
+    crash(store)
+
+    # The process died while writing the next change
+    with segment.open("a", encoding="utf-8") as file:
+        file.write('{"seq": 3, "op": "task", "row": {"id": 2, "tit')
+
+    recovered = open_store(tmp_path)
+    assert state(recovered) == expected
+    assert segment.read_bytes().endswith(b"}\n")
+
+    # The store goes on logging after the cut, and recovers again
+    add_task(recovered, user.id, 2)
+    crash(recovered)
+    assert state(open_store(tmp_path)) == state(recovered)
+
+
+async def test_snapshot_taken_while_changes_go_on(tmp_path):
+    store = open_store(tmp_path)
+    user = store.create_user("Test User", "user@example.com", "hash")
+    for i in range(50):
+        add_task(store, user.id, i)
+
+    # Change the state while the snapshot is written in a thread
+    snapshot = asyncio.create_task(store.snapshot())
+    await asyncio.sleep(0)
+    for i in range(50, 60):
+        add_task(store, user.id, i)
+    store.delete_task(store.get_task(1))
+    await snapshot
+    store.update_tasks([store.get_task(2)], {"title": "Changed after"})
+    crash(store)
+
+    assert store.stats["snapshots"] == 1
+    assert len(store._segments()) == 1  # The log the snapshot covers was deleted
+    recovered = open_store(tmp_path)
+    assert state(recovered) == state(store)
+    assert recovered.get_task(2).title == "Changed after"
+    assert recovered.get_task(1) is None
+
+
+async def test_snapshots_are_taken_every_n_changes(tmp_path):
+    store = open_store(tmp_path, snapshot_every=20)
+    user = store.create_user("Test User", "user@example.com", "hash")
+    for i in range(45):
+        add_task(store, user.id, i)
+        if store._snapshot_task is not None:
+            await store._snapshot_task
+    crash(store)
+
+    assert store.stats["snapshots"] == 2
+    recovered = open_store(tmp_path)
+    assert state(recovered) == state(store)
+    assert recovered.stats["recovered_changes"] < 20
+
+
+async def test_concurrent_writers_share_an_fsync(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd))
+    store = open_store(tmp_path, fsync=True)
+    user = store.create_user("Test User", "user@example.com", "hash")
+    await store.sync()
+    assert len(synced) == 1
+
+    # Writers that log before the fsync ran wait for one fsync together
+    async def write(number):
+        add_task(store, user.id, number)
+        await store.sync()
+
+    await asyncio.gather(*(write(i) for i in range(10)))
+    assert len(synced) == 2
+    assert store._synced == store.seq
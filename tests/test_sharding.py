@@ -0,0 +1,270 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, insert, select, update
+
+from app.db import sharding
+from app.db.database import AsyncSessionLocal
+from app.db.models import Task, User
+from app.db.sharding import HashRing, move_user, on_every_shard, rebalance
+from app.services.tasks_archive_service import tasks_archive_old
+from app.services.tasks_expire_service import tasks_expire_due_date
+from tests.conftest import signed_in_client
+from tests.test_tasks import create_task, page_ids
+
+# Sharding of the tasks by user: ring placement, routing of the requests through the
+# user's row, moves and rebalancing, and the scheduled jobs on every shard
+
+pytestmark = pytest.mark.anyio
+
+SHARDS = 3
+
+
+# Fixture that creates and migrates the shard databases once for the module
+@pytest.fixture(scope="module")
+async def shard_databases(database, tmp_path_factory):
+    directory = tmp_path_factory.mktemp("shards")
+    shards = {
+        shard.name: shard
+        for shard in (
+            sharding._create_shard(index, f"sqlite+aiosqlite:///{directory}/{index}.db")
+            for index in range(SHARDS)
+        )
+    }
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(sharding, "shards", shards)
+        await sharding.startup_shards()
+    yield shards
+    for shard in shards.values():
+        await shard.engine.dispose()
+
+
+# Fixture that turns sharding on (as DATABASE_SHARD_URLS would) for the test
+@pytest.fixture
+def sharded(shard_databases, monkeypatch):
+    monkeypatch.setattr(sharding, "shards", shard_databases)
+    monkeypatch.setattr(sharding, "ring", HashRing(list(shard_databases)))
+    monkeypatch.setattr(sharding, "MOVE_DRAIN_SECONDS", 0)
+    return shard_databases
+
+
+# Function to find the shards holding the task, by name
+async def shards_holding(task_id: int) -> list[str]:
+    names = []
+    for shard in sharding.shards.values():
+        async with shard.sessionmaker() as db:
+            if await db.get(Task, task_id) is not None:
+                names.append(shard.name)
+    return names
+
+
+# Function to load the owner of the task from the primary database
+async def owner_of(task_id: int) -> User:
+    (name,) = await shards_holding(task_id)
+    async with sharding.get_shard(name).sessionmaker() as db:
+        user_id = (await db.get(Task, task_id)).user_id
+    async with AsyncSessionLocal() as db:
+        return await db.get(User, user_id)
+
+
+# Function to move the task's due date into the past, behind the API
+async def make_overdue(task_id: int) -> None:
+    (name,) = await shards_holding(task_id)
+    async with sharding.get_shard(name).sessionmaker() as db:
+        await db.execute(
+            update(Task)
+            .where(Task.id == task_id)
+            .values(due_date=datetime.now(timezone.utc) - timedelta(days=365))
+        )
+        await db.commit()
+
+
+# Function to get a shard name other than the given one
+def other_shard(name: str) -> str:
+    return next(other for other in sharding.shards if other != name)
+
+
+# PLACEMENT
+def test_ring_placement_is_stable_and_spread():
+    ring = HashRing(["shard0", "shard1", "shard2"])
+    placements = [ring.shard_for(user_id) for user_id in range(3000)]
+    assert placements == [ring.shard_for(user_id) for user_id in range(3000)]
+    for name in ("shard0", "shard1", "shard2"):
+        assert 700 < placements.count(name) < 1300
+
+    # Adding a shard only moves users to the new shard, about a quarter of them
+    grown = HashRing(["shard0", "shard1", "shard2", "shard3"])
+    moved = [
+        user_id
+        for user_id, name in enumerate(placements)
+        if grown.shard_for(user_id) != name
+    ]
+    assert {grown.shard_for(user_id) for user_id in moved} == {"shard3"}
+    assert 500 < len(moved) < 1000
+
+
+async def test_tasks_live_in_the_users_shard(sharded):
+    client = await signed_in_client()
+    task_id = await create_task(client, "Sharded task")
+
+    user = await owner_of(task_id)
+    assert await shards_holding(task_id) == [sharding.ring.shard_for(user.id)]
+    async with AsyncSessionLocal() as db:
+        # Nothing of the user is in the primary database
+        assert not await db.scalar(
+            select(func.count()).select_from(Task).where(Task.user_id == user.id)
+        )
+    assert await page_ids(client) == [task_id]
+
+
+async def test_requests_use_the_shard_on_the_user_row(sharded):
+    client = await signed_in_client()
+    task_id = await create_task(client, "Pinned task")
+    user = await owner_of(task_id)
+
+    # Point the user at an empty shard without moving the tasks
+    await sharding._set_placement(
+        user.id, shard=other_shard(sharding.shard_for_user(user).name)
+    )
+    assert (await client.get(f"/tasks/{task_id}")).status_code == 404
+    await sharding._set_placement(user.id, shard=None)
+    assert (await client.get(f"/tasks/{task_id}")).status_code == 200
+
+
+# MOVES
+async def test_moved_tasks_are_kept(sharded):
+    client = await signed_in_client()
+    ids = [await create_task(client, f"Task number {i}") for i in range(3)]
+    user = await owner_of(ids[0])
+    source = sharding.shard_for_user(user).name
+    target = other_shard(source)
+
+    assert await move_user(user, target) == 3
+    for task_id in ids:
+        assert await shards_holding(task_id) == [target]
+    assert await page_ids(client) == ids
+
+    # New tasks go to the new shard, with ids from the shared sequence
+    new_id = await create_task(client, "Task after the move")
+    assert new_id > max(ids)
+    assert await shards_holding(new_id) == [target]
+
+
+async def test_requests_are_refused_during_a_move(sharded):
+    client = await signed_in_client()
+    task_id = await create_task(client, "Task being moved")
+    user = await owner_of(task_id)
+
+    await sharding._set_placement(
+        user.id, shard_moving_until=sharding._utcnow() + timedelta(minutes=5)
+    )
+    response = await client.get(f"/tasks/{task_id}")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(sharding.MOVE_DRAIN_SECONDS)
+
+    # A move that has run out no longer refuses requests
+    await sharding._set_placement(
+        user.id, shard_moving_until=sharding._utcnow() - timedelta(seconds=1)
+    )
+    assert (await client.get(f"/tasks/{task_id}")).status_code == 200
+
+
+async def test_a_move_deletes_only_the_copied_rows(sharded, monkeypatch, caplog):
+    client = await signed_in_client()
+    task_id = await create_task(client, "Copied task")
+    user = await owner_of(task_id)
+    source = sharding.shard_for_user(user)
+    late_id = await sharding.new_task_id()
+
+    # A row written to the source after the copy, just before the switch
+    set_placement = sharding._set_placement
+
+    async def write_then_set_placement(user_id, **values):
+        if values.get("shard") is not None:
+            async with source.sessionmaker() as db:
+                await db.execute(
+                    insert(Task).values(
+                        id=late_id,
+                        title="Late task",
+                        description="written during the move",
+                        priority="low",
+                        status="pending",
+                        status_rank=0,
+                        priority_rank=0,
+                        created_at=sharding._utcnow(),
+                        due_date=sharding._utcnow() + timedelta(days=1),
+                        user_id=user_id,
+                    )
+                )
+                await db.commit()
+        await set_placement(user_id, **values)
+
+    monkeypatch.setattr(sharding, "_set_placement", write_then_set_placement)
+    with caplog.at_level(logging.WARNING, logger=sharding.__name__):
+        assert await move_user(user, other_shard(source.name)) == 1
+
+    assert await shards_holding(task_id) == [other_shard(source.name)]
+    assert await shards_holding(late_id) == [source.name]
+    assert "during the move" in caplog.text
+
+
+async def test_rebalance_moves_users_back_to_their_ring_placement(sharded):
+    client = await signed_in_client()
+    ids = [await create_task(client, f"Task number {i}") for i in range(2)]
+    user = await owner_of(ids[0])
+    placement = sharding.ring.shard_for(user.id)
+    await move_user(user, other_shard(placement))
+
+    assert (await rebalance(dry_run=True)).get(placement, 0) >= 1
+    assert await shards_holding(ids[0]) == [other_shard(placement)]
+    await rebalance()
+    for task_id in ids:
+        assert await shards_holding(task_id) == [placement]
+    assert await page_ids(client) == ids
+
+
+# SCHEDULED JOBS
+async def test_expiry_runs_on_every_shard(sharded):
+    overdue = []
+    for shard in sharded:
+        client = await signed_in_client()
+        task_id = await create_task(client, "Overdue task")
+        user = await owner_of(task_id)
+        if sharding.shard_for_user(user).name != shard:
+            await move_user(user, shard)
+        await make_overdue(task_id)
+        overdue.append((client, task_id))
+
+    await on_every_shard(tasks_expire_due_date)()
+
+    for client, task_id in overdue:
+        assert (await client.get(f"/tasks/{task_id}")).json()["status"] == "expired"
+
+
+async def test_jobs_skip_users_being_moved(sharded):
+    client = await signed_in_client()
+    task_id = await create_task(client, "Overdue task of a moving user")
+    user = await owner_of(task_id)
+    await make_overdue(task_id)
+    (name,) = await shards_holding(task_id)
+    shard = sharding.get_shard(name)
+
+    await sharding._set_placement(
+        user.id, shard_moving_until=sharding._utcnow() + timedelta(minutes=5)
+    )
+    await on_every_shard(tasks_expire_due_date)()
+    async with shard.sessionmaker() as db:
+        assert (await db.get(Task, task_id)).status.value == "pending"
+
+    # Once the move is done, the jobs pick the task up again
+    await sharding._set_placement(user.id, shard_moving_until=None)
+    await on_every_shard(tasks_expire_due_date)()
+    assert sum(await on_every_shard(tasks_archive_old)()) >= 1
+    async with shard.sessionmaker() as db:
+        assert (
+            await db.scalar(
+                select(func.count()).select_from(Task).where(Task.user_id == user.id)
+            )
+            == 0
+        )
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from app.core.single_flight import SingleFlight
+from app.crud import user_crud
+from app.db.database import AsyncSessionLocal, engine
+from tests.conftest import signed_in_client
+
+# Request coalescing of identical concurrent reads
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test_shared")
+    runs = []
+
+    async def fn():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(flight.do("key", fn) for _ in range(10)))
+    assert results == ["result"] * 10
+    assert len(runs) == 1
+
+    # A call after the shared one finished runs again
+    assert await flight.do("key", fn) == "result"
+    assert len(runs) == 2
+
+
+async def test_failures_are_shared():
+    flight = SingleFlight("test_failures")
+
+    async def fn():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(
+        *(flight.do("key", fn) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.stats["executions"] == 1
+
+
+async def test_a_cancelled_leader_hands_over_to_one_waiter():
+    flight = SingleFlight("test_cancelled")
+    runs = []
+
+    async def fn():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return len(runs)
+
+    leader = asyncio.create_task(flight.do("key", fn))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(flight.do("key", fn)) for _ in range(5)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    # One waiter runs the call again, the others join it
+    assert await asyncio.gather(*waiters) == [2] * 5
+    assert len(runs) == 2
+    assert leader.cancelled()
+
+
+async def test_concurrent_authenticated_requests_share_one_user_query(backend):
+    if backend != "sql":
+        pytest.skip("the in-memory store has no queries to coalesce")
+    client = await signed_in_client()
+    token = client.headers["Authorization"].removeprefix("Bearer ")
+
+    user_queries = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT") and "FROM users" in statement:
+            user_queries.append(statement)
+
+    async def authenticate():
+        async with AsyncSessionLocal() as db:
+            return await user_crud.get_current_user(token, db)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    try:
+        users = await asyncio.gather(*(authenticate() for _ in range(20)))
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count)
+
+    assert len(user_queries) == 1
+    assert len({id(user) for user in users}) == 20  # Every caller gets its own instance
+    assert {user.email for user in users} == {users[0].email}
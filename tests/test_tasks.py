@@ -0,0 +1,226 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import update
+
+from app.crud import task_crud
+from app.db.database import AsyncSessionLocal
+from app.db.models import Task
+from app.services.tasks_expire_service import tasks_expire_due_date
+
+# Task and user CRUD behaviour, run against both storage backends (see the backend fixture)
+
+pytestmark = pytest.mark.anyio
+
+DUE_DATE = "2030-01-01T00:00:00"
+
+
+# Function to create a task through the API and return its id
+async def create_task(client, title: str, due_date: str = DUE_DATE, **values) -> int:
+    response = await client.post(
+        "/tasks",
+        json_body={
+            "title": title,
+            "description": values.pop("description", "something to do"),
+            "priority": values.pop("priority", "low"),
+            "due_date": due_date,
+        },
+    )
+    assert response.status_code == 201, response.content
+    return response.json()["id"]
+
+
+# Function to get the ids of a task page
+async def page_ids(client, **params) -> list[int]:
+    response = await client.get("/tasks", params=params)
+    assert response.status_code == 200, response.content
+    return [task["id"] for task in response.json()["tasks"]]
+
+
+# USERS
+async def test_register_twice_is_a_conflict(client):
+    user = {
+        "fullname": "Other User",
+        "email": f"{uuid.uuid4().hex}@example.com",
+        "password": "T3st!pass",
+    }
+    assert (await client.post("/register", json_body=user)).status_code == 201
+    assert (await client.post("/register", json_body=user)).status_code == 409
+
+
+async def test_wrong_password_is_rejected(client):
+    response = await client.post(
+        "/token", form={"username": "nobody@example.com", "password": "Wr0ng!pass"}
+    )
+    assert response.status_code == 401
+
+
+# SINGLE TASKS
+async def test_create_get_update_delete(client):
+    task_id = await create_task(client, "Write the report", priority="high")
+
+    response = await client.get(f"/tasks/{task_id}")
+    assert response.status_code == 200
+    assert response.json() == {
+        "id": task_id,
+        "title": "Write the report",
+        "description": "something to do",
+        "priority": "high",
+        "due_date": DUE_DATE,
+        "status": "pending",
+    }
+
+    response = await client.patch(
+        f"/tasks/{task_id}", json_body={"status": "completed", "title": "Report done"}
+    )
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    assert response.json()["title"] == "Report done"
+    response = await client.get(f"/tasks/{task_id}")
+    assert response.json()["status"] == "completed"
+
+    response = await client.delete(f"/tasks/{task_id}")
+    assert response.status_code == 200
+    response = await client.get(f"/tasks/{task_id}")
+    assert response.status_code == 404
+
+
+async def test_missing_task_is_not_found(client):
+    assert (await client.get("/tasks/999999")).status_code == 404
+    assert (
+        await client.patch("/tasks/999999", json_body={"title": "Nothing here"})
+    ).status_code == 404
+    assert (await client.delete("/tasks/999999")).status_code == 404
+
+
+async def test_other_users_task_is_forbidden(client, other_client):
+    task_id = await create_task(client, "Private task")
+
+    assert (await other_client.get(f"/tasks/{task_id}")).status_code == 403
+    response = await other_client.patch(
+        f"/tasks/{task_id}", json_body={"title": "Taken over"}
+    )
+    assert response.status_code == 403
+    assert (await other_client.delete(f"/tasks/{task_id}")).status_code == 403
+    assert (await client.get(f"/tasks/{task_id}")).json()["title"] == "Private task"
+
+
+async def test_requests_without_a_token_are_unauthorized(client):
+    del client.headers["Authorization"]
+    assert (await client.get("/tasks")).status_code == 401
+
+
+async def test_lookup(client, other_client):
+    mine = await create_task(client, "My first task")
+    theirs = await create_task(other_client, "Their task")
+
+    response = await client.post(
+        "/tasks/lookup", json_body={"ids": [theirs, 999999, mine, mine]}
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert [task["id"] for task in body["tasks"]] == [mine]
+    assert body["missing"] == [999999]
+    assert body["forbidden"] == [theirs]
+
+
+# TASK PAGES
+async def test_pagination(client):
+    ids = [
+        await create_task(client, f"Task number {i}", f"2030-01-{i + 1:02d}T00:00:00")
+        for i in range(7)
+    ]
+
+    response = await client.get("/tasks", params={"page_number": 1, "page_size": 3})
+    body = response.json()
+    assert body["total_items"] == 7
+    assert body["total_pages"] == 3
+    assert [task["id"] for task in body["tasks"]] == ids[:3]
+    assert await page_ids(client, page_number=2, page_size=3) == ids[3:6]
+    assert await page_ids(client, page_number=3, page_size=3) == ids[6:]
+
+    response = await client.get("/tasks", params={"page_number": 4, "page_size": 3})
+    assert response.status_code == 404
+
+
+async def test_no_tasks_is_not_found(client):
+    assert (await client.get("/tasks")).status_code == 404
+
+
+@pytest.mark.parametrize("sort_by", ["due_date", "status", "priority", "title"])
+async def test_sort_ties_are_ordered_by_id(client, sort_by):
+    # Every task has the same due date, status, priority and title
+    ids = [await create_task(client, "Same title") for _ in range(5)]
+
+    assert await page_ids(client, sort_by=sort_by, page_size=3) == ids[:3]
+    assert (
+        await page_ids(client, sort_by=sort_by, page_size=3, page_number=2) == ids[3:]
+    )
+    assert await page_ids(client, sort_by=sort_by, order="desc") == ids[::-1]
+
+
+async def test_sort_orders(client):
+    low = await create_task(
+        client, "Banana task", "2030-03-01T00:00:00", priority="low"
+    )
+    high = await create_task(
+        client, "Apple task", "2030-02-01T00:00:00", priority="high"
+    )
+    medium = await create_task(
+        client, "Cherry task", "2030-01-01T00:00:00", priority="medium"
+    )
+    await client.patch(f"/tasks/{low}", json_body={"status": "completed"})
+
+    assert await page_ids(client) == [medium, high, low]
+    assert await page_ids(client, sort_by="due_date", order="desc") == [
+        low,
+        high,
+        medium,
+    ]
+    assert await page_ids(client, sort_by="title") == [high, low, medium]
+    assert await page_ids(client, sort_by="priority") == [low, medium, high]
+    assert await page_ids(client, sort_by="status") == [high, medium, low]
+
+
+async def test_filters_and_search(client):
+    urgent = await create_task(
+        client, "Call the bank", description="URGENT matter", priority="high"
+    )
+    later = await create_task(client, "Tidy the garage", priority="high")
+    done = await create_task(client, "Pay the rent", description="urgent too")
+    await client.patch(f"/tasks/{done}", json_body={"status": "completed"})
+
+    assert await page_ids(client, search="urgent") == [urgent, done]
+    assert await page_ids(client, search="garage") == [later]
+    assert await page_ids(client, filter_priority="high") == [urgent, later]
+    assert await page_ids(client, filter_status="completed") == [done]
+    assert await page_ids(
+        client, search="urgent", filter_status="pending", filter_priority="high"
+    ) == [urgent]
+    response = await client.get("/tasks", params={"search": "nothing like it"})
+    assert response.status_code == 404
+
+
+# EXPIRY
+async def test_past_due_tasks_expire(client, backend):
+    overdue = await create_task(client, "Overdue task")
+    upcoming = await create_task(client, "Upcoming task")
+
+    # Move the due date of the first task into the past, behind the API
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    if backend == "memory":
+        store = task_crud.store
+        store.update_tasks([store.get_task(overdue)], {"due_date": past})
+    else:
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Task).where(Task.id == overdue).values(due_date=past)
+            )
+            await db.commit()
+
+    await tasks_expire_due_date()
+
+    assert (await client.get(f"/tasks/{overdue}")).json()["status"] == "expired"
+    assert (await client.get(f"/tasks/{upcoming}")).json()["status"] == "pending"
+    assert await page_ids(client, filter_status="expired") == [overdue]
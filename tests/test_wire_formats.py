@@ -0,0 +1,206 @@
+import gzip
+import json
+import zlib
+
+import pytest
+
+from app.core import compression
+from app.core.compression import CompressionMiddleware, negotiate_encoding
+from app.core.negotiation import (
+    JSON_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE,
+    TaskResponse,
+    negotiate_media_type,
+)
+from tests.conftest import Client
+from tests.test_tasks import create_task
+
+# Content negotiation (Accept), response compression (Accept-Encoding) and their headers
+
+pytestmark = pytest.mark.anyio
+
+requires_msgpack = pytest.mark.skipif(
+    negotiate_media_type("application/msgpack") != MSGPACK_MEDIA_TYPE,
+    reason="msgpack is not installed",
+)
+
+
+# Function to build an ASGI app sending the body in the given chunks
+def chunked_app(chunks: list[bytes], content_type: str = "application/json"):
+    async def app(scope, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", content_type.encode())],
+            }
+        )
+        for i, chunk in enumerate(chunks):
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": i < len(chunks) - 1,
+                }
+            )
+
+    return app
+
+
+# Function to wrap an app in the compression middleware with a 100 bytes threshold
+def compressed(app) -> Client:
+    return Client(CompressionMiddleware(app, minimum_size=100))
+
+
+# ACCEPT
+@requires_msgpack
+@pytest.mark.parametrize(
+    "accept, media_type",
+    [
+        (None, JSON_MEDIA_TYPE),
+        ("*/*", JSON_MEDIA_TYPE),
+        ("application/json", JSON_MEDIA_TYPE),
+        ("application/msgpack", MSGPACK_MEDIA_TYPE),
+        ("application/x-msgpack", MSGPACK_MEDIA_TYPE),
+        ("application/json, application/msgpack", MSGPACK_MEDIA_TYPE),
+        ("application/json, application/msgpack;q=0.5", JSON_MEDIA_TYPE),
+        ("application/msgpack;q=0.5, */*;q=0.1", MSGPACK_MEDIA_TYPE),
+        ("application/msgpack;q=0", JSON_MEDIA_TYPE),
+        ("text/html", JSON_MEDIA_TYPE),
+    ],
+)
+def test_negotiate_media_type(accept, media_type):
+    assert negotiate_media_type(accept) == media_type
+
+
+def test_task_response_adds_to_the_callers_vary():
+    response = TaskResponse({"ok": True}, headers={"Vary": "Origin"})
+    assert response.headers["vary"] == "Origin, Accept"
+    assert TaskResponse({"ok": True}).headers["vary"] == "Accept"
+
+
+@requires_msgpack
+async def test_task_routes_answer_in_msgpack(client):
+    import msgpack
+
+    task_id = await create_task(client, "Packed task")
+    as_json = await client.get(f"/tasks/{task_id}")
+    as_msgpack = await client.get(
+        f"/tasks/{task_id}", headers={"Accept": "application/msgpack"}
+    )
+    assert as_msgpack.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert "Accept" in as_msgpack.headers["vary"]
+    assert msgpack.unpackb(as_msgpack.content) == as_json.json()
+
+    # Errors stay JSON
+    missing = await client.get(
+        "/tasks/999999", headers={"Accept": "application/msgpack"}
+    )
+    assert missing.status_code == 404
+    assert missing.headers["content-type"] == JSON_MEDIA_TYPE
+
+
+# ACCEPT-ENCODING
+@pytest.mark.parametrize(
+    "accept_encoding, available, name",
+    [
+        (None, ["zstd", "br", "gzip"], None),
+        ("identity", ["zstd", "br", "gzip"], None),
+        ("gzip", ["zstd", "br", "gzip"], "gzip"),
+        ("gzip, br, zstd", ["zstd", "br", "gzip"], "zstd"),
+        ("gzip, br", ["zstd", "br", "gzip"], "br"),
+        ("gzip, br;q=0.5", ["zstd", "br", "gzip"], "gzip"),
+        ("*", ["zstd", "br", "gzip"], "zstd"),
+        ("*, zstd;q=0", ["zstd", "br", "gzip"], "br"),
+        ("gzip;q=0", ["zstd", "br", "gzip"], None),
+        ("zstd, gzip", ["gzip"], "gzip"),
+    ],
+)
+def test_negotiate_encoding(accept_encoding, available, name, monkeypatch):
+    # Any encoder object does, only the names take part in the negotiation
+    monkeypatch.setattr(
+        compression,
+        "encoders",
+        {encoding: compression.GzipEncoder(1) for encoding in available},
+    )
+    encoder = negotiate_encoding(accept_encoding)
+    chosen = next(
+        (key for key, value in compression.encoders.items() if value is encoder), None
+    )
+    assert chosen == name
+
+
+async def test_bodies_below_the_threshold_are_sent_as_they_are():
+    client = compressed(chunked_app([b"x" * 99]))
+    response = await client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content == b"x" * 99
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.parametrize("encoding", list(compression.encoders))
+async def test_bodies_above_the_threshold_are_compressed(encoding):
+    body = json.dumps([{"id": i, "title": "task"} for i in range(100)]).encode()
+    client = compressed(chunked_app([body]))
+    response = await client.get("/", headers={"Accept-Encoding": encoding})
+    assert response.headers["content-encoding"] == encoding
+    assert response.headers["content-length"] == str(len(response.content))
+    assert len(response.content) < len(body)
+    assert decompress(encoding, response.content) == body
+
+
+async def test_streamed_chunks_can_be_decoded_on_arrival():
+    chunks = [json.dumps({"chunk": i}).encode() for i in range(5)]
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = CompressionMiddleware(chunked_app(chunks), minimum_size=100)
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+    await middleware(scope, None, send)
+
+    start, *bodies = sent
+    assert (b"content-encoding", b"gzip") in start["headers"]
+    assert b"content-length" not in dict(start["headers"])
+    decoder = zlib.decompressobj(31)
+    for chunk, message in zip(chunks, bodies):
+        assert decoder.decompress(message["body"]) == chunk
+
+
+async def test_event_streams_are_never_compressed():
+    events = [b"data: first\n\n" * 20, b"data: second\n\n" * 20]
+    client = compressed(chunked_app(events, "text/event-stream"))
+    response = await client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content == b"".join(events)
+
+
+async def test_interleaved_zstd_streams_stay_separate():
+    zstandard = pytest.importorskip("zstandard")
+    encoder = compression.ZstdEncoder(3)
+    first, second = encoder.stream(), encoder.stream()
+    first_body = first.compress(b"first " * 50)
+    second_body = second.compress(b"second " * 50)
+    first_body += first.compress(b"more of the first") + first.finish()
+    second_body += second.finish()
+
+    decoder = zstandard.ZstdDecompressor()
+    assert decoder.decompressobj().decompress(first_body) == (
+        b"first " * 50 + b"more of the first"
+    )
+    assert decoder.decompressobj().decompress(second_body) == b"second " * 50
+
+
+# Function to decode a body of the given Content-Encoding
+def decompress(encoding: str, body: bytes) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "br":
+        return compression.brotli.decompress(body)
+    return compression.zstandard.ZstdDecompressor().decompressobj().decompress(body)